@@ -3,11 +3,23 @@ import asyncio
 from datetime import timedelta
 import json
 import logging
-import random
 import time
 from pathlib import Path
-import requests
-from bilibili_api import login_v2, user
+
+from cache import FAILED_OUTCOMES, OUTCOME_ACTIVE, OUTCOME_BLOCKED, OUTCOME_DELETED, ActivityCache, cached_probe
+from checkpoint import Checkpoint
+from client import BiliClient
+from credential import CredentialManager
+from engine import buffered, catch_errors, probe_with_retry
+from jobs import JOB_DONE, JOB_PAUSED, JOB_STATE_NAMES, LogBuffer, get_runner
+from metrics import DEFAULT_METRICS_FILE
+from plan import (DECISION_KEEP, DECISION_SKIP, DECISION_UNFOLLOW, DEFAULT_PLAN_FILE, PlanError, PlanWriter, apply_plan,
+                  check_plan_owner, read_plan)
+from prefilter import prefilter_stage
+from probe import FollowedUser, active_after_ts, follow_skip_reason, probe_last_active
+from ratelimit import BiliAPIError, Pacer
+from results import DEFAULT_RESULTS_FILE, ResultsStore
+from unfollow import UNFOLLOW_DONE, UNFOLLOW_FAILED, UNFOLLOW_NOT_FOLLOWING, UnfollowExecutor, queue_file_for
 
 # === 页面配置 ===
 st.set_page_config(page_title="B站自动取关助手", page_icon="📺", layout="wide")
@@ -28,26 +40,15 @@ if not logger.handlers:
     file_handler.setFormatter(file_formatter)
     logger.addHandler(file_handler)
 
-# === 自定义 Streamlit 日志 Handler ===
-class StreamlitHandler(logging.Handler):
-    def __init__(self, log_container):
-        super().__init__()
-        self.log_container = log_container
-        self.log_text = ""
+# === 界面日志 ===
+LOG_VIEW_LINES = 300  # 界面最多显示的行数
+UI_REFRESH_INTERVAL = 0.5  # 任务运行时页面轮询进度与日志的间隔（秒）
 
-    def emit(self, record):
-        try:
-            msg = self.format(record)
-            # 在 UI 显示时去掉过于详细的时间戳，保持简洁
-            ui_msg = msg.split(" - ", 2)[-1] if " - " in msg else msg
-            
-            self.log_text += f"{ui_msg}\n"
-            # 限制 UI 日志长度
-            if len(self.log_text) > 10000:
-                self.log_text = self.log_text[-10000:]
-            self.log_container.code(self.log_text, language='text')
-        except Exception:
-            self.handleError(record)
+# 日志存入环形缓冲，由页面轮询显示（jobs 模块只导入一次，重跑时沿用同一实例）
+log_buffer = next((h for h in logger.handlers if isinstance(h, LogBuffer)), None)
+if log_buffer is None:
+    log_buffer = LogBuffer()
+    logger.addHandler(log_buffer)
 
 # === 配置类 ===
 class Config:
@@ -56,18 +57,44 @@ class Config:
         self.ignore_list = []
         self.INACTIVE_THRESHOLD = 365
         self.SKIP_NUM = 0
+        self.FOLLOW_PROTECT_DAYS = 0
+        self.FOLLOW_PROTECT_THRESHOLD = False
+        self.OLDEST_FIRST = False
         self.DETECT_TYPE = 0
+        self.CASCADE_TIERS = [["dynamic", 1], ["post", 3]]
         self.REMOVE_EMPTY_DYNAMIC = False
         self.REMOVE_DELETED_USER = False
-        self.LAG_START = 5
-        self.LAG_END = 20
         self.AUTO_ADD_IGNORE = True
+        self.MAX_WORKERS = 4
+        self.READ_RATE = 0.5
+        self.READ_RATE_MAX = 2.0
+        self.WRITE_RATE = 0.2
+        self.WRITE_RATE_MAX = 0.5
+        self.MIN_RATE = 0.05
+        self.CACHE_ENABLED = True
+        self.CACHE_PATH = "activity_cache.db"
+        self.CACHE_TTL_DAYS = 7
+        self.CACHE_ERROR_TTL_HOURS = 1
+        self.PREFILTER_ENABLED = True
+        self.APPLY_WORKERS = 1
+        self.UNFOLLOW_BATCH_SIZE = 50
+        self.API_BASE_URL = None
+        self.METRICS_PATH = DEFAULT_METRICS_FILE
+        self.RESULTS_PATH = DEFAULT_RESULTS_FILE
+        self.RETRY_LIMIT = 3
+        self.RETRY_DELAY = 5
+        self.BREAKER_THRESHOLD = 3
+        self.BREAKER_COOLDOWN = 30
+        self.LOGIN_CHECK_TTL_HOURS = 12
+        self.COOKIE_REFRESH = True
         self.cookies = None
+        self.credentials = None
         self.uid = None
         self.headers = {}
 
-    def set_user_cookies(self, cookies):
+    def set_user_cookies(self, cookies, credentials=None):
         self.cookies = cookies
+        self.credentials = credentials
         self.uid = cookies["DedeUserID"]
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
@@ -82,92 +109,37 @@ config = st.session_state.config
 
 # === 核心逻辑类 ===
 
-class FollowedUser:
-    def __init__(self, mid, uname):
-        self.mid = mid
-        self.name = uname
-
-    async def get_latest_dynamic(self):
-        """
-        获取最新动态，比较前两条动态的时间戳（修复置顶导致乱序的问题）
-        """
-        try:
-            credential = user.Credential(sessdata=config.cookies["SESSDATA"], bili_jct=config.cookies["bili_jct"])
-            u = user.User(self.mid, credential=credential)
-            dynamics = await u.get_dynamics_new()
-            
-            items = dynamics.get('items', [])
-            
-            if not items:
-                return None
-            
-            # 如果只有一条动态，直接返回
-            if len(items) == 1:
-                return items[0]
-            
-            # 如果有多条，比较前两条的时间戳
-            try:
-                # 获取发布时间戳
-                ts1 = int(items[0]['modules']['module_author']['pub_ts'])
-                ts2 = int(items[1]['modules']['module_author']['pub_ts'])
-                
-                # 返回较新的那个
-                latest_dynamic = items[0] if ts1 >= ts2 else items[1]
-                return latest_dynamic
-                
-            except (KeyError, TypeError) as e:
-                # 如果数据结构异常，回退到取第一个
-                logger.warning(f"⚠️ 解析动态时间戳异常 ({self.name}): {str(e)}，默认取第一条")
-                return items[0]
-
-        except Exception as e:
-            logger.error(f"❌ 获取用户 {self.name} 动态失败: {str(e)}")
-            return None
-    
-    async def get_latest_post_time(self):
-        try:
-            credential = user.Credential(sessdata=config.cookies["SESSDATA"], bili_jct=config.cookies["bili_jct"])
-            u = user.User(self.mid, credential=credential)
-            
-            # 并发获取视频、音频、专栏
-            tasks = [u.get_videos(), u.get_audios(), u.get_articles()]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            timestamps = []
-            
-            # 视频
-            if not isinstance(results[0], Exception):
-                v_list = results[0]['list'].get('vlist', [])
-                if v_list: timestamps.append(v_list[0]['created'])
-            
-            # 音频
-            if not isinstance(results[1], Exception) and results[1].get('data'):
-                timestamps.append(results[1]['data'][0]['ctime'] / 1000)
-            
-            # 专栏
-            if not isinstance(results[2], Exception) and results[2].get('articles'):
-                timestamps.append(results[2]['articles'][0]['publish_time'])
-            
-            return max(timestamps) if timestamps else None
-        except Exception:
-            return None
+UNFOLLOW_ICONS = {UNFOLLOW_DONE: "🚫 ", UNFOLLOW_NOT_FOLLOWING: "⏭️ ", UNFOLLOW_FAILED: "❌ "}
 
 # === 业务逻辑函数 ===
 
+def restore_login():
+    """本地Cookies的验证结果仍在有效期内时直接恢复登录状态，无需请求"""
+    credentials = CredentialManager.from_config(config)
+    try:
+        cookies = credentials.load()
+    except (OSError, json.JSONDecodeError, KeyError):
+        return False
+    if not credentials.cached_info():
+        return False
+    config.set_user_cookies(cookies, credentials)
+    return True
+
+async def fetch_account_info():
+    """通过 nav 接口验证，无需导入 bilibili_api"""
+    async with BiliClient.from_config(config, Pacer.from_config(config)) as client:
+        return await client.get_nav()
+
 async def check_login_status():
-    """检查本地Cookies是否有效"""
-    cookie_file = Path("cookies.json")
-    if cookie_file.exists():
+    """检查本地Cookies是否有效，验证结果在有效期内时不再请求"""
+    credentials = CredentialManager.from_config(config)
+    if credentials.path.exists():
         try:
-            with open(cookie_file, 'r', encoding='utf-8') as f:
-                loaded_cookies = json.load(f)
-                config.set_user_cookies(loaded_cookies)
+            config.set_user_cookies(credentials.load(), credentials)
             
             try:
-                credential = user.Credential.from_cookies(config.cookies)
-                u = user.User(config.uid, credential)
-                info = await u.get_user_info()
-                st.success(f"✅ Cookies有效！当前账号：{info['name']} (UID:{info['mid']})")
+                info = await credentials.validate(fetch_account_info)
+                st.success(f"✅ Cookies有效！当前账号：{info.get('uname')} (UID:{info.get('mid')})")
                 return True
             except Exception as e:
                 st.error(f"⚠️ cookies已失效：{str(e)}")
@@ -177,15 +149,16 @@ async def check_login_status():
             return False
     return False
 
-async def is_in_special_group_ui():
-    """自动添加白名单逻辑"""
+async def is_in_special_group_ui(client):
+    """
+    自动添加白名单逻辑
+    :return: 互关与特别关注的 mid 集合，出错时为 None
+    """
     try:
         logger.info("🔄 正在自动添加白名单（互关/特关）...")
-        credential = user.Credential(sessdata=config.cookies["SESSDATA"], bili_jct=config.cookies["bili_jct"])
-        
         friends_list = []
         try:
-            rel = await user.get_self_friends(credential)
+            rel = await client.get_friends()
             rel_list = rel.get("list", [])
             for iuser in rel_list:
                 friends_list.append(iuser.get("mid"))
@@ -194,11 +167,10 @@ async def is_in_special_group_ui():
 
         special_list = []
         special_sn = 1
-        await asyncio.sleep(2) 
 
         while True:
             try:
-                rel_list = await user.get_self_special_followings(credential, pn=special_sn)
+                rel_list = await client.get_special_followings(special_sn)
                 if not rel_list:
                     break
                 elif rel_list[0] in special_list:
@@ -206,7 +178,6 @@ async def is_in_special_group_ui():
                 else:
                     special_list.extend(rel_list)
                 special_sn += 1
-                await asyncio.sleep(1)
             except Exception:
                 break
         
@@ -220,209 +191,483 @@ async def is_in_special_group_ui():
                     count += 1
         
         logger.info(f"✅ 已将 {count} 个用户自动加入白名单")
+        return unique_id
 
     except Exception as e:
         logger.error(f"❌ 自动添加白名单出错: {str(e)}")
 
-async def get_follow_list_ui(status_placeholder):
-    pn = 1
-    followed_list = []
-    has_more = True
-    
+async def iter_follow_list_ui(client, progress):
+    """
+    逐页获取关注列表，边获取边产出，获取失败时记录日志后重新抛出
+    :param progress: dict，实时写入关注总数 total 与已获取数 fetched
+    """
     logger.info("📦 开始获取关注列表...")
     
-    while has_more:
-        api_url = f"https://api.bilibili.com/x/relation/followings?vmid={config.uid}&pn={pn}&ps={config.ps}"
-        try:
-            # 异步请求网络
-            response = await asyncio.to_thread(
-                requests.get, 
-                api_url, 
-                headers=config.headers, 
-                cookies=config.cookies
-            )
-            
-            resp = response.json()
-            if resp["code"] != 0:
-                logger.error(f"请求关注列表失败: {resp.get('message')}")
-                break
-                
-            data = resp.get("data", {})
-            user_list = data.get("list", [])
-            
-            if not user_list:
-                break
-
-            for iuser in user_list:
-                followed = FollowedUser(iuser.get("mid"), iuser.get("uname"))
-                followed_list.append(followed)
-
-            status_placeholder.text(f"正在爬取第 {pn} 页，已获取 {len(followed_list)} 个用户...")
-            pn += 1
-            await asyncio.sleep(1)
-
-        except Exception as e:
-            logger.error(f"爬取列表异常: {str(e)}")
-            break
-
-    logger.info(f"📊 共获取到 {len(followed_list)} 个关注用户")
-    return followed_list
-
-async def unfollow_user_action(uid, name):
     try:
-        credential = user.Credential(sessdata=config.cookies["SESSDATA"], bili_jct=config.cookies["bili_jct"])
-        u = user.User(uid=uid, credential=credential)
-        await u.modify_relation(relation=user.RelationType.UNSUBSCRIBE)
-        return True, f"🚫 已取关：{name} ({uid})"
+        async for pn, data in client.iter_followings_pages(config.ps, config.MAX_WORKERS, config.OLDEST_FIRST):
+            progress['total'] = data.get("total", progress['total'])
+            for iuser in data.get("list", []):
+                progress['fetched'] += 1
+                yield FollowedUser(iuser.get("mid"), iuser.get("uname"), mtime=iuser.get("mtime"), rank=iuser.get("rank"))
+    except BiliAPIError as e:
+        logger.error(f"请求关注列表失败: {e.message}（已获取 {progress['fetched']} 个）")
+        raise
     except Exception as e:
-        return False, f"❌ 取关失败 {name}: {str(e)}"
+        logger.error(f"爬取列表异常: {str(e)}（已获取 {progress['fetched']} 个）")
+        raise
+
+    logger.info(f"📊 共获取到 {progress['fetched']} 个关注用户")
+
+def deleted_user_decision(state, cache_tag=""):
+    """注销/封禁的用户按 REMOVE_DELETED_USER 处理"""
+    if config.REMOVE_DELETED_USER:
+        return True, f"💀{cache_tag} {state}，执行取关。", None
+    return False, f"💀{cache_tag} {state}，保留。", None
+
+async def evaluate_user(iuser, handle_user, current_ts, cache=None):
+    """
+    评估单个用户，决定是否取关
+    :return: (bool: should_delete, str: reason, last_active_ts or None)
+    """
+    # 白名单检查
+    if iuser.mid in config.ignore_list:
+        return False, f"🛡️ 用户 {iuser.name} 在白名单中，跳过。", None
+
+    # 注销检查（含批量预筛识别出的注销/封禁账号）
+    prefilter_ts, prefilter_outcome = iuser.prefilter or (None, None)
+    if iuser.name == "账号已注销" or prefilter_outcome == OUTCOME_DELETED:
+        iuser.activity = (None, OUTCOME_DELETED)
+        if cache:
+            cache.put(iuser.mid, config.DETECT_TYPE, None, OUTCOME_DELETED)
+        return deleted_user_decision("账号已注销" if iuser.name == "账号已注销" else f"{iuser.name} 已注销/被封禁")
+
+    # 批量预筛判定为直播中的无需探测，其余根据配置选择检测方式（优先读取本地缓存）
+    if prefilter_outcome == OUTCOME_ACTIVE:
+        last_active_ts, outcome, cache_tag = prefilter_ts, OUTCOME_ACTIVE, "📡"
+        if cache:
+            cache.put(iuser.mid, config.DETECT_TYPE, last_active_ts, outcome)
+    else:
+        last_active_ts, outcome, from_cache = await cached_probe(
+            cache, iuser.mid, config.DETECT_TYPE, lambda: probe_last_active(config, handle_user, active_after_ts(config, current_ts))
+        )
+        cache_tag = "💾" if from_cache else ""
+    iuser.activity = (last_active_ts, outcome)
+
+    # 缓存有效时不再预筛，缓存中的注销/封禁结果与预筛结果同样处理，不视为无记录
+    if outcome == OUTCOME_DELETED:
+        return deleted_user_decision(f"{iuser.name} 已注销/被封禁", cache_tag)
+
+    type_str = {0: "动态", 1: "投稿"}.get(config.DETECT_TYPE, "动态和投稿")
+
+    if outcome in FAILED_OUTCOMES:
+        state = "被风控拦截" if outcome == OUTCOME_BLOCKED else "探测失败"
+        return False, f"⚠️{cache_tag} {iuser.name} {state}，暂不处理。", None
+
+    if last_active_ts is None:
+        if config.REMOVE_EMPTY_DYNAMIC:
+            return True, f"📉{cache_tag} {iuser.name} 无历史{type_str}，执行取关。", None
+        return False, f"📉{cache_tag} {iuser.name} 无历史{type_str}，忽略。", None
+
+    last_active_ts = int(last_active_ts)
+    past_days = int((current_ts - last_active_ts) / 86400)
+
+    if past_days > config.INACTIVE_THRESHOLD:
+        return True, f"🗓️{cache_tag} {iuser.name} 上次活跃 {past_days} 天前 (> {config.INACTIVE_THRESHOLD}天)，取关。", last_active_ts
+    return False, f"✅{cache_tag} {iuser.name} 上次活跃 {past_days} 天前，保留。", last_active_ts
+
+def render_metrics(panel, metrics):
+    """刷新接口指标面板"""
+    with panel.container():
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("请求数", metrics.requests)
+        c2.metric("请求/秒", f"{metrics.requests / max(metrics.elapsed, 1e-6):.2f}")
+        c3.metric("网络等待累计", f"{metrics.network_time:.1f}s")
+        c4.metric("限速等待累计", f"{sum(metrics.sleep_time.values()):.1f}s")
+        if metrics.endpoints:
+            # 纯文本表格，避免引入 DataFrame 渲染开销
+            st.code(metrics.summary(), language='text')
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def load_simulator(path, owner, detect_type, version):
+    """结果库未变化（version 相同）时沿用已载入的数组，调整参数只需重新计算"""
+    from simulate import WhatIfSimulator  # NumPy 仅在模拟时需要，不影响启动
+
+    store = ResultsStore(path)
+    try:
+        return WhatIfSimulator.from_store(store, owner, detect_type)
+    finally:
+        store.close()
 
-async def process_task(progress_bar, status_text):
+def render_whatif():
+    """阈值模拟：按侧边栏当前参数，用结果库中已记录的活跃时间即时计算取关人数，不发起请求"""
+    if not (config.uid and Path(config.RESULTS_PATH).exists()):
+        return
+    st.markdown("---")
+    st.subheader("🔮 阈值模拟")
+    store = ResultsStore.from_config(config)
+    try:
+        version = store.version(config.uid)
+    finally:
+        store.close()
+    simulator = load_simulator(config.RESULTS_PATH, config.uid, config.DETECT_TYPE, version)
+    if not simulator.total:
+        st.caption("运行一次清理或生成计划后，可在此预览不同参数下的取关人数")
+        return
+    counts = simulator.simulate(
+        config.INACTIVE_THRESHOLD, config.SKIP_NUM, config.FOLLOW_PROTECT_DAYS, config.FOLLOW_PROTECT_THRESHOLD,
+        config.REMOVE_EMPTY_DYNAMIC, config.REMOVE_DELETED_USER, config.ignore_list, config.AUTO_ADD_IGNORE
+    )
+    c1, c2 = st.columns(2)
+    c1.metric("将取关", counts["unfollow"])
+    c2.metric("保留", counts["keep"])
+    st.caption(f"不活跃 {counts['inactive']} | 无记录 {counts['empty']} | 已注销 {counts['deleted']} | "
+               f"白名单 {counts['whitelisted']} | 跳过 {counts['skipped']} | 待探测 {counts['unknown']}"
+               f"（共 {counts['total']}，待探测的用户尚未探测或只知道阈值内的活跃时间，需实际运行才能判断）")
+    st.bar_chart({"人数": dict(simulator.age_distribution())}, x_label="未活跃天数", sort=False, height=200)
+
+def finish_metrics(metrics):
+    """任务结束：写入日志与 JSON 文件"""
+    logger.info(f"📈 接口统计：\n{metrics.summary()}")
+    metrics.dump(config.METRICS_PATH)
+
+async def process_task(job, checkpoint, planner=None):
+    """
+    清理任务（在后台任务线程中运行），进度写入 job.progress 供页面轮询
+    暂停时在每个用户处等待；取消时中断，检查点保留，可继续上次运行
+    """
     start_ts = time.time()
-    logger.info(f"========= 任务开始 =========")
+    logger.info(f"========= 任务开始{'（计划模式）' if planner else ''} =========")
     
-    if config.AUTO_ADD_IGNORE:
-        await is_in_special_group_ui()
+    pacer = Pacer.from_config(config)
+    job.metrics = pacer.metrics
+    cache = ActivityCache.from_config(config)
+    results = ResultsStore.from_config(config)
+    try:
+        stats = await run_process_task(job, pacer, cache, results, checkpoint, planner, start_ts)
+    except asyncio.CancelledError:
+        logger.info("⏹️ 任务已取消，已完成的进度保存在检查点中，可“继续上次运行”")
+        raise
+    finally:
+        if cache:
+            cache.close()
+        results.close()
+        finish_metrics(pacer.metrics)
+    if stats['list_error']:
+        logger.warning("⚠️ 关注列表未获取完整，已保留检查点，可“继续上次运行”重新获取关注列表")
+    else:
+        checkpoint.finish()
+    return stats
 
-    followed_list = await get_follow_list_ui(status_text)
-    
-    if not followed_list:
-        logger.info("未获取到关注用户，任务结束。")
-        return
+async def refresh_cookies_ui(client):
+    """后台检查并刷新即将过期的Cookies，失败不影响本次任务"""
+    try:
+        if await client.refresh_credentials():
+            logger.info("🔑 Cookies即将过期，已自动刷新并保存")
+    except Exception as e:
+        logger.warning(f"⚠️ 检查Cookies是否需要刷新失败：{str(e)}")
+
+async def run_process_task(job, pacer, cache, results, checkpoint, planner, start_ts):
+    """评估关注列表并取关或写入计划，返回统计"""
+    async with BiliClient.from_config(config, pacer) as client:
+        # 白名单获取、关注列表分页与用户评估在同一事件循环中并行推进
+        whitelist_task = None
+        if config.AUTO_ADD_IGNORE:
+            whitelist_task = asyncio.create_task(is_in_special_group_ui(client))
+        # 长时间运行前刷新即将过期的Cookies，与评估同时进行
+        refresh_task = asyncio.create_task(refresh_cookies_ui(client)) if config.COOKIE_REFRESH else None
+        executor = None
 
-    total = len(followed_list)
-    stats = {'success': 0, 'fail': 0, 'skip': 0}
-    current_ts = time.time()
-
-    logger.info("🚀 开始分析用户活跃度...")
-
-    for i, iuser in enumerate(followed_list):
-        # 更新进度
-        progress = (i + 1) / total
-        progress_bar.progress(progress)
-        status_text.text(f"正在处理 [{i+1}/{total}]: {iuser.name}")
-
-        # 跳过逻辑
-        if i < config.SKIP_NUM:
-            logger.info(f"⏭️ 跳过第 {i+1} 位用户: {iuser.name}")
-            stats['skip'] += 1
-            continue
-
-        handle_user = FollowedUser(iuser.mid, iuser.name)
-        should_delete = False
-        reason = ""
-
-        # 白名单检查
-        if iuser.mid in config.ignore_list:
-            reason = f"🛡️ 用户 {iuser.name} 在白名单中，跳过。"
-        elif iuser.name == "账号已注销":
-             if config.REMOVE_DELETED_USER:
-                 should_delete = True
-                 reason = "💀 账号已注销，执行取关。"
-             else:
-                 reason = "💀 账号已注销，保留。"
-        else:
-            delay = random.randint(config.LAG_START, config.LAG_END)
-            status_text.text(f"正在分析: {iuser.name} (等待 {delay}s)...")
-            await asyncio.sleep(delay)
-
-            # 根据配置选择检测方式
-            if config.DETECT_TYPE == 0:
-                last_active_data = await handle_user.get_latest_dynamic()
-                if last_active_data and 'modules' in last_active_data:
-                    last_active_ts = last_active_data['modules']['module_author']['pub_ts']
-                else:
-                    last_active_ts = None
-            else:
-                last_active_ts = await handle_user.get_latest_post_time()
-            
-            type_str = "动态" if config.DETECT_TYPE == 0 else "投稿"
-            
-            if last_active_ts is None:
-                if config.REMOVE_EMPTY_DYNAMIC:
-                    should_delete = True
-                    reason = f"📉 {iuser.name} 无历史{type_str}，执行取关。"
+        try:
+            progress_state = job.progress
+            progress_state.update(total=0, fetched=0, processed=0, current="")
+            if checkpoint.snapshot_complete:
+                # 恢复运行且快照完整时直接使用快照，不再请求关注列表
+                progress_state['total'] = progress_state['fetched'] = len(checkpoint.follows)
+                logger.info(f"⏯️ 继续上次运行：已处理 {len(checkpoint.decisions)}/{len(checkpoint.follows)}")
+            followed_users = checkpoint.record_follows(iter_follow_list_ui(client, progress_state), FollowedUser)
+            # 关注列表获取失败时，已获取的用户照常评估
+            list_errors = []
+            followed_users = buffered(catch_errors(followed_users, list_errors), config.ps * 2)
+            if config.PREFILTER_ENABLED:
+                # 已在白名单、已注销、已有决定或缓存可用的用户无需预筛
+                def should_check(iuser):
+                    if iuser.mid in config.ignore_list or iuser.name == "账号已注销":
+                        return False
+                    if iuser.mid in checkpoint.decisions:
+                        return False
+                    if iuser.rank is not None and follow_skip_reason(config, iuser, iuser.rank, time.time()):
+                        return False
+                    return not (cache and cache.contains(iuser.mid, config.DETECT_TYPE))
+                followed_users = prefilter_stage(client, followed_users, should_check)
+
+            async def numbered():
+                i = 0
+                async for iuser in followed_users:
+                    yield i, iuser
+                    i += 1
+
+            if not planner:
+                executor = UnfollowExecutor.from_config(client, config, queue_file_for(checkpoint.path))
+                if executor.queue.pending:
+                    logger.info(f"⏯️ 继续执行上次中断时未完成的 {len(executor.queue.pending)} 个取关")
+
+            async def on_unfollow(mid, name, status, message):
+                logger.info(UNFOLLOW_ICONS[status] + message, extra={"decision": DECISION_UNFOLLOW})
+                if status == UNFOLLOW_FAILED:
+                    stats['fail'] += 1
                 else:
-                    reason = f"📉 {iuser.name} 无历史{type_str}，忽略。"
+                    stats['success' if status == UNFOLLOW_DONE else 'gone'] += 1
+                    checkpoint.record_unfollow(mid)
+                    results.remove(config.uid, mid)
+                await job.wait_if_paused()
+
+            stats = {'success': 0, 'fail': 0, 'skip': 0, 'resumed': 0, 'gone': 0}
+            job.result = stats
+            current_ts = time.time()
+
+            logger.info(f"🚀 开始分析用户活跃度（并发 {config.MAX_WORKERS}，读速率 {config.READ_RATE}-{config.READ_RATE_MAX} 次/秒）...")
+
+            async def probe(item):
+                i, iuser = item
+                # 跳过逻辑
+                if follow_skip_reason(config, iuser, i, current_ts):
+                    return None
+                if iuser.mid in checkpoint.decisions:
+                    return checkpoint.decisions[iuser.mid]
+                await job.wait_if_paused()
+                if whitelist_task:
+                    await whitelist_task
+                handle_user = FollowedUser(iuser.mid, iuser.name, client)
+                return await evaluate_user(iuser, handle_user, current_ts, cache)
+
+            def probe_failed(iuser, result):
+                return result is not None and iuser.activity is not None and iuser.activity[1] in FAILED_OUTCOMES
+
+            def should_retry(item, result):
+                # 探测失败或被风控的用户延后重试；沿用此前运行缓存的失败结果时无需重试
+                iuser = item[1]
+                return probe_failed(iuser, result) and not (cache and cache.contains(iuser.mid, config.DETECT_TYPE))
+
+            async for (i, iuser), result in probe_with_retry(numbered(), probe, config.MAX_WORKERS, should_retry,
+                                                             config.RETRY_LIMIT, config.RETRY_DELAY):
+                await job.wait_if_paused()
+                # 进度由页面轮询显示（总数来自关注列表第1页）；重试的用户在最后产出，按完成数计数
+                progress_state['processed'] += 1
+                progress_state['current'] = iuser.name
+                results.record(config.uid, iuser, config.DETECT_TYPE, config.INACTIVE_THRESHOLD)
+
+                if result is None:
+                    skip_reason = follow_skip_reason(config, iuser, i, current_ts)
+                    logger.info(f"⏭️ 跳过第 {i+1} 位用户: {iuser.name}（{skip_reason}）", extra={"decision": DECISION_SKIP})
+                    stats['skip'] += 1
+                    if planner:
+                        planner.write(iuser.mid, iuser.name, DECISION_SKIP, skip_reason)
+                    continue
+
+                should_delete, reason, last_active_ts = result
+                # 探测失败的决定不写入断点，恢复运行时重新探测
+                if not probe_failed(iuser, result):
+                    checkpoint.record_decision(iuser.mid, should_delete, reason, last_active_ts)
+                logger.info(reason, extra={"decision": DECISION_UNFOLLOW if should_delete else DECISION_KEEP})
+
+                if planner:
+                    planner.write(iuser.mid, iuser.name, DECISION_UNFOLLOW if should_delete else DECISION_KEEP,
+                                  reason, last_active_ts)
+                elif should_delete and iuser.mid in checkpoint.unfollowed:
+                    logger.info(f"⏯️ {iuser.name} 已在上次运行中取关。", extra={"decision": DECISION_UNFOLLOW})
+                    stats['resumed'] += 1
+                elif should_delete and executor:
+                    # 待取关用户在后台按批执行：每批先批量确认关系，已不在关注列表的不再请求
+                    executor.add(iuser.mid, iuser.name)
+                    executor.run_ready(on_unfollow)
+
+            if executor:
+                await executor.drain(on_unfollow)
+            # 关注列表获取失败时记录原因，检查点保留以便继续运行时重新获取列表
+            stats['list_error'] = str(list_errors[0]) if list_errors else None
+
+            auto_whitelist = await whitelist_task if whitelist_task else None
+            if refresh_task:
+                await refresh_task
+            results.finish(config.uid, start_ts, auto_whitelist, complete=not stats['list_error'])
+            if progress_state['fetched'] == 0:
+                logger.info("未获取到关注用户，任务结束。")
+        
+            used_time = str(timedelta(seconds=int(time.time()-start_ts)))
+            logger.info(f"🏁 任务完成！耗时: {used_time}")
+            logger.info(f"速率: 读 {pacer.read_limiter.rate:.2f} 次/秒 | 取关 {pacer.write_limiter.rate:.2f} 次/秒 | 风控降速 {pacer.read_limiter.throttled + pacer.write_limiter.throttled} 次 | 接口熔断 {pacer.breaker.opened} 次")
+            if planner:
+                logger.info(f"📋 已生成取关计划 {planner.path}: 取关 {planner.counts[DECISION_UNFOLLOW]} | "
+                            f"保留 {planner.counts[DECISION_KEEP]} | 跳过 {planner.counts[DECISION_SKIP]}")
             else:
-                last_active_ts = int(last_active_ts)
-                past_days = int((current_ts - last_active_ts) / 86400)
-                
-                if past_days > config.INACTIVE_THRESHOLD:
-                    should_delete = True
-                    reason = f"🗓️ {iuser.name} 上次活跃 {past_days} 天前 (> {config.INACTIVE_THRESHOLD}天)，取关。"
-                else:
-                    reason = f"✅ {iuser.name} 上次活跃 {past_days} 天前，保留。"
-
-        logger.info(reason)
+                logger.info(f"统计: 成功取关 {stats['success']} | 失败 {stats['fail']} | 跳过 {stats['skip']} | 上次已取关 {stats['resumed']} | 已不在关注列表 {stats['gone']}")
+            cascade_msg = FollowedUser.cascade_summary(config.CASCADE_TIERS)
+            if cascade_msg:
+                logger.info(cascade_msg)
+            if cache:
+                logger.info(f"缓存: 命中 {cache.hits} | 未到复查日期 {cache.deferred} | 实际探测 {cache.misses}")
+            logger.info(f"========= 任务结束 =========")
+            return stats
+        finally:
+            # 取消时白名单获取也随之中止，避免在已关闭的连接池上继续请求
+            if whitelist_task and not whitelist_task.done():
+                whitelist_task.cancel()
+            if refresh_task and not refresh_task.done():
+                refresh_task.cancel()
+            if executor:
+                executor.close()
+
+async def apply_task(job, plan_path):
+    """执行取关计划（后台任务），已成功取关的用户会被跳过"""
+    start_ts = time.time()
+    logger.info(f"========= 执行取关计划 {plan_path} =========")
+    total = sum(1 for entry in read_plan(plan_path) if entry["decision"] == DECISION_UNFOLLOW)
+    stats = {'success': 0, 'fail': 0, 'done': 0, 'gone': 0}
+    job.result = stats
+    job.progress.update(total=total, fetched=total, processed=0, current="")
+
+    pacer = Pacer.from_config(config)
+    job.metrics = pacer.metrics
+    try:
+        async with BiliClient.from_config(config, pacer) as client:
+            async for entry, status, message in apply_plan(client, plan_path, config.APPLY_WORKERS,
+                                                           config.UNFOLLOW_BATCH_SIZE):
+                await job.wait_if_paused()
+                job.progress['processed'] += 1
+                job.progress['current'] = entry['name']
+                if message is None:
+                    stats['done'] += 1
+                    continue
+                logger.info(UNFOLLOW_ICONS[status] + message, extra={"decision": DECISION_UNFOLLOW})
+                stats[{UNFOLLOW_DONE: 'success', UNFOLLOW_FAILED: 'fail'}.get(status, 'gone')] += 1
+    except asyncio.CancelledError:
+        logger.info("⏹️ 已取消执行取关计划，已完成的取关不会重复执行")
+        raise
+    finally:
+        finish_metrics(pacer.metrics)
 
-        if should_delete:
-            success, msg = await unfollow_user_action(iuser.mid, iuser.name)
-            logger.info(msg)
-            if success:
-                stats['success'] += 1
-            else:
-                stats['fail'] += 1
-        
     used_time = str(timedelta(seconds=int(time.time()-start_ts)))
-    logger.info(f"🏁 任务完成！耗时: {used_time}")
-    logger.info(f"统计: 成功取关 {stats['success']} | 失败 {stats['fail']} | 跳过 {stats['skip']}")
-    logger.info(f"========= 任务结束 =========")
+    logger.info(f"🏁 计划执行完成！耗时: {used_time}")
+    logger.info(f"统计: 成功取关 {stats['success']} | 失败 {stats['fail']} | 此前已完成 {stats['done']} | 已不在关注列表 {stats['gone']}")
+    return stats
 
 # === UI 主体 ===
 
+# 后台任务在独立线程中运行，页面重跑或刷新不会中断任务
+runner = get_runner()
+job = runner.current
+busy = bool(job and job.active)
+
 with st.sidebar:
     st.header("🛠️ 参数配置")
+    if busy:
+        # 运行中的任务直接读取 config，参数在任务结束前不可修改
+        st.info("任务运行中，参数已锁定")
+    else:
     
-    config.DETECT_TYPE = st.selectbox(
-        "检测类型", 
-        options=[0, 1], 
-        format_func=lambda x: "最新动态" if x == 0 else "最新投稿",
-        index=config.DETECT_TYPE
-    )
+        config.DETECT_TYPE = st.selectbox(
+            "检测类型", 
+            options=[0, 1, 2], 
+            format_func=lambda x: {0: "最新动态", 1: "最新投稿", 2: "级联（动态+投稿）"}[x],
+            index=config.DETECT_TYPE,
+            help="级联：逐层检测，前一层未判定活跃时才检测下一层，任一层近期活跃即保留"
+        )
+        if config.DETECT_TYPE == 2:
+            costs = dict(config.CASCADE_TIERS)
+            first = st.radio(
+                "级联顺序",
+                options=["dynamic", "post"],
+                format_func=lambda x: "先动态后投稿" if x == "dynamic" else "先投稿后动态",
+                index=0 if config.CASCADE_TIERS[0][0] == "dynamic" else 1,
+                horizontal=True
+            )
+            c_dyn, c_post = st.columns(2)
+            costs["dynamic"] = c_dyn.number_input("动态成本", 0.0, 10.0, float(costs["dynamic"]), step=0.5)
+            costs["post"] = c_post.number_input("投稿成本", 0.0, 10.0, float(costs["post"]), step=0.5,
+                                                help="每层的预估请求数，用于统计级联节省的成本")
+            order = ["dynamic", "post"] if first == "dynamic" else ["post", "dynamic"]
+            config.CASCADE_TIERS = [[signal, costs[signal]] for signal in order]
     
-    config.ps = st.slider("每页爬取数量", 1, 50, config.ps)
+        config.ps = st.slider("每页爬取数量", 1, 50, config.ps)
     
-    config.INACTIVE_THRESHOLD = st.number_input(
-        "不活跃天数阈值 (天)", 
-        min_value=0, 
-        value=config.INACTIVE_THRESHOLD
-    )
+        config.INACTIVE_THRESHOLD = st.number_input(
+            "不活跃天数阈值 (天)", 
+            min_value=0, 
+            value=config.INACTIVE_THRESHOLD
+        )
     
-    config.SKIP_NUM = st.number_input(
-        "跳过最近关注人数", 
-        min_value=0, 
-        value=config.SKIP_NUM,
-        help="防止误删刚关注还没有动态的UP主"
-    )
+        config.SKIP_NUM = st.number_input(
+            "跳过最近关注人数", 
+            min_value=0, 
+            value=config.SKIP_NUM,
+            help="防止误删刚关注还没有动态的UP主"
+        )
+        config.FOLLOW_PROTECT_DAYS = st.number_input(
+            "关注保护天数",
+            min_value=0,
+            value=config.FOLLOW_PROTECT_DAYS,
+            help="关注不足该天数的用户不探测、不取关"
+        )
+        config.FOLLOW_PROTECT_THRESHOLD = st.checkbox(
+            "关注不足阈值天数的用户也跳过", config.FOLLOW_PROTECT_THRESHOLD,
+            help="关注时间短于不活跃阈值的用户不探测"
+        )
+        config.OLDEST_FIRST = st.checkbox(
+            "从最早的关注开始处理", config.OLDEST_FIRST,
+            help="优先处理最可能已不活跃的早期关注"
+        )
     
-    c1, c2 = st.columns(2)
-    config.LAG_START = c1.number_input("最小延迟(s)", 0, 60, config.LAG_START)
-    config.LAG_END = c2.number_input("最大延迟(s)", config.LAG_START, 120, config.LAG_END)
+        config.MAX_WORKERS = st.number_input("并发探测数", 1, 32, config.MAX_WORKERS)
+
+        c1, c2 = st.columns(2)
+        config.READ_RATE = c1.number_input("读速率(次/秒)", 0.05, 20.0, float(config.READ_RATE), step=0.05,
+                                           help="初始速率，请求成功时逐步提升，遇到-352/-412风控时减半")
+        config.READ_RATE_MAX = c2.number_input("读速率上限", config.READ_RATE, 20.0, max(float(config.READ_RATE_MAX), config.READ_RATE), step=0.05)
+        c3, c4 = st.columns(2)
+        config.WRITE_RATE = c3.number_input("取关速率(次/秒)", 0.05, 5.0, float(config.WRITE_RATE), step=0.05)
+        config.WRITE_RATE_MAX = c4.number_input("取关速率上限", config.WRITE_RATE, 5.0, max(float(config.WRITE_RATE_MAX), config.WRITE_RATE), step=0.05)
     
-    st.markdown("---")
-    st.subheader("⚠️ 危险选项")
-    config.REMOVE_EMPTY_DYNAMIC = st.checkbox("移除无动态/投稿用户", config.REMOVE_EMPTY_DYNAMIC)
-    config.REMOVE_DELETED_USER = st.checkbox("移除已注销用户", config.REMOVE_DELETED_USER)
+        config.CACHE_ENABLED = st.checkbox("启用活跃度缓存", config.CACHE_ENABLED,
+                                          help="在有效期内重复运行时直接使用本地记录，不再请求")
+        config.CACHE_TTL_DAYS = st.number_input("缓存有效期 (天)", 0, 365, config.CACHE_TTL_DAYS,
+                                                disabled=not config.CACHE_ENABLED)
+        config.PREFILTER_ENABLED = st.checkbox("批量预筛", config.PREFILTER_ENABLED,
+                                              help="每50个用户用一次批量请求识别直播中（活跃）与已注销/封禁用户，免去逐个探测")
+
+        c5, c6 = st.columns(2)
+        config.APPLY_WORKERS = c5.number_input("取关并发数", 1, 8, config.APPLY_WORKERS)
+        config.UNFOLLOW_BATCH_SIZE = c6.number_input("每批取关人数", 1, 50, config.UNFOLLOW_BATCH_SIZE,
+                                                     help="每批先用一次请求确认关注关系，已不在关注列表的用户不再发送取关请求")
+
+        st.markdown("---")
+        st.subheader("⚠️ 危险选项")
+        config.REMOVE_EMPTY_DYNAMIC = st.checkbox("移除无动态/投稿用户", config.REMOVE_EMPTY_DYNAMIC)
+        config.REMOVE_DELETED_USER = st.checkbox("移除已注销用户", config.REMOVE_DELETED_USER)
     
-    st.markdown("---")
-    st.subheader("🛡️ 白名单设置")
-    config.AUTO_ADD_IGNORE = st.checkbox("自动添加互关/特关到白名单", config.AUTO_ADD_IGNORE)
+        st.markdown("---")
+        st.subheader("🛡️ 白名单设置")
+        config.AUTO_ADD_IGNORE = st.checkbox("自动添加互关/特关到白名单", config.AUTO_ADD_IGNORE)
     
-    ignore_str = st.text_area("手动白名单 UID (空格分隔)", value=" ".join(map(str, config.ignore_list)))
-    try:
-        if ignore_str.strip():
-            config.ignore_list = list(map(int, ignore_str.strip().split()))
-        else:
-            config.ignore_list = []
-    except ValueError:
-        st.error("白名单格式错误，请输入数字UID")
+        ignore_str = st.text_area("手动白名单 UID (空格分隔)", value=" ".join(map(str, config.ignore_list)))
+        try:
+            if ignore_str.strip():
+                config.ignore_list = list(map(int, ignore_str.strip().split()))
+            else:
+                config.ignore_list = []
+        except ValueError:
+            st.error("白名单格式错误，请输入数字UID")
+
+    render_whatif()
 
 st.title("🧹 B站关注列表清理助手")
 
 # 登录模块
 login_container = st.container()
 with login_container:
+    # 每个会话首次打开时，验证结果仍在有效期内则直接登录
+    if not config.cookies and not st.session_state.get('login_restored'):
+        st.session_state.login_restored = True
+        restore_login()
     if not config.cookies:
         st.info("尚未检测到登录状态")
         
@@ -432,6 +677,8 @@ with login_container:
             status_text_login = st.empty()
             
             try:
+                from bilibili_api import login_v2  # 导入较慢，仅扫码登录时需要
+
                 # 1. 生成二维码
                 qr = login_v2.QrCodeLogin(platform=login_v2.QrCodeLoginChannel.WEB)
                 asyncio.run(qr.generate_qrcode())
@@ -460,9 +707,9 @@ with login_container:
                         
                         # 保存 Cookies
                         cookies = qr.get_credential().get_cookies()
-                        config.set_user_cookies(cookies)
-                        with open("cookies.json", 'w', encoding='utf-8') as f:
-                            json.dump(cookies, f, ensure_ascii=False, indent=2)
+                        credentials = CredentialManager.from_config(config)
+                        credentials.save(cookies)
+                        config.set_user_cookies(cookies, credentials)
                         
                         time.sleep(1)
                         st.rerun() 
@@ -481,42 +728,119 @@ with login_container:
                 st.rerun()
     else:
         st.success(f"已登录 (UID: {config.uid})")
-        if st.button("退出登录/切换账号"):
+        if st.button("退出登录/切换账号", disabled=busy):
+            CredentialManager.from_config(config).clear()
             config.cookies = None
-            Path("cookies.json").unlink(missing_ok=True)
+            config.credentials = None
             st.rerun()
 
 st.markdown("---")
 
 # 运行控制区域
-start_btn = st.button("🚀 开始清理", disabled=not config.cookies)
-
-progress_bar = st.progress(0)
-status_text = st.empty()
-
-# 日志区域配置
-log_expander = st.expander("📜 运行日志 (实时更新 + 本地保存)", expanded=True)
-log_container = log_expander.empty()
-
-# 绑定 Streamlit Handler 到当前容器
-# 注意：每次rerun都会重新绑定，确保日志显示在最新的容器里
-st_handler = None
-for h in logger.handlers:
-    if isinstance(h, StreamlitHandler):
-        st_handler = h
-        break
-
-if not st_handler:
-    st_handler = StreamlitHandler(log_container)
-    logger.addHandler(st_handler)
-else:
-    st_handler.log_container = log_container
-
-if start_btn:
-    # 清空旧日志显示 (UI层面)
-    st_handler.log_text = ""
-    log_container.code("任务启动...", language='text')
-    
-    # 运行主逻辑
-    asyncio.run(process_task(progress_bar, status_text))
-    st.success("✅ 所有任务执行完毕")
+run_mode = st.radio(
+    "运行模式",
+    options=["direct", "plan"],
+    format_func=lambda x: "评估并直接取关" if x == "direct" else "仅生成取关计划（稍后单独执行）",
+    horizontal=True,
+    disabled=busy
+)
+last_checkpoint = Checkpoint.load()
+c_start, c_resume, c_apply = st.columns(3)
+start_btn = c_start.button("🚀 开始清理" if run_mode == "direct" else "📋 生成取关计划", disabled=busy or not config.cookies)
+resume_btn = c_resume.button(
+    "⏯️ 继续上次运行",
+    disabled=busy or not (config.cookies and last_checkpoint),
+    help=(f"上次运行中断于 {len(last_checkpoint.decisions)} 个用户处，沿用当时的参数继续"
+          if last_checkpoint else "没有未完成的运行")
+)
+apply_btn = c_apply.button(
+    "▶️ 执行取关计划",
+    disabled=busy or not (config.cookies and Path(DEFAULT_PLAN_FILE).exists()),
+    help=f"执行 {DEFAULT_PLAN_FILE} 中的取关，已完成的用户自动跳过"
+)
+
+LOG_LEVEL_FILTERS = {"全部级别": logging.INFO, "警告及以上": logging.WARNING, "仅错误": logging.ERROR}
+LOG_DECISION_FILTERS = {"全部日志": None, "仅取关": DECISION_UNFOLLOW, "仅保留": DECISION_KEEP, "仅跳过": DECISION_SKIP}
+
+async def cleanup_job(job, checkpoint, planner):
+    """后台清理任务，结束（含取消）后关闭检查点与计划文件"""
+    try:
+        return await process_task(job, checkpoint, planner)
+    finally:
+        checkpoint.close()
+        if planner:
+            planner.close()
+
+if start_btn or resume_btn:
+    # 新运行覆盖旧检查点；继续运行时恢复当时的参数
+    checkpoint = last_checkpoint.resume(config) if resume_btn else Checkpoint.start(config)
+    planner = PlanWriter(DEFAULT_PLAN_FILE, config.uid) if run_mode == "plan" else None
+    log_buffer.clear()
+    if resume_btn and checkpoint.describe_overridden():
+        logger.warning(f"⚠️ {checkpoint.describe_overridden()}")
+    runner.submit("生成取关计划" if planner else "清理关注", cleanup_job, checkpoint, planner)
+    st.rerun()
+
+if apply_btn:
+    try:
+        check_plan_owner(DEFAULT_PLAN_FILE, config.uid)
+    except PlanError as e:
+        st.error(f"⚠️ {str(e)}")
+    else:
+        log_buffer.clear()
+        runner.submit("执行取关计划", apply_task, DEFAULT_PLAN_FILE)
+        st.rerun()
+
+@st.fragment(run_every=UI_REFRESH_INTERVAL if busy else None)
+def job_panel():
+    """
+    任务面板：运行期间按 UI_REFRESH_INTERVAL 轮询后台任务的进度、指标与日志
+    只重跑本片段，任务结束时整页重跑以解锁参数
+    """
+    job = runner.current
+    if job is None:
+        st.progress(0)
+    else:
+        progress = job.progress
+        processed = progress.get('processed', 0)
+        total = max(progress.get('total', 0), progress.get('fetched', 0), processed)
+        st.progress(processed / total if total else (1.0 if not job.active else 0.0))
+        state = JOB_STATE_NAMES[job.state]
+        if job.active:
+            st.text(f"{job.name}（{state}）[{processed}/{total}]（已获取 {progress.get('fetched', 0)}）: "
+                    f"{progress.get('current', '')}")
+            c_pause, c_cancel = st.columns(2)
+            if job.state == JOB_PAUSED:
+                c_pause.button("▶️ 继续", on_click=job.resume)
+            else:
+                c_pause.button("⏸️ 暂停", on_click=job.pause,
+                               help="当前正在进行的请求完成后暂停，不再发起新的探测")
+            c_cancel.button("⏹️ 取消", on_click=job.cancel,
+                            help="立即中断，已完成的决定与取关保存在检查点中")
+        else:
+            st.text(f"{job.name}{state}，已处理 {processed} 项，耗时 {timedelta(seconds=int(job.elapsed))}")
+            if job.state == JOB_DONE:
+                st.success(f"✅ {job.name}执行完毕")
+            elif job.error:
+                st.error(f"❌ 任务出错: {job.error}")
+            else:
+                st.warning("⏹️ 任务已取消")
+
+    # 接口指标面板：各接口请求数、延迟、错误码与限速等待
+    with st.expander("📈 接口指标", expanded=False):
+        if job and job.metrics:
+            render_metrics(st.empty(), job.metrics)
+
+    # 日志区域：过滤只影响显示，缓冲区保留全部记录，切换过滤条件即可重新查看
+    with st.expander("📜 运行日志 (实时更新 + 本地保存)", expanded=True):
+        c_level, c_decision = st.columns(2)
+        log_level = c_level.selectbox("日志级别", options=list(LOG_LEVEL_FILTERS))
+        log_decision = c_decision.selectbox("决定类型", options=list(LOG_DECISION_FILTERS))
+        lines = log_buffer.lines(LOG_VIEW_LINES, LOG_LEVEL_FILTERS[log_level], LOG_DECISION_FILTERS[log_decision])
+        st.code("\n".join(lines), language='text')
+
+    # 任务结束后整页重跑一次，解锁参数与按钮
+    if busy and not (job and job.active):
+        st.rerun()
+
+job_panel()
@@ -0,0 +1,199 @@
+"""
+冷启动耗时基准
+
+main.py：从启动进程到出现第一个交互提示（是否修改参数），登录校验请求发往本地模拟服务器
+app.py：从启动 streamlit 到健康检查通过（服务就绪），以及从启动进程到首次执行完脚本（界面就绪）
+每项重复多次取中位数，可通过 --main-cmd / --app-cmd 测量打包后的可执行文件。
+
+用法：
+    python bench/bench_startup.py --runs 5 -o startup.json
+    python bench/bench_startup.py --main-cmd dist/BiliCleaner_Terminal/BiliCleaner_Terminal \\
+        --app-cmd dist/BiliCleaner_WebUI/BiliCleaner_WebUI
+    python bench/bench_startup.py --baseline startup.json  # 与基线对比，退步时返回 1
+"""
+import argparse
+import json
+import os
+import shlex
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+from mock_server import MockBili, start_server
+
+FAKE_COOKIES = {"DedeUserID": "1", "SESSDATA": "bench", "bili_jct": "bench", "buvid3": "bench"}
+FIRST_PROMPT = "是否要修改参数"
+DEFAULT_TOLERANCE = 0.1
+
+# 在子进程中执行 app.py 一次，打印从进程启动到脚本执行完毕的耗时
+_APP_SCRIPT_RUN = """
+import sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[2], default_timeout=120)
+at.run()
+print(time.time() - float(sys.argv[1]))
+"""
+
+
+def _workdir():
+    workdir = tempfile.mkdtemp(prefix="bili_startup_")
+    Path(workdir, "cookies.json").write_text(json.dumps(FAKE_COOKIES), encoding="utf-8")
+    return workdir
+
+
+def _command(text):
+    """解析启动命令，相对路径的可执行文件转为绝对路径（子进程在临时目录中运行）"""
+    argv = shlex.split(text)
+    if Path(argv[0]).exists():
+        argv[0] = str(Path(argv[0]).resolve())
+    return argv
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_first_prompt(cmd, base_url, timeout):
+    """启动命令行版，读取输出直到出现第一个交互提示"""
+    env = dict(os.environ, PYTHONUNBUFFERED="1", PYTHONIOENCODING="utf-8")
+    argv = cmd + ["--set", f"API_BASE_URL={base_url}"]
+    start = time.perf_counter()
+    proc = subprocess.Popen(argv, cwd=_workdir(), env=env, stdin=subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    seen = threading.Event()
+    output = bytearray()
+
+    def reader():
+        while chunk := proc.stdout.read1(4096):
+            output.extend(chunk)
+            if FIRST_PROMPT.encode("utf-8") in output:
+                seen.set()
+                return
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    found = seen.wait(timeout)
+    elapsed = time.perf_counter() - start
+    proc.kill()
+    proc.wait()
+    if not found:
+        raise RuntimeError(f"{timeout}s 内未出现提示，输出：\n{output.decode('utf-8', 'replace')[-2000:]}")
+    return elapsed
+
+
+def time_server_ready(cmd, timeout):
+    """启动 Web UI，轮询健康检查直到服务就绪"""
+    port = _free_port()
+    argv = cmd + [f"--server.port={port}", "--server.headless=true", "--browser.gatherUsageStats=false"]
+    start = time.perf_counter()
+    proc = subprocess.Popen(argv, cwd=_workdir(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"Web UI 进程提前退出（{proc.returncode}）")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError(f"{timeout}s 内 Web UI 未就绪")
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def time_script_ready(timeout):
+    """新进程中导入 streamlit 并执行一次 app.py，即打开页面后界面渲染完成所需的时间"""
+    proc = subprocess.run(
+        [sys.executable, "-c", _APP_SCRIPT_RUN, str(time.time()), str(ROOT / "app.py")],
+        cwd=_workdir(), capture_output=True, text=True, timeout=timeout,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"app.py 执行失败：\n{proc.stderr[-2000:]}")
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def _stats(samples):
+    return {
+        "median": round(statistics.median(samples), 3),
+        "min": round(min(samples), 3),
+        "max": round(max(samples), 3),
+        "runs": len(samples),
+    }
+
+
+def compare(results, baseline_path, tolerance):
+    """与基线对比各项中位数，返回退步项列表"""
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base and stats["median"] > base["median"] * (1 + tolerance):
+            regressions.append(f"{name}: {base['median']}s -> {stats['median']}s")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="冷启动耗时基准")
+    parser.add_argument("--runs", type=int, default=5, help="每项重复次数")
+    parser.add_argument("--main-cmd", help="命令行版启动命令（默认 python main.py）")
+    parser.add_argument("--app-cmd", help="Web UI 启动命令（默认 python -m streamlit run app.py）")
+    parser.add_argument("--skip-main", action="store_true")
+    parser.add_argument("--skip-app", action="store_true")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("-o", "--output", help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与基线 JSON 对比")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    main_cmd = _command(args.main_cmd) if args.main_cmd else [sys.executable, str(ROOT / "main.py")]
+    app_cmd = (_command(args.app_cmd) if args.app_cmd
+               else [sys.executable, "-m", "streamlit", "run", str(ROOT / "app.py")])
+
+    server, base_url = start_server(MockBili(follows=100))
+    cases = {}
+    if not args.skip_main:
+        cases["main_first_prompt"] = lambda: time_first_prompt(main_cmd, base_url, args.timeout)
+    if not args.skip_app:
+        cases["app_server_ready"] = lambda: time_server_ready(app_cmd, args.timeout)
+        if not args.app_cmd:
+            cases["app_script_ready"] = lambda: time_script_ready(args.timeout)
+
+    results = {}
+    try:
+        for name, case in cases.items():
+            samples = [case() for _ in range(args.runs)]
+            results[name] = _stats(samples)
+            print(f"{name:18} 中位数 {results[name]['median']:.3f}s | "
+                  f"最快 {results[name]['min']:.3f}s | 最慢 {results[name]['max']:.3f}s")
+    finally:
+        server.shutdown()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"退步：{line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+端到端吞吐基准：在本地模拟服务器上跑完整清理流程
+
+分别测量 main.py 与 app.py 两条路径的每秒评估用户数、每用户请求数与峰值内存，
+每个用例在独立子进程中运行，峰值内存互不干扰。
+
+用法：
+    python bench/bench_throughput.py --follows 100 1000 10000 --path both -o bench_result.json
+    python bench/bench_throughput.py --follows 1000 --baseline bench_result.json  # 与基线对比，退步时返回 1
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(ROOT))
+
+from metrics import DEFAULT_METRICS_FILE
+from mock_server import add_mock_arguments, mock_from_args, start_server
+
+FAKE_COOKIES = {"DedeUserID": "1", "SESSDATA": "bench", "bili_jct": "bench", "buvid3": "bench"}
+# 与基线对比时允许的退步比例
+DEFAULT_TOLERANCE = 0.1
+
+
+def _rss_mb():
+    # Linux 下 ru_maxrss 单位为 KB，macOS 为字节
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _server_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/__stats") as response:
+        return json.load(response)
+
+
+def _apply_config(config, args, base_url):
+    config.set_user_cookies(FAKE_COOKIES)
+    config.API_BASE_URL = base_url
+    config.MAX_WORKERS = args.workers
+    config.READ_RATE = config.READ_RATE_MAX = args.rate
+    config.WRITE_RATE = config.WRITE_RATE_MAX = args.rate
+    config.DETECT_TYPE = args.detect_type
+    config.CACHE_ENABLED = False
+    config.PREFILTER_ENABLED = not args.no_prefilter
+
+
+def run_main_path(args, base_url):
+    """main.py 路径：直接调用 run_cleanup"""
+    import main
+    from client import BiliClient
+    from ratelimit import Pacer
+
+    # main.py 在 __main__ 中创建全局 config
+    main.config = main.Config()
+    _apply_config(main.config, args, base_url)
+
+    async def run():
+        pacer = Pacer.from_config(main.config)
+        async with BiliClient.from_config(main.config, pacer) as client:
+            await main.run_cleanup(client, None)
+        return pacer
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        pacer = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+    pacer.metrics.dump(main.config.METRICS_PATH)
+    return elapsed
+
+
+def run_app_path(args, base_url):
+    """app.py 路径：通过 Streamlit AppTest 点击“开始清理”，计时到后台任务结束，包含日志缓冲开销"""
+    from streamlit.testing.v1 import AppTest
+
+    timeout = args.timeout
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=timeout)
+    at.run()
+    config = at.session_state["config"]
+    config.set_user_cookies(FAKE_COOKIES)
+    config.API_BASE_URL = base_url
+    at.run()
+    # 侧边栏控件每次重跑都会写回 config，需通过控件设置参数
+    widgets = {w.label: w for w in list(at.number_input) + list(at.checkbox) + list(at.selectbox)}
+    widgets["并发探测数"].set_value(args.workers)
+    widgets["读速率(次/秒)"].set_value(min(args.rate, 20.0))
+    widgets["读速率上限"].set_value(min(args.rate, 20.0))
+    widgets["取关速率(次/秒)"].set_value(min(args.rate, 5.0))
+    widgets["取关速率上限"].set_value(min(args.rate, 5.0))
+    widgets["检测类型"].set_value(args.detect_type)
+    widgets["启用活跃度缓存"].set_value(False)
+    widgets["批量预筛"].set_value(not args.no_prefilter)
+    at.run()
+
+    start_btn = next(b for b in at.button if b.label == "🚀 开始清理")
+    start = time.perf_counter()
+    start_btn.click().run(timeout=timeout)
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    # 任务在后台线程中运行，等待其结束（页面轮询由 Streamlit 前端驱动，AppTest 不会自动触发）
+    import jobs
+    job = jobs.get_runner().current
+    if not job.wait(timeout):
+        raise RuntimeError(f"{timeout}s 内任务未结束")
+    elapsed = time.perf_counter() - start
+    if job.state != jobs.JOB_DONE:
+        raise RuntimeError(f"任务未完成：{job.state} {job.error or ''}")
+    at.run()
+    return elapsed
+
+
+def run_case(args):
+    """子进程内运行单个用例，输出一行 JSON"""
+    workdir = tempfile.mkdtemp(prefix="bili_bench_")
+    os.chdir(workdir)  # 日志、检查点等文件写入临时目录
+
+    server, base_url = start_server(mock_from_args(args))
+    baseline_rss = _rss_mb()
+    runner = run_main_path if args.path == "main" else run_app_path
+    elapsed = runner(args, base_url)
+    stats = _server_stats(base_url)
+    server.shutdown()
+    # 客户端侧指标（两条路径运行结束时都会写入）
+    client_metrics = json.loads(Path(DEFAULT_METRICS_FILE).read_text(encoding="utf-8"))
+
+    result = {
+        "path": args.path,
+        "follows": args.follows,
+        "workers": args.workers,
+        "rate": args.rate,
+        "detect_type": args.detect_type,
+        "latency_ms": args.latency_ms,
+        "seconds": round(elapsed, 3),
+        "users_per_sec": round(args.follows / elapsed, 2),
+        "requests": stats["requests"],
+        "requests_per_user": round(stats["requests"] / args.follows, 3),
+        "kb_per_user": round(stats["bytes"] / 1024 / args.follows, 2),
+        "by_endpoint": stats["by_endpoint"],
+        "injected": stats["injected"],
+        "unfollowed": stats["unfollowed"],
+        "network_time": client_metrics["network_time"],
+        "sleep_time": client_metrics["sleep_time"],
+        "baseline_rss_mb": round(baseline_rss, 1),
+        "peak_rss_mb": round(_rss_mb(), 1),
+    }
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def _case_argv(args, path, follows):
+    argv = [
+        sys.executable, __file__, "--case", "--path", path, "--follows", str(follows),
+        "--workers", str(args.workers), "--rate", str(args.rate), "--detect-type", str(args.detect_type),
+        "--timeout", str(args.timeout), "--seed", str(args.seed), "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms), "--page-size-cap", str(args.page_size_cap),
+        "--error-352", str(args.error_352), "--error-412", str(args.error_412), "--item-bytes", str(args.item_bytes),
+    ]
+    if args.no_prefilter:
+        argv.append("--no-prefilter")
+    return argv
+
+
+def compare(results, baseline_path, tolerance):
+    """与基线结果对比，返回退步项列表"""
+    baseline = {(r["path"], r["follows"]): r for r in json.loads(Path(baseline_path).read_text(encoding="utf-8"))}
+    regressions = []
+    for r in results:
+        base = baseline.get((r["path"], r["follows"]))
+        if not base:
+            continue
+        if r["users_per_sec"] < base["users_per_sec"] * (1 - tolerance):
+            regressions.append(f"{r['path']}/{r['follows']}: 吞吐 {base['users_per_sec']} -> {r['users_per_sec']} 用户/秒")
+        if r["requests_per_user"] > base["requests_per_user"] * (1 + tolerance):
+            regressions.append(f"{r['path']}/{r['follows']}: 每用户请求 {base['requests_per_user']} -> {r['requests_per_user']}")
+        if "kb_per_user" in base and r["kb_per_user"] > base["kb_per_user"] * (1 + tolerance):
+            regressions.append(f"{r['path']}/{r['follows']}: 每用户流量 {base['kb_per_user']} -> {r['kb_per_user']} KB")
+        if r["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{r['path']}/{r['follows']}: 峰值内存 {base['peak_rss_mb']} -> {r['peak_rss_mb']} MB")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="端到端吞吐基准")
+    add_mock_arguments(parser, follows=False)
+    parser.add_argument("--follows", type=int, nargs="+", default=[100, 1000], help="关注数，可指定多个")
+    parser.add_argument("--path", choices=["main", "app", "both"], default="both")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=20.0, help="读/写速率（app.py 界面上限为 20/5）")
+    parser.add_argument("--detect-type", type=int, choices=[0, 1, 2], default=0)
+    parser.add_argument("--no-prefilter", action="store_true")
+    parser.add_argument("--timeout", type=float, default=3600, help="app.py 路径单次运行超时（秒）")
+    parser.add_argument("-o", "--output", help="结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与基线 JSON 对比")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--case", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.case:
+        args.follows = args.follows[0]
+        run_case(args)
+        return 0
+
+    paths = ["main", "app"] if args.path == "both" else [args.path]
+    results = []
+    for follows in args.follows:
+        for path in paths:
+            proc = subprocess.run(_case_argv(args, path, follows), capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"[{path}/{follows}] 失败：\n{proc.stderr}", file=sys.stderr)
+                return 2
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"[{path:4}] 关注 {follows:>6} | {result['users_per_sec']:>8} 用户/秒 | "
+                  f"每用户请求 {result['requests_per_user']:>6} | 每用户流量 {result['kb_per_user']:>6} KB | 峰值内存 {result['peak_rss_mb']} MB | "
+                  f"耗时 {result['seconds']}s")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"退步：{line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,412 @@
+"""
+本地模拟B站接口服务器，用于压测与基准测试，无需真实账号
+
+覆盖本项目调用的全部接口：关注列表、批量用户卡片/直播状态、动态、视频、音频、专栏、
+互关、特别关注、关系查询、取关、WBI 密钥与用户空间页（w_webid）。关注数、延迟、分页上限与 -352/-412 风控比例均可配置。
+与真实接口一致，缺少 WBI 签名或行为参数的动态/视频请求返回 -352，签名错误返回 -403。
+
+用法：
+    python bench/mock_server.py --follows 10000 --latency-ms 30 --error-352 0.01
+然后将 Config.API_BASE_URL 设为输出的地址。
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlencode, urlsplit
+
+FIRST_MID = 10_000_001
+DAY = 86400
+
+# 用户类型
+KIND_ACTIVE = "active"
+KIND_INACTIVE = "inactive"
+KIND_EMPTY = "empty"
+KIND_DELETED = "deleted"
+
+WBI_IMG_KEY = "7cd084941338484aae1ad9425b84077c"
+WBI_SUB_KEY = "4932caff0ff746eab6f01bf08b70ac45"
+# WBI mixin key 重排表（独立于 client.py 实现，用于校验客户端的签名）
+MIXIN_KEY_ENC_TAB = [
+    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
+    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
+    61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
+    36, 20, 34, 44, 52,
+]
+MIXIN_KEY = "".join((WBI_IMG_KEY + WBI_SUB_KEY)[i] for i in MIXIN_KEY_ENC_TAB)[:32]
+
+
+def wbi_valid(args):
+    """校验 w_rid：除 w_rid 外的参数按键排序编码后加 mixin key 的 MD5"""
+    params = {key: value for key, value in sorted(args.items()) if key != "w_rid"}
+    return args.get("w_rid") == hashlib.md5((urlencode(params) + MIXIN_KEY).encode()).hexdigest()
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+
+class MockBili:
+    """
+    确定性的模拟数据：每个用户的类型与时间线由 (seed, mid) 决定，多次运行结果一致
+    """
+
+    def __init__(self, follows=1000, seed=0, latency_ms=0.0, jitter_ms=0.0, page_size_cap=50,
+                 error_352=0.0, error_412=0.0, inactive_ratio=0.3, empty_ratio=0.1, deleted_ratio=0.02,
+                 live_ratio=0.02, friends=20, special=10, item_bytes=256, now=None):
+        self.follows = follows
+        self.seed = seed
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.page_size_cap = page_size_cap
+        self.error_352 = error_352
+        self.error_412 = error_412
+        self.ratios = (
+            (KIND_INACTIVE, inactive_ratio),
+            (KIND_EMPTY, empty_ratio),
+            (KIND_DELETED, deleted_ratio),
+        )
+        self.live_ratio = live_ratio
+        self.friends = min(friends, follows)
+        self.special = min(special, follows)
+        self.filler = "x" * item_bytes
+        self.now = now or time.time()
+        self.unfollowed = set()
+        self._followings = None
+        self.counts = Counter()
+        self.injected = Counter()
+        self.bytes_sent = 0  # 已发送的响应体字节数（不含 /__stats）
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def _user_rng(self, mid, salt=0):
+        return random.Random(self.seed * 1_000_003 + mid * 31 + salt)
+
+    def kind(self, mid):
+        r = self._user_rng(mid).random()
+        for kind, ratio in self.ratios:
+            if r < ratio:
+                return kind
+            r -= ratio
+        return KIND_ACTIVE
+
+    def last_active(self, mid):
+        rng = self._user_rng(mid, 1)
+        kind = self.kind(mid)
+        if kind == KIND_ACTIVE:
+            return int(self.now - rng.uniform(0, 300) * DAY)
+        if kind == KIND_INACTIVE:
+            return int(self.now - rng.uniform(400, 2000) * DAY)
+        return None
+
+    def is_live(self, mid):
+        return self.kind(mid) == KIND_ACTIVE and self._user_rng(mid, 2).random() < self.live_ratio
+
+    def timeline(self, mid, count, spacing_days=7.0):
+        """最新的 count 条内容时间戳（降序）"""
+        last = self.last_active(mid)
+        if last is None:
+            return []
+        rng = self._user_rng(mid, 3)
+        total = rng.randint(1, 60)
+        ts = []
+        for _ in range(min(count, total)):
+            ts.append(last)
+            last -= int(rng.uniform(0.5, 2) * spacing_days * DAY)
+        return ts
+
+    def followings(self):
+        """当前关注列表，取关后失效重建"""
+        with self._lock:
+            if self._followings is None:
+                self._followings = [FIRST_MID + i for i in range(self.follows)
+                                    if FIRST_MID + i not in self.unfollowed]
+            return self._followings
+
+    def _name(self, mid):
+        return "账号已注销" if self.kind(mid) == KIND_DELETED else f"user_{mid}"
+
+    # === 接口实现，返回 data 字段 ===
+
+    def api_followings(self, q):
+        pn = int(q.get("pn", 1))
+        ps = min(int(q.get("ps", 50)), self.page_size_cap)
+        mids = self.followings()
+        page = mids[(pn - 1) * ps: pn * ps]
+        users = [{
+            "mid": mid,
+            "uname": self._name(mid),
+            "mtime": int(self.now - (mid - FIRST_MID) * 3600),
+            "sign": self.filler,
+        } for mid in page]
+        return {"list": users, "total": len(mids), "re_version": 0}
+
+    def api_user_cards(self, q):
+        mids = [int(mid) for mid in q.get("uids", "").split(",") if mid]
+        return [{
+            "mid": mid,
+            "name": self._name(mid),
+            "silence": 0,
+            "face": self.filler,
+        } for mid in mids]
+
+    def api_live_status(self, body):
+        return {str(mid): {"uid": mid, "live_status": 1 if self.is_live(mid) else 0}
+                for mid in body.get("uids", [])}
+
+    def api_dynamics(self, q):
+        mid = int(q["host_mid"])
+        items = [{
+            "id_str": str(ts),
+            "modules": {"module_author": {"mid": mid, "pub_ts": ts}, "module_dynamic": {"desc": self.filler}},
+        } for ts in self.timeline(mid, 12, spacing_days=3)]
+        # 模拟置顶动态：较早的动态排在第一条
+        if len(items) > 2 and self._user_rng(mid, 4).random() < 0.2:
+            items.insert(0, items.pop(2))
+        return {"items": items, "has_more": len(items) >= 12, "offset": ""}
+
+    def api_videos(self, q):
+        mid = int(q["mid"])
+        vlist = [{"aid": ts, "created": ts, "description": self.filler}
+                 for ts in self.timeline(mid, int(q.get("ps", 30)))]
+        return {"list": {"vlist": vlist}, "page": {"pn": int(q.get("pn", 1)), "count": len(vlist)}}
+
+    def api_audios(self, q):
+        mid = int(q["uid"])
+        # 音频很少，只给部分用户
+        if self._user_rng(mid, 5).random() > 0.1:
+            return {"data": None, "totalSize": 0}
+        audios = [{"id": ts, "ctime": ts * 1000, "intro": self.filler}
+                  for ts in self.timeline(mid, int(q.get("ps", 30)), spacing_days=30)]
+        return {"data": audios, "totalSize": len(audios)}
+
+    def api_articles(self, q):
+        mid = int(q["mid"])
+        if self._user_rng(mid, 6).random() > 0.2:
+            return {"articles": [], "count": 0}
+        articles = [{"id": ts, "publish_time": ts, "summary": self.filler}
+                    for ts in self.timeline(mid, int(q.get("ps", 30)), spacing_days=14)]
+        return {"articles": articles, "count": len(articles)}
+
+    def api_friends(self, q):
+        mids = self.followings()[:self.friends]
+        return {"list": [{"mid": mid, "uname": self._name(mid)} for mid in mids]}
+
+    def api_special(self, q):
+        # 与线上一致：特别关注不分页，任意页码返回同一列表
+        return self.followings()[-self.special:] if self.special else []
+
+    def api_relations(self, q):
+        mids = [int(mid) for mid in q.get("fids", "").split(",") if mid]
+        following = set(self.followings())
+        return {str(mid): {"mid": mid, "attribute": 2, "mtime": int(self.now), "tag": None, "special": 0}
+                for mid in mids if mid in following}
+
+    def api_modify(self, form):
+        if not form.get("csrf"):
+            raise MockError(-111, "csrf 校验失败")
+        with self._lock:
+            self.unfollowed.add(int(form["fid"]))
+            self._followings = None
+        return None
+
+    def api_nav(self, q):
+        return {
+            "isLogin": True,
+            "mid": 1,
+            "uname": "bench",
+            "wbi_img": {
+                "img_url": f"https://i0.hdslb.com/bfs/wbi/{WBI_IMG_KEY}.png",
+                "sub_url": f"https://i0.hdslb.com/bfs/wbi/{WBI_SUB_KEY}.png",
+            },
+        }
+
+    def space_page(self, mid):
+        """用户空间动态页：内嵌 percent-encoding 的渲染数据，其中 access_id 为 JWT"""
+        access_id = ".".join((_b64({"alg": "HS256"}), _b64({"iat": int(time.time()), "ttl": 86400, "mid": mid}), "sig"))
+        render_data = quote(json.dumps({"access_id": access_id}))
+        return (f'<html><head><script id="__RENDER_DATA__" type="application/json">{render_data}</script>'
+                f'</head><body>{self.filler}</body></html>').encode()
+
+    def inject(self):
+        """按比例注入风控，返回 None / -352 / -412"""
+        with self._lock:
+            r = self._rng.random()
+        if r < self.error_352:
+            return -352
+        if r < self.error_352 + self.error_412:
+            return -412
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": sum(self.counts.values()),
+                "by_endpoint": dict(self.counts),
+                "injected": dict(self.injected),
+                "unfollowed": len(self.unfollowed),
+                "bytes": self.bytes_sent,
+            }
+
+
+class MockError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+GET_ROUTES = {
+    "/x/relation/followings": "api_followings",
+    "/account/v1/user/cards": "api_user_cards",
+    "/x/polymer/web-dynamic/v1/feed/space": "api_dynamics",
+    "/x/space/wbi/arc/search": "api_videos",
+    "/audio/music-service/web/song/upper": "api_audios",
+    "/x/space/wbi/article": "api_articles",
+    "/x/relation/friends": "api_friends",
+    "/x/relation/tag/special": "api_special",
+    "/x/relation/relations": "api_relations",
+    "/x/web-interface/nav": "api_nav",
+}
+POST_ROUTES = {
+    "/room/v1/Room/get_status_info_by_uids": "api_live_status",
+    "/x/relation/modify": "api_modify",
+}
+# 需要 WBI 签名的接口
+WBI_ROUTES = {"/x/polymer/web-dynamic/v1/feed/space", "/x/space/wbi/arc/search", "/x/space/wbi/article"}
+# 缺少时返回 -352 的参数（行为参数与 w_webid 等）
+REQUIRED_PARAMS = {
+    "/x/polymer/web-dynamic/v1/feed/space": {"features", "dm_img_str", "dm_img_inter"},
+    "/x/space/wbi/arc/search": {"dm_img_str", "dm_img_inter", "w_webid"},
+}
+SPACE_PAGE_PATH = re.compile(r"^/(\d+)/dynamic$")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 保持长连接，与客户端连接池一致
+    mock = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, content_type="application/json; charset=utf-8"):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if urlsplit(self.path).path != "/__stats":
+            with self.mock._lock:
+                self.mock.bytes_sent += len(body)
+
+    def _handle(self, routes, parse_body):
+        mock = self.mock
+        parts = urlsplit(self.path)
+        if parts.path == "/__stats":
+            return self._send(200, mock.stats())
+        page = SPACE_PAGE_PATH.match(parts.path)
+        if page:
+            with mock._lock:
+                mock.counts["/{mid}/dynamic"] += 1
+            return self._send(200, mock.space_page(int(page.group(1))), "text/html; charset=utf-8")
+        name = routes.get(parts.path)
+        if name is None:
+            return self._send(404, {"code": -404, "message": "啥都木有"})
+        with mock._lock:
+            mock.counts[parts.path] += 1
+        args = parse_body()
+        if mock.latency or mock.jitter:
+            time.sleep(mock.latency + random.random() * mock.jitter)
+        if parts.path != "/x/web-interface/nav":
+            code = mock.inject()
+            if code is not None:
+                with mock._lock:
+                    mock.injected[code] += 1
+                if code == -412:
+                    return self._send(412, b"<html>412 Precondition Failed</html>", "text/html")
+                return self._send(200, {"code": code, "message": "风控校验失败"})
+        if parts.path in WBI_ROUTES and not ("w_rid" in args and "wts" in args):
+            return self._send(200, {"code": -352, "message": "风控校验失败"})
+        if parts.path in WBI_ROUTES and not wbi_valid(args):
+            return self._send(200, {"code": -403, "message": "访问权限不足"})
+        if not REQUIRED_PARAMS.get(parts.path, set()) <= args.keys():
+            return self._send(200, {"code": -352, "message": "风控校验失败"})
+        try:
+            data = getattr(mock, name)(args)
+        except MockError as e:
+            return self._send(200, {"code": e.code, "message": e.message})
+        self._send(200, {"code": 0, "message": "0", "data": data})
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        query = lambda: {k: v[-1] for k, v in parse_qs(urlsplit(self.path).query, keep_blank_values=True).items()}
+        self._handle(GET_ROUTES, query)
+
+    def do_POST(self):
+        def body():
+            raw = self._read_body()
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                return json.loads(raw or b"{}")
+            return {k: v[-1] for k, v in parse_qs(raw.decode()).items()}
+        self._handle(POST_ROUTES, body)
+
+
+def start_server(mock, host="127.0.0.1", port=0):
+    """
+    在后台线程启动模拟服务器
+    :return: (server, base_url)，结束时调用 server.shutdown()
+    """
+    handler = type("MockHandler", (Handler,), {"mock": mock})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_mock_arguments(parser, follows=True):
+    if follows:
+        parser.add_argument("--follows", type=int, default=1000, help="关注数（100 ~ 100000）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="每个请求的固定延迟")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="额外随机延迟上限")
+    parser.add_argument("--page-size-cap", type=int, default=50, help="关注列表每页上限")
+    parser.add_argument("--error-352", type=float, default=0.0, help="注入 -352 的比例")
+    parser.add_argument("--error-412", type=float, default=0.0, help="注入 HTTP 412 的比例")
+    parser.add_argument("--item-bytes", type=int, default=256, help="每条内容的填充字节数，模拟真实响应体积")
+
+
+def mock_from_args(args):
+    return MockBili(
+        follows=args.follows, seed=args.seed, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        page_size_cap=args.page_size_cap, error_352=args.error_352, error_412=args.error_412,
+        item_bytes=args.item_bytes,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟B站接口服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    server, base_url = start_server(mock_from_args(args), args.host, args.port)
+    print(f"模拟服务器已启动：{base_url}（关注数 {args.follows}）", flush=True)
+    print(f"统计：{base_url}/__stats", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
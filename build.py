@@ -1,3 +1,4 @@
+import argparse
 import PyInstaller.__main__
 import os
 import shutil
@@ -17,6 +18,13 @@ WEB_SCRIPT_NAME = "app.py"
 TERMINAL_SCRIPT_NAME = "main.py"
 WEB_EXE_NAME = "BiliCleaner_WebUI"
 TERMINAL_EXE_NAME = "BiliCleaner_Terminal"
+# app.py 以数据文件形式打包，其依赖的项目内模块需一并复制
+SHARED_MODULES = ["cache.py", "checkpoint.py", "client.py", "credential.py", "engine.py", "jobs.py", "metrics.py", "plan.py", "prefilter.py", "probe.py", "ratelimit.py", "results.py", "simulate.py", "unfollow.py"]
+
+# 启动优化构建（--fast）排除的用不到的库；PIL 的 hook 会带入 tkinter
+FAST_EXCLUDES = ["tkinter", "matplotlib", "IPython", "pytest"]
+# 终端版不使用 streamlit 及其数据依赖
+TERMINAL_EXCLUDES = ["streamlit", "pandas", "numpy", "pyarrow", "altair", "pydeck"]
 
 def get_streamlit_path():
     """获取 streamlit 库的安装路径"""
@@ -43,7 +51,7 @@ if __name__ == '__main__':
         "run",
         resolve_path("{WEB_SCRIPT_NAME}"),
         "--global.developmentMode=false",
-    ]
+    ] + sys.argv[1:]  # 透传额外参数，如 --server.port
     sys.exit(stcli.main())
 """
     with open("web_runner.py", "w", encoding="utf-8") as f:
@@ -53,30 +61,40 @@ if __name__ == '__main__':
 COMMON_HIDDEN_IMPORTS = [
     '--hidden-import=bilibili_api',
     '--hidden-import=httpx',
+    '--hidden-import=orjson',
     '--hidden-import=aiohttp',
     '--hidden-import=tqdm',
     '--collect-all=curl_cffi',
     '--collect-all=bilibili_api',
 ]
 
-def build_terminal():
+def fast_args(excludes=()):
+    """
+    启动优化构建参数：
+    onedir 免去 onefile 每次启动时的解压；不使用 UPX，启动时无需解压缩；排除用不到的库
+    """
+    args = ['--onedir', '--noupx']
+    args.extend(f'--exclude-module={module}' for module in FAST_EXCLUDES + list(excludes))
+    return args
+
+def build_terminal(fast=False):
     print(f">>> 正在构建终端版程序 [{TERMINAL_EXE_NAME}]...")
     
     args = [
         TERMINAL_SCRIPT_NAME,
         f'--name={TERMINAL_EXE_NAME}',
-        '--onefile',
         '--clean',
         '--console',
         '--distpath=dist',
     ]
+    args.extend(fast_args(TERMINAL_EXCLUDES) if fast else ['--onefile'])
     
     args.extend(COMMON_HIDDEN_IMPORTS)
     
     PyInstaller.__main__.run(args)
     print(">>> 终端版构建完成。")
 
-def build_webui():
+def build_webui(fast=False):
     print(f">>> 正在构建 WebUI 版程序 [{WEB_EXE_NAME}]...")
     
     create_web_runner()
@@ -88,20 +106,24 @@ def build_webui():
         f"{os.path.join(st_path, 'static')}{sep}streamlit/static",
         f"{os.path.join(st_path, 'runtime')}{sep}streamlit/runtime",
     ]
+    datas.extend(f"{module}{sep}." for module in SHARED_MODULES)
 
     args = [
         'web_runner.py',
         f'--name={WEB_EXE_NAME}',
-        '--onefile',
         '--clean',
         '--noconsole',
         '--distpath=dist',
-        f'--add-data={datas[0]}',
-        f'--add-data={datas[1]}',
-        f'--add-data={datas[2]}',
         '--copy-metadata=streamlit',
         '--hidden-import=streamlit',
     ]
+    args.extend(f'--add-data={data}' for data in datas)
+    if fast:
+        args.extend(fast_args())
+        # 项目模块以预编译字节码打入归档，优先于同名源码被导入，启动时无需编译
+        args.extend(f'--hidden-import={module[:-3]}' for module in SHARED_MODULES)
+    else:
+        args.append('--onefile')
     
     args.extend(COMMON_HIDDEN_IMPORTS)
 
@@ -112,7 +134,14 @@ def build_webui():
         
     print(">>> WebUI 版构建完成。")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="打包终端版与 WebUI 版可执行文件")
+    parser.add_argument("--fast", action="store_true",
+                        help="启动优化构建：输出目录形式（dist/<名称>/），启动更快，需整个目录一起分发")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
     if os.path.exists("build"):
         shutil.rmtree("build")
     if os.path.exists("dist"):
@@ -123,9 +152,9 @@ if __name__ == "__main__":
         if not (importlib.util.find_spec("httpx") or importlib.util.find_spec("aiohttp")):
             print("Warning: httpx or aiohttp not found.")
         
-        build_terminal()
+        build_terminal(args.fast)
         print("-" * 30)
-        build_webui()
+        build_webui(args.fast)
         print("-" * 30)
         print("Build Finished Successfully!")
     except Exception as e:
@@ -0,0 +1,187 @@
+import asyncio
+import sqlite3
+import time
+from collections import namedtuple
+
+# 探测结果类型
+OUTCOME_ACTIVE = "active"    # 获取到最后活跃时间
+OUTCOME_EMPTY = "empty"      # 无动态/无投稿
+OUTCOME_DELETED = "deleted"  # 账号已注销
+OUTCOME_ERROR = "error"      # 探测失败（网络异常等，可重试）
+OUTCOME_BLOCKED = "blocked"  # 被风控拦截（-352/-412），可重试
+# 未能判断活跃度的结果：不作为“无记录”处理，也不据此取关
+FAILED_OUTCOMES = {OUTCOME_ERROR, OUTCOME_BLOCKED}
+
+
+def within_threshold(last_active_ts, now, threshold_days):
+    """最后活跃时间距 now 未超过阈值（与 past_days 按整天数取整的方式一致）"""
+    return last_active_ts > now - (threshold_days + 1) * 86400
+
+
+ActivityRecord = namedtuple(
+    "ActivityRecord", "mid detect_type last_active_ts outcome probed_at threshold next_check_at"
+)
+
+
+class ActivityCache:
+    """
+    以 mid 为键的本地活跃度缓存（SQLite）
+    记录最后活跃时间、检测类型、探测时间与结果，在 TTL 内重复运行无需再次请求
+    同时记录每个用户的下次复查时间：最后活跃于 T 的用户在 T + 阈值之前不可能变为不活跃，期间无需探测
+    """
+
+    def __init__(self, path="activity_cache.db", ttl_days=7, error_ttl_hours=1, threshold_days=None):
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.error_ttl = error_ttl_hours * 3600
+        self.threshold_days = threshold_days
+        self.hits = 0
+        self.deferred = 0
+        self.misses = 0
+        self.joined = 0
+        self.started_at = time.time()
+        self._inflight = {}  # 正在探测的 (mid, detect_type) -> Future，多账号共用缓存时合并同一用户的并发探测
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS activity (
+                mid INTEGER NOT NULL,
+                detect_type INTEGER NOT NULL,
+                last_active_ts REAL,
+                outcome TEXT NOT NULL,
+                probed_at REAL NOT NULL,
+                threshold INTEGER,
+                next_check_at REAL,
+                PRIMARY KEY (mid, detect_type)
+            )
+        """)
+        # 兼容旧版缓存文件
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(activity)")}
+        for column, column_type in (("threshold", "INTEGER"), ("next_check_at", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE activity ADD COLUMN {column} {column_type}")
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config, required=False):
+        """
+        :param required: 未启用缓存时仍返回仅存于内存的缓存（多账号模式下用于共享探测结果）
+        """
+        if not config.CACHE_ENABLED:
+            if not required:
+                return None
+            return cls(":memory:", config.CACHE_TTL_DAYS, config.CACHE_ERROR_TTL_HOURS, config.INACTIVE_THRESHOLD)
+        return cls(config.CACHE_PATH, config.CACHE_TTL_DAYS, config.CACHE_ERROR_TTL_HOURS, config.INACTIVE_THRESHOLD)
+
+    def _is_fresh(self, record, now):
+        if record.outcome in FAILED_OUTCOMES:
+            # 本次运行中的失败需要重试，只沿用此前运行的失败记录
+            return record.probed_at < self.started_at and now - record.probed_at < self.error_ttl
+        if record.outcome == OUTCOME_ACTIVE and self._stale_lower_bound(record, now):
+            return False
+        return now - record.probed_at < self.ttl
+
+    def _stale_lower_bound(self, record, now):
+        """
+        探测时在阈值内的活跃时间可能来自提前结束的探测（只记录最先返回的来源），只是下限
+        按当前阈值（调低阈值或时间推移后）已判定为不活跃时不能沿用，需要重新探测
+        """
+        if self.threshold_days is None or within_threshold(record.last_active_ts, now, self.threshold_days):
+            return False
+        return record.threshold is None or within_threshold(record.last_active_ts, record.probed_at, record.threshold)
+
+    def _is_deferred(self, record, now):
+        """未到复查时间：阈值未调低且当前时间早于下次复查时间"""
+        if record.outcome != OUTCOME_ACTIVE or record.next_check_at is None:
+            return False
+        # 阈值调低后原复查时间偏晚，需要重新探测
+        if self.threshold_days is None or record.threshold is None or self.threshold_days < record.threshold:
+            return False
+        return now < record.next_check_at
+
+    def _load(self, mid, detect_type):
+        row = self._conn.execute(
+            "SELECT mid, detect_type, last_active_ts, outcome, probed_at, threshold, next_check_at "
+            "FROM activity WHERE mid = ? AND detect_type = ?",
+            (int(mid), detect_type),
+        ).fetchone()
+        return ActivityRecord(*row) if row else None
+
+    def get(self, mid, detect_type, now=None):
+        """返回仍可使用的缓存记录（未过期或未到复查时间），否则返回 None"""
+        record = self._load(mid, detect_type)
+        now = now or time.time()
+        if record and self._is_fresh(record, now):
+            self.hits += 1
+            return record
+        if record and self._is_deferred(record, now):
+            self.deferred += 1
+            return record
+        self.misses += 1
+        return None
+
+    def contains(self, mid, detect_type, now=None):
+        """是否存在可直接使用的记录（不计入命中统计）"""
+        record = self._load(mid, detect_type)
+        if not record:
+            return False
+        now = now or time.time()
+        return self._is_fresh(record, now) or self._is_deferred(record, now)
+
+    def put(self, mid, detect_type, last_active_ts, outcome, probed_at=None):
+        next_check_at = None
+        if outcome == OUTCOME_ACTIVE and last_active_ts is not None and self.threshold_days is not None:
+            next_check_at = float(last_active_ts) + self.threshold_days * 86400
+        self._conn.execute(
+            "INSERT OR REPLACE INTO activity "
+            "(mid, detect_type, last_active_ts, outcome, probed_at, threshold, next_check_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (int(mid), detect_type, last_active_ts, outcome, probed_at or time.time(),
+             self.threshold_days, next_check_at),
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+async def cached_probe(cache, mid, detect_type, probe):
+    """
+    优先读取缓存，未命中时调用 probe 并写回缓存
+    同一用户已在探测中时等待其结果，不重复请求（探测失败或被取消时自行探测）
+    :param probe: async 函数，返回 (last_active_ts, outcome)
+    :return: (last_active_ts, outcome, from_cache)
+    """
+    if not cache:
+        last_active_ts, outcome = await probe()
+        return last_active_ts, outcome, False
+
+    key = (int(mid), detect_type)
+    pending = cache._inflight.get(key)
+    if pending:
+        await asyncio.wait([pending])
+        if not pending.cancelled() and pending.exception() is None:
+            cache.joined += 1
+            last_active_ts, outcome = pending.result()
+            return last_active_ts, outcome, True
+
+    record = cache.get(mid, detect_type)
+    if record:
+        return record.last_active_ts, record.outcome, True
+
+    future = asyncio.get_running_loop().create_future()
+    cache._inflight[key] = future
+    try:
+        last_active_ts, outcome = await probe()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # 标记为已读取，无人等待时不产生警告
+        raise
+    finally:
+        if cache._inflight.get(key) is future:
+            del cache._inflight[key]
+    cache.put(mid, detect_type, last_active_ts, outcome)
+    future.set_result((last_active_ts, outcome))
+    return last_active_ts, outcome, False
@@ -0,0 +1,159 @@
+import json
+import time
+from pathlib import Path
+
+from unfollow import queue_file_for
+
+DEFAULT_CHECKPOINT_FILE = "checkpoint.jsonl"
+
+# 不写入检查点的运行时字段（登录凭据等）
+_EXCLUDED_CONFIG_KEYS = {"cookies", "uid", "headers", "credentials"}
+
+
+def _snapshot_config(config):
+    snapshot = {}
+    for key, value in vars(config).items():
+        if key in _EXCLUDED_CONFIG_KEYS:
+            continue
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        snapshot[key] = value
+    return snapshot
+
+
+class Checkpoint:
+    """
+    运行检查点（JSON Lines，逐条追加写入）
+    记录运行参数、关注列表快照、已完成的决定与取关，中断后可从断点继续
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_FILE):
+        self.path = Path(path)
+        self.config = None
+        self.started_at = None
+        self.follows = []
+        self.snapshot_complete = False
+        self.decisions = {}
+        self.unfollowed = set()
+        self.overridden = {}  # 恢复运行时与当前设置不同、被检查点覆盖的参数：key -> (当前值, 检查点中的值)
+        self._file = None
+
+    @classmethod
+    def load(cls, path=DEFAULT_CHECKPOINT_FILE):
+        """读取未完成的运行，不存在时返回 None"""
+        checkpoint = cls(path)
+        if not checkpoint.path.exists():
+            return None
+        with open(checkpoint.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 崩溃时最后一行可能只写了一半
+                    continue
+                kind = record["type"]
+                if kind == "start":
+                    checkpoint.config = record["config"]
+                    checkpoint.started_at = record["ts"]
+                elif kind == "reset_follows":
+                    checkpoint.follows = []
+                    checkpoint.snapshot_complete = False
+                elif kind == "follow":
+                    checkpoint.follows.append((record["mid"], record["name"], record.get("mtime"), record.get("rank")))
+                elif kind == "snapshot_done":
+                    checkpoint.snapshot_complete = True
+                elif kind == "decision":
+                    checkpoint.decisions[record["mid"]] = (
+                        record["should_delete"], record["reason"], record["last_active_ts"]
+                    )
+                elif kind == "unfollow":
+                    checkpoint.unfollowed.add(record["mid"])
+        if checkpoint.config is None:
+            return None
+        return checkpoint
+
+    @classmethod
+    def start(cls, config, path=DEFAULT_CHECKPOINT_FILE):
+        """开始新的运行，覆盖旧检查点"""
+        checkpoint = cls(path)
+        checkpoint.config = _snapshot_config(config)
+        checkpoint.started_at = time.time()
+        checkpoint._file = open(checkpoint.path, "w", encoding="utf-8")
+        # 上次运行遗留的取关队列属于旧的决定，随检查点一起清空
+        Path(queue_file_for(checkpoint.path)).unlink(missing_ok=True)
+        checkpoint._write({"type": "start", "ts": checkpoint.started_at, "config": checkpoint.config})
+        return checkpoint
+
+    def resume(self, config):
+        """
+        恢复运行参数并继续追加写入
+        已处理的决定依据检查点中的参数，继续运行时同样使用这些参数；与当前设置不同的记录在 overridden 中，由调用方提示
+        """
+        self.overridden = {}
+        for key, value in self.config.items():
+            if key in _EXCLUDED_CONFIG_KEYS:
+                continue
+            current = getattr(config, key, None)
+            if current != value:
+                self.overridden[key] = (current, value)
+            setattr(config, key, value)
+        self._file = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def describe_overridden(self):
+        """被检查点覆盖的参数说明，没有时返回 None"""
+        if not self.overridden:
+            return None
+        brief = lambda value: f"{len(value)}项" if isinstance(value, (list, dict)) and len(value) > 3 else repr(value)
+        changes = "，".join(f"{key}：{brief(current)} → {brief(value)}" for key, (current, value) in self.overridden.items())
+        return f"以下参数与本次设置不同，已恢复为上次运行的值：{changes}"
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    async def record_follows(self, source, factory):
+        """
+        透传关注列表并写入快照；恢复运行且快照完整时直接从快照产出，不再请求关注列表
+        source 出错时异常照常抛出，快照不标记为完整，恢复运行时重新获取
+        :param source: 产出关注用户（含 mid、name、mtime、rank）的异步生成器，获取失败时应抛出异常
+        :param factory: factory(mid, name, mtime=, rank=)，由快照构造关注用户对象
+        """
+        if self.snapshot_complete:
+            for mid, name, mtime, rank in self.follows:
+                yield factory(mid, name, mtime=mtime, rank=rank)
+            return
+        # 新运行或快照不完整（中断于获取列表阶段）时重新获取
+        if self.follows:
+            self._write({"type": "reset_follows"})
+            self.follows = []
+        async for iuser in source:
+            self._write({"type": "follow", "mid": iuser.mid, "name": iuser.name, "mtime": iuser.mtime, "rank": iuser.rank})
+            yield iuser
+        self.snapshot_complete = True
+        self._write({"type": "snapshot_done"})
+
+    def record_decision(self, mid, should_delete, reason, last_active_ts):
+        # 恢复运行时重放的决定已在检查点中
+        if mid in self.decisions:
+            return
+        self._write({
+            "type": "decision", "mid": mid, "should_delete": should_delete,
+            "reason": reason, "last_active_ts": last_active_ts,
+        })
+
+    def record_unfollow(self, mid):
+        self.unfollowed.add(mid)
+        self._write({"type": "unfollow", "mid": mid})
+
+    def finish(self):
+        """运行完成，删除检查点"""
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,434 @@
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import time
+from urllib.parse import unquote, urlencode, urlsplit
+
+import httpx
+
+try:
+    import orjson  # 可选依赖：解析速度约为标准库的数倍
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+from engine import probe_users
+from ratelimit import BiliAPIError
+
+FOLLOWINGS_API = "https://api.bilibili.com/x/relation/followings"
+USER_CARDS_API = "https://api.vc.bilibili.com/account/v1/user/cards"
+LIVE_STATUS_API = "https://api.live.bilibili.com/room/v1/Room/get_status_info_by_uids"
+DYNAMICS_API = "https://api.bilibili.com/x/polymer/web-dynamic/v1/feed/space"
+VIDEOS_API = "https://api.bilibili.com/x/space/wbi/arc/search"
+AUDIOS_API = "https://api.bilibili.com/audio/music-service/web/song/upper"
+ARTICLES_API = "https://api.bilibili.com/x/space/wbi/article"
+FRIENDS_API = "https://api.bilibili.com/x/relation/friends"
+SPECIAL_FOLLOWINGS_API = "https://api.bilibili.com/x/relation/tag/special"
+MODIFY_RELATION_API = "https://api.bilibili.com/x/relation/modify"
+RELATIONS_API = "https://api.bilibili.com/x/relation/relations"
+NAV_API = "https://api.bilibili.com/x/web-interface/nav"
+# 用户空间动态页，页面内嵌的 access_id 即视频接口所需的 w_webid
+SPACE_DYNAMIC_PAGE = "https://space.bilibili.com/{mid}/dynamic"
+# w_webid 与被访问的用户无关，每个客户端获取一次；视频接口返回 -352 时重新获取，但两次获取至少间隔此秒数，
+# 避免风控期间每次失败都多请求一次页面
+WEBID_REFRESH_INTERVAL = 300
+
+# 指标中使用的接口名
+ENDPOINT_NAMES = {
+    FOLLOWINGS_API: "followings",
+    USER_CARDS_API: "user_cards",
+    LIVE_STATUS_API: "live_status",
+    DYNAMICS_API: "dynamics",
+    VIDEOS_API: "videos",
+    AUDIOS_API: "audios",
+    ARTICLES_API: "articles",
+    FRIENDS_API: "friends",
+    SPECIAL_FOLLOWINGS_API: "special_followings",
+    MODIFY_RELATION_API: "modify_relation",
+    RELATIONS_API: "relations",
+    NAV_API: "nav",
+    SPACE_DYNAMIC_PAGE: "space_page",
+}
+
+# WBI 签名的 mixin key 重排表
+MIXIN_KEY_ENC_TAB = [
+    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
+    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
+    61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
+    36, 20, 34, 44, 52,
+]
+WBI_KEY_TTL = 6 * 3600
+# WBI 签名时默认附带的 web_location（与 bilibili_api 一致）
+WBI_WEB_LOCATION = 1550101
+# 动态接口的请求参数，与 bilibili_api 的 User.get_dynamics_new 一致；缺少时接口返回 -352
+DYNAMIC_FEATURES = ("itemOpusStyle,listOnlyfans,opusBigCover,onlyfansVote,forwardListHidden,decorationCard,"
+                    "commentsNewVersion,onlyfansAssetsV2,ugcDelete,onlyfansQaCard")
+DYNAMIC_DEVICE_REQ = '{"platform":"web","device":"pc"}'
+DYNAMIC_WEB_REQ = '{"spm_id":"333.1387"}'
+RENDER_DATA_MARK = '<script id="__RENDER_DATA__" type="application/json">'
+# 活跃度探测只需最新一条，投稿接口按发布时间倒序且每页只取1条
+PROBE_PAGE_SIZE = 1
+
+
+def _mixin_key(img_key, sub_key):
+    orig = img_key + sub_key
+    return "".join(orig[i] for i in MIXIN_KEY_ENC_TAB)[:32]
+
+
+def dm_params(params):
+    """添加鼠标/键盘行为参数（dm_img_*），动态与视频接口校验这些参数，需在 WBI 签名前添加"""
+    dm_rand = "ABCDEFGHIJK"
+    return dict(
+        params,
+        dm_img_list="[]",
+        dm_img_str="".join(random.sample(dm_rand, 2)),
+        dm_cover_img_str="".join(random.sample(dm_rand, 2)),
+        dm_img_inter='{"ds":[],"wh":[0,0,0],"of":[0,0,0]}',
+    )
+
+
+def wbi_sign(params, mixin_key, wts=None):
+    """为参数添加 wts 与 w_rid 签名，未指定 web_location 时使用默认值"""
+    params = {key: int(value) if isinstance(value, bool) else value for key, value in params.items()}
+    params.setdefault("web_location", WBI_WEB_LOCATION)
+    params["wts"] = int(wts or time.time())
+    params = {
+        key: "".join(ch for ch in str(value) if ch not in "!'()*")
+        for key, value in sorted(params.items())
+    }
+    params["w_rid"] = hashlib.md5((urlencode(params) + mixin_key).encode()).hexdigest()
+    return params
+
+
+class BiliClient:
+    """
+    单次运行共享的客户端上下文
+    持有长连接池与共享的 Cookies/请求头，探测、白名单与取关的所有请求都经过同一连接池
+    :param base_url: 替换所有接口的协议与域名（如本地模拟服务器），为空时请求B站官方接口
+    :param credentials: CredentialManager，用于运行中刷新 cookies
+    """
+
+    def __init__(self, cookies, headers, pacer, max_connections=10, base_url=None, credentials=None):
+        self.cookies = cookies
+        self.credentials = credentials
+        self.uid = cookies["DedeUserID"]
+        self.pacer = pacer
+        self.metrics = pacer.metrics
+        self.base_url = base_url.rstrip("/") if base_url else None
+        self._wbi_key = None
+        self._wbi_key_at = 0
+        self._wbi_lock = asyncio.Lock()
+        self._webid = None  # (w_webid, 过期时间, 获取时间)
+        self._webid_lock = asyncio.Lock()
+        self.session = httpx.AsyncClient(
+            headers=headers,
+            cookies=cookies,
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    @classmethod
+    def from_config(cls, config, pacer):
+        return cls(config.cookies, config.headers, pacer, max_connections=max(config.MAX_WORKERS, 2) * 2,
+                   base_url=config.API_BASE_URL, credentials=getattr(config, "credentials", None))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.session.aclose()
+
+    async def refresh_credentials(self):
+        """
+        检查 cookies 是否即将过期，需要时刷新并写回 cookies 文件，之后的请求使用新 cookies
+        :return: 是否刷新了 cookies
+        """
+        if not self.credentials or not await self.credentials.refresh_if_needed():
+            return False
+        self.cookies = self.credentials.cookies
+        self.session.cookies.update(self.cookies)
+        return True
+
+    def _url(self, url):
+        if not self.base_url:
+            return url
+        parts = urlsplit(url)
+        return self.base_url + parts.path
+
+    async def _request(self, method, url, **kwargs):
+        """
+        发起请求并记录接口指标（延迟、返回码）
+        非零返回码抛出 BiliAPIError 以便限速器识别风控
+        """
+        endpoint = ENDPOINT_NAMES.get(url, urlsplit(url).path)
+        start = time.monotonic()
+        try:
+            response = await self.session.request(method, self._url(url), **kwargs)
+        except Exception as e:
+            self.metrics.observe(endpoint, time.monotonic() - start, type(e).__name__)
+            raise
+        elapsed = time.monotonic() - start
+        # 412 风控时返回的是HTML页面
+        if response.status_code == 412:
+            self.metrics.observe(endpoint, elapsed, -412, response.num_bytes_downloaded)
+            raise BiliAPIError(-412, "请求被拦截")
+        resp = _loads(response.content)
+        code = resp.get("code")
+        self.metrics.observe(endpoint, elapsed, code, response.num_bytes_downloaded)
+        if code != 0:
+            raise BiliAPIError(code, resp.get("message", "非零返回"))
+        return resp
+
+    async def get_json(self, url, params=None):
+        """通过共享连接池发起 GET 请求"""
+        return await self._request("GET", url, params=params)
+
+    async def post_json(self, url, json=None):
+        """通过共享连接池发起 JSON POST 请求"""
+        return await self._request("POST", url, json=json)
+
+    async def post_form(self, url, data=None):
+        """通过共享连接池发起表单 POST 请求"""
+        return await self._request("POST", url, data=data)
+
+    async def _get_wbi_key(self):
+        """获取 WBI mixin key，按 WBI_KEY_TTL 缓存"""
+        async with self._wbi_lock:
+            if self._wbi_key is None or time.time() - self._wbi_key_at > WBI_KEY_TTL:
+                # 未登录时 nav 返回 -101，但仍会携带 wbi_img
+                start = time.monotonic()
+                response = await self.session.get(self._url(NAV_API))
+                self.metrics.observe(ENDPOINT_NAMES[NAV_API], time.monotonic() - start)
+                wbi_img = _loads(response.content)["data"]["wbi_img"]
+                img_key = wbi_img["img_url"].rsplit("/", 1)[-1].split(".")[0]
+                sub_key = wbi_img["sub_url"].rsplit("/", 1)[-1].split(".")[0]
+                self._wbi_key = _mixin_key(img_key, sub_key)
+                self._wbi_key_at = time.time()
+            return self._wbi_key
+
+    async def get_wbi_json(self, url, params):
+        """带 WBI 签名的 GET 请求，签名在实际发出时生成"""
+        return await self.get_json(url, wbi_sign(params, await self._get_wbi_key()))
+
+    async def get_dm_wbi_json(self, url, params):
+        """带行为参数与 WBI 签名的 GET 请求（动态、视频接口）"""
+        return await self.get_wbi_json(url, dm_params(params))
+
+    async def get_page(self, url, **fields):
+        """
+        获取网页，返回文本
+        :param url: 网址模板（如 SPACE_DYNAMIC_PAGE），指标与熔断按模板统计，fields 用于填充模板
+        """
+        endpoint = ENDPOINT_NAMES.get(url, urlsplit(url).path)
+        start = time.monotonic()
+        try:
+            response = await self.session.get(self._url(url.format(**fields)))
+        except Exception as e:
+            self.metrics.observe(endpoint, time.monotonic() - start, type(e).__name__)
+            raise
+        elapsed = time.monotonic() - start
+        if response.status_code == 412:
+            self.metrics.observe(endpoint, elapsed, -412, response.num_bytes_downloaded)
+            raise BiliAPIError(-412, "请求被拦截")
+        self.metrics.observe(endpoint, elapsed, 0, response.num_bytes_downloaded)
+        return response.text
+
+    async def get_webid(self, mid):
+        """
+        获取视频接口所需的 w_webid：用户空间动态页内嵌的 access_id（JWT），每个客户端只获取一次，按其有效期缓存
+        :param mid: 获取时访问的用户空间（w_webid 与该用户无关）
+        :return: w_webid，页面中没有时返回 None，请求不带该参数（与 bilibili_api 一致）
+        """
+        async with self._webid_lock:
+            if self._webid and self._webid[1] > time.time():
+                return self._webid[0]
+            fetched_at = time.time()
+            access_id, expires_at = await self._fetch_webid(mid)
+            self._webid = (access_id, expires_at or fetched_at + WBI_KEY_TTL, fetched_at)
+            return access_id
+
+    async def _fetch_webid(self, mid):
+        """请求用户空间页并解析 access_id，返回 (access_id, 过期时间)，没有时为 (None, None)"""
+        page = await self.pacer.read(self.get_page, SPACE_DYNAMIC_PAGE, mid=mid)
+        start = page.find(RENDER_DATA_MARK)
+        if start == -1:
+            return None, None
+        start += len(RENDER_DATA_MARK)
+        render_data = json.loads(unquote(page[start:page.index("</script>", start)]))
+        access_id = render_data.get("access_id")
+        if not access_id:
+            return None, None
+        payload = access_id.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return access_id, claims["iat"] + claims["ttl"]
+
+    def _drop_webid(self, w_webid):
+        """
+        视频接口返回 -352 时丢弃正在使用的 w_webid，下次重新获取
+        :return: 是否已丢弃（已被其他请求更新或距上次获取不足 WEBID_REFRESH_INTERVAL 时不丢弃）
+        """
+        if not self._webid or self._webid[0] != w_webid:
+            return False
+        if time.time() - self._webid[2] < WEBID_REFRESH_INTERVAL:
+            return False
+        self._webid = None
+        return True
+
+    async def get_followings_page(self, pn, ps):
+        """获取一页关注列表"""
+        params = {"vmid": self.uid, "pn": pn, "ps": ps}
+        resp = await self.pacer.read(self.get_json, FOLLOWINGS_API, params)
+        return resp.get("data", {})
+
+    async def iter_followings_pages(self, ps, workers=4, oldest_first=False):
+        """
+        逐页产出关注列表 (pn, data)，data["list"] 已按 mid 去重，每个用户附带 rank（从最新关注起的序号，0 开始）
+        根据第1页的 total 规划全部页码，其余页面在共享限速下并发获取
+        :param oldest_first: 从最早的关注开始产出（页码与页内顺序均倒序）；获取期间新增关注时个别用户可能本次未被产出
+        """
+        seen = set()
+        shifted = False
+
+        def dedup(data, pn):
+            nonlocal shifted
+            users = []
+            for j, iuser in enumerate(data.get("list") or []):
+                mid = iuser.get("mid")
+                if mid in seen:
+                    shifted = True
+                    continue
+                seen.add(mid)
+                iuser["rank"] = (pn - 1) * ps + j
+                users.append(iuser)
+            if oldest_first:
+                users.reverse()
+            return dict(data, list=users)
+
+        first = await self.get_followings_page(1, ps)
+        first_list = first.get("list") or []
+        if not first_list or not oldest_first:
+            yield 1, dedup(first, 1)
+        if not first_list:
+            return
+
+        pages = math.ceil(first.get("total", 0) / ps)
+        last_size = len(first_list)
+        pn = 1
+        fetch = lambda page: self.get_followings_page(page, ps)
+        if oldest_first:
+            # 第1页（最新关注）最后产出
+            async for pn, data in probe_users(range(pages, 1, -1), fetch, workers):
+                yield pn, dedup(data, pn)
+            yield 1, dedup(first, 1)
+            return
+
+        async for pn, data in probe_users(range(2, pages + 1), fetch, workers):
+            last_size = len(data.get("list") or [])
+            yield pn, dedup(data, pn)
+
+        # 获取期间新增关注会使列表整体后移（表现为跨页重复），此时末页之后可能仍有用户
+        while shifted and last_size >= ps:
+            pn += 1
+            data = await self.get_followings_page(pn, ps)
+            last_size = len(data.get("list") or [])
+            if last_size:
+                yield pn, dedup(data, pn)
+
+    async def get_user_cards(self, mids):
+        """批量获取用户卡片（一次多个 uid），返回 {mid: card}"""
+        params = {"uids": ",".join(str(mid) for mid in mids)}
+        resp = await self.pacer.read(self.get_json, USER_CARDS_API, params)
+        return {int(card["mid"]): card for card in resp.get("data") or []}
+
+    async def get_live_status(self, mids):
+        """批量获取直播间状态（一次多个 uid），返回 {mid: info}"""
+        resp = await self.pacer.read(self.post_json, LIVE_STATUS_API, {"uids": [int(mid) for mid in mids]})
+        return {int(uid): info for uid, info in (resp.get("data") or {}).items()}
+
+    # 以下探测方法只返回最新发布时间（秒），无内容时返回 None，响应中的其余字段不再向上传递
+
+    async def latest_dynamic_ts(self, mid):
+        """
+        最新动态的发布时间
+        动态接口不支持指定每页数量，只读取前两条的 pub_ts：置顶动态可能早于第二条，取两者中较新者
+        """
+        params = {
+            "host_mid": mid,
+            "offset": "",
+            "features": DYNAMIC_FEATURES,
+            "timezone_offset": -480,
+            "x-bili-device-req-json": DYNAMIC_DEVICE_REQ,
+            "x-bili-web-req-json": DYNAMIC_WEB_REQ,
+        }
+        resp = await self.pacer.read(self.get_dm_wbi_json, DYNAMICS_API, params)
+        items = (resp.get("data") or {}).get("items") or []
+        timestamps = [int(item["modules"]["module_author"]["pub_ts"]) for item in items[:2]]
+        return max(timestamps) if timestamps else None
+
+    @staticmethod
+    def _with_webid(params, w_webid):
+        return dict(params, w_webid=w_webid) if w_webid else params
+
+    async def latest_video_ts(self, mid):
+        """最新视频的发布时间"""
+        params = {
+            "mid": mid, "ps": PROBE_PAGE_SIZE, "tid": 0, "pn": 1, "keyword": "", "order": "pubdate",
+            "order_avoided": True, "platform": "web",
+        }
+        w_webid = await self.get_webid(mid)
+        try:
+            resp = await self.pacer.read(self.get_dm_wbi_json, VIDEOS_API, self._with_webid(params, w_webid))
+        except BiliAPIError as e:
+            # w_webid 失效时接口同样返回 -352：重新获取后重试一次
+            if e.code != -352 or not self._drop_webid(w_webid):
+                raise
+            w_webid = await self.get_webid(mid)
+            resp = await self.pacer.read(self.get_dm_wbi_json, VIDEOS_API, self._with_webid(params, w_webid))
+        vlist = ((resp.get("data") or {}).get("list") or {}).get("vlist") or []
+        return vlist[0]["created"] if vlist else None
+
+    async def latest_audio_ts(self, mid):
+        """最新音频的发布时间（接口返回毫秒）"""
+        params = {"uid": mid, "ps": PROBE_PAGE_SIZE, "pn": 1, "order": 1}
+        resp = await self.pacer.read(self.get_json, AUDIOS_API, params)
+        audios = (resp.get("data") or {}).get("data") or []
+        return audios[0]["ctime"] / 1000 if audios else None
+
+    async def latest_article_ts(self, mid):
+        """最新专栏的发布时间"""
+        params = {"mid": mid, "ps": PROBE_PAGE_SIZE, "pn": 1, "sort": "publish_time"}
+        resp = await self.pacer.read(self.get_wbi_json, ARTICLES_API, params)
+        articles = (resp.get("data") or {}).get("articles") or []
+        return articles[0]["publish_time"] if articles else None
+
+    async def get_nav(self):
+        """获取当前登录账号信息，cookies 失效时抛出 BiliAPIError(-101)"""
+        resp = await self.pacer.read(self.get_json, NAV_API)
+        return resp.get("data") or {}
+
+    async def get_friends(self):
+        """获取互关用户"""
+        resp = await self.pacer.read(self.get_json, FRIENDS_API)
+        return resp.get("data") or {}
+
+    async def get_special_followings(self, pn, ps=50):
+        """获取一页特别关注，返回 mid 列表"""
+        resp = await self.pacer.read(self.get_json, SPECIAL_FOLLOWINGS_API, {"pn": pn, "ps": ps})
+        return resp.get("data") or []
+
+    async def get_relations(self, mids):
+        """批量查询当前账号与多个用户的关系，返回 {mid: attribute}，未关注的用户可能不在结果中"""
+        params = {"fids": ",".join(str(mid) for mid in mids)}
+        resp = await self.pacer.read(self.get_json, RELATIONS_API, params)
+        return {int(mid): relation.get("attribute", 0) for mid, relation in (resp.get("data") or {}).items()}
+
+    async def unfollow(self, mid):
+        """取关用户（写请求）"""
+        data = {"fid": mid, "act": 2, "re_src": 11, "csrf": self.cookies["bili_jct"]}
+        return await self.pacer.write(self.post_form, MODIFY_RELATION_API, data)
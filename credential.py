@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+DEFAULT_COOKIE_FILE = "cookies.json"
+
+
+def write_json_atomic(path, data):
+    """先写入同目录的临时文件再替换，写入中途崩溃不会留下损坏的文件"""
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+class CredentialManager:
+    """
+    登录凭据管理：读取与原子写入 cookies 文件，缓存验证结果，运行前按需刷新 cookies
+    验证结果（账号信息与验证时间）写入 <cookies文件>.check，按 SESSDATA 摘要对应，有效期内启动无需请求
+    """
+
+    def __init__(self, path=DEFAULT_COOKIE_FILE, check_ttl_hours=12):
+        self.path = Path(path)
+        self.check_path = Path(f"{path}.check")
+        self.check_ttl = check_ttl_hours * 3600
+        self.cookies = None
+
+    @classmethod
+    def from_config(cls, config, path=DEFAULT_COOKIE_FILE):
+        return cls(path, config.LOGIN_CHECK_TTL_HOURS)
+
+    def load(self):
+        """
+        读取 cookies 文件
+        文件不存在时抛出 OSError，损坏或缺少 DedeUserID 时抛出 json.JSONDecodeError / KeyError
+        """
+        with open(self.path, "r", encoding="utf-8") as f:
+            cookies = json.load(f)
+        cookies["DedeUserID"]
+        self.cookies = cookies
+        return cookies
+
+    def save(self, cookies, info=None):
+        """
+        原子写入 cookies 文件
+        :param info: 已知有效时（扫码登录、刷新后）的账号信息，同时记录为验证结果
+        """
+        write_json_atomic(self.path, cookies)
+        self.cookies = cookies
+        if info:
+            self._record(info)
+        else:
+            self.invalidate()
+
+    def clear(self):
+        """退出登录：删除 cookies 文件与验证结果"""
+        self.path.unlink(missing_ok=True)
+        self.invalidate()
+        self.cookies = None
+
+    def _fingerprint(self):
+        return hashlib.sha256(str(self.cookies.get("SESSDATA", "")).encode()).hexdigest()[:16]
+
+    def _record(self, info):
+        write_json_atomic(self.check_path, {
+            "fingerprint": self._fingerprint(),
+            "checked_at": time.time(),
+            "info": {"uname": info.get("uname"), "mid": info.get("mid")},
+        })
+
+    def invalidate(self):
+        """清除验证结果，下次启动重新验证"""
+        self.check_path.unlink(missing_ok=True)
+
+    def cached_info(self):
+        """有效期内且与当前 cookies 对应的验证结果（账号信息），没有时返回 None"""
+        try:
+            record = json.loads(self.check_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if record.get("fingerprint") != self._fingerprint():
+            return None
+        if time.time() - record.get("checked_at", 0) > self.check_ttl:
+            return None
+        return record.get("info")
+
+    async def validate(self, fetch_info):
+        """
+        验证 cookies：有效期内直接使用缓存的验证结果，否则调用 fetch_info 请求验证
+        :param fetch_info: async 函数，返回账号信息（如 nav 接口），cookies 失效时抛出异常
+        :return: 账号信息 {"uname", "mid"}
+        """
+        info = self.cached_info()
+        if info:
+            return info
+        info = await fetch_info()
+        self._record(info)
+        return info
+
+    async def refresh_if_needed(self):
+        """
+        用 bilibili_api 的刷新检查（一次请求）判断 cookies 是否即将过期，需要时刷新并写回文件
+        没有 ac_time_value（refresh_token）时无法刷新，直接返回
+        :return: 是否刷新了 cookies
+        """
+        if not self.cookies or not self.cookies.get("ac_time_value"):
+            return False
+        # bilibili_api 导入较慢，在线程中导入，不阻塞事件循环
+        bilibili_api = await asyncio.to_thread(importlib.import_module, "bilibili_api")
+        credential = bilibili_api.Credential.from_cookies(self.cookies)
+        try:
+            if not await credential.check_refresh():
+                return False
+        except Exception:
+            # 检查失败（如 cookies 已失效）时，下次启动重新验证
+            self.invalidate()
+            raise
+        # 刷新前的验证结果（账号信息不变），刷新后的 cookies 由接口签发，无需再次验证
+        info = self.cached_info()
+        await credential.refresh()
+        refreshed = {key: value for key, value in credential.get_cookies().items() if value}
+        self.save(dict(self.cookies, **refreshed), info)
+        return True
@@ -0,0 +1,191 @@
+import asyncio
+import time
+from collections import deque
+
+
+class _Failure:
+    """生产者异常的队列占位"""
+    def __init__(self, exc):
+        self.exc = exc
+
+
+_DONE = object()
+
+
+async def _as_async_iter(items):
+    for item in items:
+        yield item
+
+
+async def buffered(source, maxsize):
+    """
+    将异步生成器放入后台运行，通过有界队列与消费方衔接
+    生产者最多领先消费者 maxsize 项，内存占用与总数无关
+    """
+    queue = asyncio.Queue(maxsize)
+
+    async def producer():
+        try:
+            async for item in source:
+                await queue.put(item)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(_Failure(e))
+            return
+        await queue.put(_DONE)
+
+    task = asyncio.create_task(producer())
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.exc
+            yield item
+    finally:
+        task.cancel()
+
+
+async def catch_errors(source, errors):
+    """
+    透传上游产出；上游出错时结束迭代并将异常追加到 errors，下游照常处理已产出的项
+    :param errors: list，调用方据此判断上游是否完整产出
+    """
+    try:
+        async for item in source:
+            yield item
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        errors.append(e)
+
+
+async def probe_users(users, probe, workers=4):
+    """
+    有界并发探测引擎
+    最多 workers 个探测同时进行，结果按输入顺序流式产出，便于日志与进度显示
+    :param users: 待探测对象的可迭代序列或异步可迭代序列
+    :param probe: async 函数 probe(item) -> result
+    :return: async generator of (item, result)
+    """
+    workers = max(1, workers)
+    semaphore = asyncio.Semaphore(workers)
+    # 窗口限制已提交但未产出的任务数量，避免一次性为所有用户创建任务
+    window = workers * 2
+    pending = deque()
+    source = users if hasattr(users, "__aiter__") else _as_async_iter(users)
+    next_item = None
+    exhausted = False
+
+    async def run(item):
+        async with semaphore:
+            return await probe(item)
+
+    try:
+        while pending or not exhausted:
+            # 窗口未满时同时等待下一个输入与队首结果，输入较慢时已完成的结果也能及时产出
+            if not exhausted and len(pending) < window:
+                if next_item is None:
+                    next_item = asyncio.ensure_future(anext(source))
+                waits = {next_item}
+                if pending:
+                    waits.add(pending[0][1])
+                await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+                if next_item.done():
+                    future, next_item = next_item, None
+                    try:
+                        item = future.result()
+                    except StopAsyncIteration:
+                        exhausted = True
+                    else:
+                        pending.append((item, asyncio.ensure_future(run(item))))
+            if pending and (exhausted or len(pending) >= window or pending[0][1].done()):
+                head, task = pending.popleft()
+                yield head, await task
+    finally:
+        if next_item is not None:
+            next_item.cancel()
+        for _, task in pending:
+            task.cancel()
+
+
+async def probe_with_retry(users, probe, workers=4, should_retry=None, retries=3, base_delay=5.0):
+    """
+    在 probe_users 之上增加延后重试队列
+    should_retry(item, result) 为真的项暂不产出，主流程结束后按指数退避分轮重试：
+    第 n 次重试不早于上次失败后 base_delay * 2^(n-1) 秒；重试 retries 次后无论成败都会产出
+    :return: async generator of (item, result)，重试的项在主流程之后产出
+    """
+    queue = []  # [(due, attempt, item)]
+    async for item, result in probe_users(users, probe, workers):
+        if should_retry and retries and should_retry(item, result):
+            queue.append((time.monotonic() + base_delay, 1, item))
+            continue
+        yield item, result
+
+    while queue:
+        # 失败时刻相近，每轮等到最早的到期时间后一起重试，仍未到期的项留到下一轮
+        queue.sort(key=lambda entry: entry[0])
+        delay = queue[0][0] - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        now = time.monotonic()
+        due = [entry for entry in queue if entry[0] <= now]
+        queue = [entry for entry in queue if entry[0] > now]
+        attempts = {id(item): attempt for _, attempt, item in due}
+        async for item, result in probe_users([item for _, _, item in due], probe, workers):
+            attempt = attempts[id(item)]
+            if attempt < retries and should_retry(item, result):
+                queue.append((time.monotonic() + base_delay * 2 ** attempt, attempt + 1, item))
+                continue
+            yield item, result
+
+
+async def race_until(probes, accept, hedge_delay=1.0):
+    """
+    错峰并发：按顺序启动多个探测，任一结果满足 accept 时取消其余探测并立即返回
+    前一个探测已完成（结果不满足）或超过 hedge_delay 仍未返回时才启动下一个，
+    排在前面的探测命中时只需一次请求
+    :param probes: 无参 async 函数列表，按命中可能性从高到低排列
+    :param accept: accept(result) -> bool
+    :return: (results, winner)，results 与 probes 一一对应（未启动或已取消为 None，异常为异常对象），
+             winner 为满足条件的下标，没有则为 None
+    """
+    results = [None] * len(probes)
+    tasks = {}
+    next_index = 0
+
+    def launch():
+        nonlocal next_index
+        tasks[asyncio.ensure_future(probes[next_index]())] = next_index
+        next_index += 1
+
+    try:
+        if probes:
+            launch()
+        while tasks:
+            timeout = hedge_delay if next_index < len(probes) else None
+            done, _ = await asyncio.wait(set(tasks), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                # 超时未返回，错峰启动下一个
+                launch()
+                continue
+            for task in done:
+                i = tasks.pop(task)
+                try:
+                    results[i] = task.result()
+                except Exception as e:
+                    results[i] = e
+                    continue
+                if accept(results[i]):
+                    return results, i
+            # 已完成的探测未能判定，补充启动后续探测
+            for _ in done:
+                if next_index < len(probes):
+                    launch()
+        return results, None
+    finally:
+        for task in tasks:
+            task.cancel()
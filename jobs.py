@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import threading
+import time
+import traceback
+from collections import deque, namedtuple
+
+JOB_RUNNING = "running"
+JOB_PAUSED = "paused"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+JOB_STATE_NAMES = {
+    JOB_RUNNING: "运行中", JOB_PAUSED: "已暂停", JOB_DONE: "已完成", JOB_FAILED: "出错", JOB_CANCELLED: "已取消",
+}
+
+LOG_BUFFER_SIZE = 2000  # 日志环形缓冲的条数上限
+
+# 日志记录；decision 为取关/保留/跳过（plan.DECISION_*），其余日志为 None
+LogEntry = namedtuple("LogEntry", "created levelno decision message")
+
+
+class LogBuffer(logging.Handler):
+    """
+    将日志以结构化记录存入有界环形缓冲，供页面轮询显示
+    只追加不渲染，可在后台线程中安全写入；页面每次只取过滤后最近的若干行
+    """
+
+    def __init__(self, size=LOG_BUFFER_SIZE):
+        super().__init__()
+        self.records = deque(maxlen=size)
+
+    def emit(self, record):
+        try:
+            self.records.append(LogEntry(record.created, record.levelno,
+                                         getattr(record, "decision", None), record.getMessage()))
+        except Exception:
+            self.handleError(record)
+
+    def lines(self, limit, min_level=logging.NOTSET, decision=None):
+        """过滤后最近的 limit 行"""
+        with self.lock:
+            entries = list(self.records)
+        lines = deque(maxlen=limit)
+        for entry in entries:
+            if entry.levelno >= min_level and (decision is None or entry.decision == decision):
+                lines.append(entry.message)
+        return list(lines)
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+
+class Job:
+    """
+    后台任务的状态、进度与控制（暂停/继续/取消）
+    任务协程在工作线程中写入 progress 等字段，页面线程只读取
+    """
+
+    def __init__(self, name, loop):
+        self.name = name
+        self.state = JOB_RUNNING
+        self.progress = {}  # 由任务自行更新，如 processed / total / current
+        self.metrics = None  # 任务的 Metrics，供页面显示接口指标
+        self.result = None
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self._loop = loop
+        self._future = None
+        self._unpaused = asyncio.Event()
+        self._unpaused.set()
+        self._finished = threading.Event()
+
+    @property
+    def active(self):
+        return self.state in (JOB_RUNNING, JOB_PAUSED)
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    async def wait_if_paused(self):
+        """任务在处理每个单元前调用，暂停期间在此等待"""
+        await self._unpaused.wait()
+
+    def pause(self):
+        if self.state == JOB_RUNNING:
+            self.state = JOB_PAUSED
+            self._loop.call_soon_threadsafe(self._unpaused.clear)
+
+    def resume(self):
+        if self.state == JOB_PAUSED:
+            self.state = JOB_RUNNING
+            self._loop.call_soon_threadsafe(self._unpaused.set)
+
+    def cancel(self):
+        """取消任务，正在等待的请求会被中断"""
+        if self.active and self._future:
+            self._future.cancel()
+
+    def wait(self, timeout=None):
+        """阻塞等待任务结束（基准测试与脚本使用）"""
+        return self._finished.wait(timeout)
+
+
+class JobRunner:
+    """
+    常驻后台线程的事件循环，任务不受页面重跑影响
+    同一时间只运行一个任务；进程内唯一，通过 get_runner() 获取
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.current = None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="job-runner", daemon=True)
+        self._thread.start()
+
+    def submit(self, name, func, *args):
+        """
+        提交任务
+        :param func: 协程函数 func(job, *args)，返回值存入 job.result
+        :return: Job；已有任务在运行时抛出 RuntimeError
+        """
+        with self._lock:
+            if self.current and self.current.active:
+                raise RuntimeError(f"任务“{self.current.name}”仍在运行")
+            job = Job(name, self.loop)
+            job._future = asyncio.run_coroutine_threadsafe(self._run(job, func, args), self.loop)
+            self.current = job
+        return job
+
+    async def _run(self, job, func, args):
+        try:
+            job.result = await func(job, *args)
+            job.state = JOB_DONE
+        except asyncio.CancelledError:
+            job.state = JOB_CANCELLED
+        except Exception as e:
+            job.error = "".join(traceback.format_exception_only(e)).strip()
+            job.state = JOB_FAILED
+            logging.getLogger(__name__).error(traceback.format_exc())
+        finally:
+            job.finished_at = time.time()
+            job._finished.set()
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
@@ -1,13 +1,30 @@
+import argparse
 import asyncio
+import contextlib
+import contextvars
+import copy
 from datetime import timedelta
 import json
 import logging
-import random
+import os
+import sys
 import time
+import tomllib
 from pathlib import Path
 
-import requests
-from bilibili_api import login_v2, sync, user
+from cache import FAILED_OUTCOMES, OUTCOME_ACTIVE, OUTCOME_BLOCKED, OUTCOME_DELETED, ActivityCache, cached_probe
+from checkpoint import DEFAULT_CHECKPOINT_FILE, Checkpoint
+from client import BiliClient
+from credential import DEFAULT_COOKIE_FILE, CredentialManager
+from engine import buffered, catch_errors, probe_with_retry
+from metrics import DEFAULT_METRICS_FILE, Metrics
+from plan import (DECISION_KEEP, DECISION_SKIP, DECISION_UNFOLLOW, DEFAULT_PLAN_FILE, PlanError, PlanWriter, apply_plan,
+                  check_plan_owner)
+from prefilter import prefilter_stage
+from probe import CASCADE_SIGNAL_NAMES, FollowedUser, active_after_ts, follow_protect_days, follow_skip_reason, probe_last_active
+from ratelimit import BiliAPIError, Pacer
+from results import DEFAULT_RESULTS_FILE, ResultsStore
+from unfollow import DEFAULT_QUEUE_FILE, UNFOLLOW_DONE, UNFOLLOW_FAILED, UnfollowExecutor, queue_file_for
 
 
 # 初始化参数
@@ -17,21 +34,137 @@ class Config:
         self.ignore_list = [] # 手动白名单
         self.INACTIVE_THRESHOLD = 365 # 不活跃天数阈值
         self.SKIP_NUM = 0 # 跳过最近关注的n位用户
-        self.DETECT_TYPE = 0 # 0 = 动态， 1 = 投稿（视频/音频/专栏）
+        self.FOLLOW_PROTECT_DAYS = 0 # 关注不足n天的用户不探测、不取关
+        self.FOLLOW_PROTECT_THRESHOLD = False # 关注时间不足不活跃阈值的用户同样跳过
+        self.OLDEST_FIRST = False # 从最早的关注开始处理
+        self.DETECT_TYPE = 0 # 0 = 动态， 1 = 投稿（视频/音频/专栏）， 2 = 级联（按 CASCADE_TIERS 逐层检测）
+        self.CASCADE_TIERS = [["dynamic", 1], ["post", 3]] # 级联检测的层级顺序与每层成本（请求数）
         self.REMOVE_EMPTY_DYNAMIC = False
         self.REMOVE_DELETED_USER = False
-        self.LAG_START = 5
-        self.LAG_END = 20
         self.AUTO_ADD_IGNORE = True
+        self.MAX_WORKERS = 4 # 并发探测数
+        self.READ_RATE = 0.5 # 读请求初始速率（次/秒），成功时自动提升
+        self.READ_RATE_MAX = 2.0 # 读请求速率上限
+        self.WRITE_RATE = 0.2 # 取关请求初始速率
+        self.WRITE_RATE_MAX = 0.5 # 取关请求速率上限
+        self.MIN_RATE = 0.05 # 触发风控后的最低速率
+        self.CACHE_ENABLED = True # 启用本地活跃度缓存
+        self.CACHE_PATH = "activity_cache.db"
+        self.CACHE_TTL_DAYS = 7 # 缓存有效天数，过期后重新探测
+        self.CACHE_ERROR_TTL_HOURS = 1 # 探测失败结果的缓存小时数
+        self.PREFILTER_ENABLED = True # 先用多uid接口批量预筛（直播中/已注销/封禁）
+        self.APPLY_WORKERS = 1 # 取关并发数（执行取关计划与直接取关）
+        self.UNFOLLOW_BATCH_SIZE = 50 # 每批取关人数：每批先用一次请求批量确认关注关系，已取关的不再请求
+        self.API_BASE_URL = None # 接口地址覆盖（如 bench/mock_server.py），为空时请求B站官方接口
+        self.METRICS_PATH = DEFAULT_METRICS_FILE # 运行结束后写入接口指标（JSON）
+        self.RESULTS_PATH = DEFAULT_RESULTS_FILE # 评估结果库，供 Web UI 阈值模拟使用
+        self.RETRY_LIMIT = 3 # 探测失败/被风控的用户在本次运行末尾的重试次数
+        self.RETRY_DELAY = 5 # 首次重试前的等待秒数，之后每次加倍
+        self.BREAKER_THRESHOLD = 3 # 同一接口连续触发风控n次后暂停该接口
+        self.BREAKER_COOLDOWN = 30 # 接口暂停秒数，恢复后仍被风控则加倍
+        self.LOGIN_CHECK_TTL_HOURS = 12 # 登录验证结果的有效小时数，期间启动无需请求验证
+        self.COOKIE_REFRESH = True # 运行开始时在后台检查并刷新即将过期的cookies
     
-    def set_user_cookies(self, cookies):
+    def set_user_cookies(self, cookies, credentials=None):
         self.cookies = cookies
+        self.credentials = credentials
         self.uid = cookies["DedeUserID"]
         self.headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
         "Referer": f"https://space.bilibili.com/{self.uid}/"
         }
 
+DETECT_TYPE_NAMES = {0: "动态", 1: "投稿", 2: "级联"}
+
+
+def describe_cascade():
+    return " → ".join(f"{CASCADE_SIGNAL_NAMES[signal]}(成本{cost})" for signal, cost in config.CASCADE_TIERS)
+
+
+def valid_cascade_tiers(tiers):
+    """级联层级：非空，每层为 [已知层级, 非负成本]，层级不重复"""
+    if not tiers or not all(isinstance(tier, list) and len(tier) == 2 for tier in tiers):
+        return False
+    signals = [signal for signal, _ in tiers]
+    if len(set(signals)) != len(signals) or not all(signal in CASCADE_SIGNAL_NAMES for signal in signals):
+        return False
+    return all(isinstance(cost, (int, float)) and not isinstance(cost, bool) and cost >= 0 for _, cost in tiers)
+
+
+# 运行时字段不可通过配置文件设置
+_RUNTIME_CONFIG_KEYS = {"cookies", "uid", "headers", "credentials"}
+# 默认值为整数但可以设为小数的参数（时长）
+_FRACTIONAL_CONFIG_KEYS = {"CACHE_TTL_DAYS", "CACHE_ERROR_TTL_HOURS", "RETRY_DELAY", "BREAKER_COOLDOWN",
+                           "LOGIN_CHECK_TTL_HOURS"}
+# 取值范围与交互式配置一致
+_SETTING_CHECKS = {
+    "DETECT_TYPE": (lambda v: v in (0, 1, 2), "0、1 或 2"),
+    "ps": (lambda v: 1 <= v <= 50, "1-50"),
+    "MAX_WORKERS": (lambda v: v >= 1, "至少为 1"),
+    "INACTIVE_THRESHOLD": (lambda v: v >= 0, "不能为负数"),
+    "RETRY_LIMIT": (lambda v: v >= 0, "不能为负数"),
+    "UNFOLLOW_BATCH_SIZE": (lambda v: 1 <= v <= 50, "1-50"),
+    "BREAKER_THRESHOLD": (lambda v: v >= 1, "至少为 1"),
+    "CASCADE_TIERS": (valid_cascade_tiers, f"[[层级, 成本], ...]，层级为 {'、'.join(CASCADE_SIGNAL_NAMES)} 且不重复"),
+}
+
+
+class ConfigError(Exception):
+    """配置文件或 --set 参数无效"""
+
+
+def apply_settings(settings, source):
+    """
+    将配置项写入 config，键名与 Config 属性一致（如 INACTIVE_THRESHOLD、ps、ignore_list）
+    :param source: 出错时提示的来源（文件名或 --set）
+    """
+    for key, value in settings.items():
+        if key in _RUNTIME_CONFIG_KEYS or not hasattr(config, key):
+            raise ConfigError(f"{source}：未知参数 {key}")
+        current = getattr(config, key)
+        if isinstance(current, bool) or isinstance(value, bool):
+            valid = current is None or type(current) is type(value)
+        elif isinstance(current, float) or key in _FRACTIONAL_CONFIG_KEYS:
+            valid = isinstance(value, (int, float))
+        elif isinstance(current, int):
+            valid = isinstance(value, int)
+        else:
+            valid = current is None or isinstance(value, type(current))
+        if not valid:
+            raise ConfigError(f"{source}：参数 {key} 应为 {type(current).__name__} 类型，实际为 {value!r}")
+        check, hint = _SETTING_CHECKS.get(key, (None, None))
+        if check and not check(value):
+            raise ConfigError(f"{source}：参数 {key} 应为 {hint}，实际为 {value!r}")
+        setattr(config, key, value)
+
+
+def load_config_file(path):
+    """读取 TOML 或 JSON 配置文件（按扩展名区分）"""
+    path = Path(path)
+    try:
+        with open(path, "rb") as f:
+            settings = tomllib.load(f) if path.suffix.lower() == ".toml" else json.load(f)
+    except (OSError, tomllib.TOMLDecodeError, json.JSONDecodeError) as e:
+        raise ConfigError(f"无法读取配置文件 {path}：{str(e)}")
+    if not isinstance(settings, dict):
+        raise ConfigError(f"配置文件 {path} 的顶层应为键值表")
+    apply_settings(settings, path.name)
+
+
+def parse_set_options(options):
+    """解析 --set KEY=VALUE，VALUE 按 JSON 解析（true、180、[1, 2]），失败时视为字符串"""
+    settings = {}
+    for option in options:
+        key, sep, raw = option.partition("=")
+        if not sep or not key.strip():
+            raise ConfigError(f"--set 参数格式应为 KEY=VALUE：{option}")
+        try:
+            settings[key.strip()] = json.loads(raw)
+        except json.JSONDecodeError:
+            settings[key.strip()] = raw
+    return settings
+
+
 logging.basicConfig(filename='unfollow.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', encoding='utf-8')
 
 class APIException:
@@ -41,31 +174,43 @@ class APIException:
         self.status_code = status_code
         super().__init__(f"状态码 {status_code}: {message}")
 
-async def login() -> None:
-    cookie_file = Path("cookies.json")
+async def fetch_account_info(account_config):
+    """通过 nav 接口验证 cookies 并获取账号信息，无需导入 bilibili_api"""
+    async with BiliClient.from_config(account_config, Pacer.from_config(config)) as client:
+        return await client.get_nav()
+
+
+async def login(cookie_file=DEFAULT_COOKIE_FILE, interactive=True):
+    """
+    读取 cookies 文件登录，失效时扫码登录并保存
+    验证结果在 LOGIN_CHECK_TTL_HOURS 内有效，期间启动不再请求验证
+    :param interactive: 为 False 时不扫码，cookies 无效直接返回 False
+    :return: 是否登录成功
+    """
+    credentials = CredentialManager.from_config(config, cookie_file)
 
-    if cookie_file.exists():
+    if credentials.path.exists():
 
         try:
-            with open(cookie_file, 'r', encoding='utf-8') as f:
-                config.set_user_cookies(json.load(f))
+            config.set_user_cookies(credentials.load(), credentials)
             
             try:
-                uid = config.uid
-                cookies = config.cookies
-                credential = user.Credential.from_cookies(cookies)
-                u = user.User(uid, credential)
-                await user.get_self_coins(credential) # 用于验证cookies状态
-                info = await u.get_user_info()
+                info = await credentials.validate(lambda: fetch_account_info(config))
                 print("检测到有效cookies，自动登录成功！\n")
-                print(f"当前账号：\n名称：{info["name"]}\nUID:{info["mid"]}")
-                return True, cookies
+                print(f"当前账号：\n名称：{info.get('uname')}\nUID:{info.get('mid')}")
+                return True
             except Exception as e:
                 print(f"cookies已失效：{str(e)}")
         except (json.JSONDecodeError, KeyError) as e:
             print(f"cookies文件损坏：{str(e)}")
 
+    if not interactive:
+        print(f"无有效cookies（{cookie_file}），无人值守模式下无法扫码登录。")
+        logging.error(f"无有效cookies：{cookie_file}")
+        return False
+
     print("无有效cookies，开始扫码登录...")
+    from bilibili_api import login_v2  # 导入较慢，仅扫码登录时需要
 
     qr = login_v2.QrCodeLogin(platform=login_v2.QrCodeLoginChannel.WEB) # 生成二维码登录实例，平台选择网页端
     await qr.generate_qrcode()                                          # 生成二维码
@@ -79,23 +224,53 @@ async def login() -> None:
         print(await qr.check_state())                                   # 检查状态
         await asyncio.sleep(1)
     cookies = qr.get_credential().get_cookies()
-    config.set_user_cookies(cookies)
-    with open(cookie_file, 'w', encoding='utf-8') as f:
-        json.dump(cookies, f, ensure_ascii=False, indent=2)
+    credentials.save(cookies)
+    config.set_user_cookies(cookies, credentials)
     print("登录成功，已保存Cookies")
+    return True
 
 def show_current_parameters():
     """显示当前参数配置"""
     print("\n当前参数配置：")
-    print(f"0. 爬取类型： {"动态" if config.DETECT_TYPE == 0 else "视频"}")
+    detect_desc = DETECT_TYPE_NAMES[config.DETECT_TYPE]
+    if config.DETECT_TYPE == 2:
+        detect_desc += f"（{describe_cascade()}）"
+    print(f"0. 爬取类型： {detect_desc}")
     print(f"1. 每页爬取数量：{config.ps}")
     print(f"2. 白名单用户数：{len(config.ignore_list)}")
     print(f"3. 自动添加白名单（互关/特关）：{'是' if config.AUTO_ADD_IGNORE else '否'}")
     print(f"4. 不活跃天数阈值：{config.INACTIVE_THRESHOLD}天")
-    print(f"5. 跳过最近关注数：{config.SKIP_NUM}")
+    print(f"5. 跳过最近关注数：{config.SKIP_NUM}（另跳过关注不足{follow_protect_days(config)}天的用户）")
     print(f"6. 是否删除无动态用户：{'是' if config.REMOVE_EMPTY_DYNAMIC else '否'}")
     print(f"7. 是否直接删除已注销用户：{'是' if config.REMOVE_DELETED_USER else '否'}")
-    print(f"8. 请求延迟区间：{config.LAG_START}-{config.LAG_END}秒")
+    print(f"8. 读请求速率：{config.READ_RATE}-{config.READ_RATE_MAX}次/秒")
+    print(f"9. 取关请求速率：{config.WRITE_RATE}-{config.WRITE_RATE_MAX}次/秒")
+    print(f"10. 并发探测数：{config.MAX_WORKERS}")
+    print(f"11. 活跃度缓存：{f'{config.CACHE_TTL_DAYS}天内不重复探测' if config.CACHE_ENABLED else '关闭'}")
+    print(f"12. 批量预筛：{'是' if config.PREFILTER_ENABLED else '否'}")
+    print(f"13. 处理顺序：{'从最早关注开始' if config.OLDEST_FIRST else '从最新关注开始'}")
+
+def set_cascade_tiers():
+    """配置级联检测的顺序与各层成本"""
+    if input(f"当前级联顺序：{describe_cascade()}，是否修改？[y/n]：").strip().lower() not in {'y', 'yes'}:
+        return
+    while True:
+        order = input("请输入顺序（1 = 先动态后投稿，2 = 先投稿后动态）：").strip()
+        if order in {"1", "2"}:
+            break
+        print("输入无效，请输入 1 或 2")
+    signals = ["dynamic", "post"] if order == "1" else ["post", "dynamic"]
+    costs = dict(config.CASCADE_TIERS)
+    for signal in signals:
+        while True:
+            try:
+                value = input(f"请输入{CASCADE_SIGNAL_NAMES[signal]}检测的成本（当前：{costs[signal]}，留空不变）：").strip()
+                if value:
+                    costs[signal] = float(value)
+                break
+            except ValueError:
+                print("请输入数字")
+    config.CASCADE_TIERS = [[signal, costs[signal]] for signal in signals]
 
 def set_parameter():
     """交互式参数配置入口"""
@@ -114,7 +289,7 @@ def set_parameter():
 
     # 配置爬取种类
     while True:
-        print("请选择检测类型：\n最新动态 请输入0\n最新投稿（视频/音频/专栏）请输入1")
+        print("请选择检测类型：\n最新动态 请输入0\n最新投稿（视频/音频/专栏）请输入1\n级联（先动态，未判定活跃时再查投稿）请输入2")
         msg = input("\n请选择检测类型：").strip().lower()
         
         if msg == "0":
@@ -125,8 +300,13 @@ def set_parameter():
             config.DETECT_TYPE = 1
             print("已选择最新投稿。\n")
             break
+        elif msg == "2":
+            config.DETECT_TYPE = 2
+            set_cascade_tiers()
+            print(f"已选择级联检测：{describe_cascade()}。\n")
+            break
         else:
-            print("输入无效，请输入 0 或 1")
+            print("输入无效，请输入 0、1 或 2")
             continue
 
     # 配置每页数量
@@ -187,6 +367,23 @@ def set_parameter():
         except ValueError:
             print("请输入有效的整数")
 
+    # 配置按关注时间跳过
+    while True:
+        try:
+            new_days = int(input(f"\n请输入关注保护天数，关注不足该天数的用户不探测（当前：{config.FOLLOW_PROTECT_DAYS}）："))
+            if new_days >= 0:
+                config.FOLLOW_PROTECT_DAYS = new_days
+                break
+            print("请输入非负数")
+        except ValueError:
+            print("请输入有效的整数")
+    while True:
+        msg = input("关注时间不足不活跃阈值的用户是否也跳过？[y/n]：").strip().lower()
+        if msg in {'y', 'yes', 'n', 'no'}:
+            config.FOLLOW_PROTECT_THRESHOLD = msg in {'y', 'yes'}
+            break
+        print("输入无效，请输入 y(yes) 或 n(no)")
+
     # 配置是否移除空动态用户
     while True:
         print(f"\n!!!移除无动态用户会直接取关没发过动态的用户!!!\n默认禁用\n当前状态：{'是' if config.REMOVE_EMPTY_DYNAMIC else '否'}")
@@ -217,37 +414,92 @@ def set_parameter():
             print("输入无效，请输入 y(yes) 或 n(no)")
             continue
 
-    # 配置延迟区间
+    # 配置请求速率
     while True:
-        print(f"\n当前随机请求延迟区间：{config.LAG_START}-{config.LAG_END}秒")
-        print("注意：延迟过小可能触发-352风控。默认延迟基本不会触发风控（就是慢点）")
-        if input("是否需要修改延迟？[y/n]：").lower() == 'y':
+        print(f"\n当前读请求速率：{config.READ_RATE}-{config.READ_RATE_MAX}次/秒，取关请求速率：{config.WRITE_RATE}-{config.WRITE_RATE_MAX}次/秒")
+        print("速率从初始值开始，请求成功时逐步提升至上限，遇到-352/-412风控时自动减半")
+        if input("是否需要修改速率？[y/n]：").lower() == 'y':
             try:
-                
-                new_start = int(input(f"\n请输入最小延迟秒数（当前：{config.LAG_START}）："))
-                new_end = int(input("请输入最大延迟秒数（当前：{}）：".format(config.LAG_END)))
-                if 0 <= new_start <= new_end:
-                    config.LAG_START, config.LAG_END = new_start, new_end
+                new_read = float(input(f"\n请输入读请求初始速率，次/秒（当前：{config.READ_RATE}）："))
+                new_read_max = float(input(f"请输入读请求速率上限（当前：{config.READ_RATE_MAX}）："))
+                new_write = float(input(f"请输入取关请求初始速率（当前：{config.WRITE_RATE}）："))
+                new_write_max = float(input(f"请输入取关请求速率上限（当前：{config.WRITE_RATE_MAX}）："))
+                if 0 < new_read <= new_read_max and 0 < new_write <= new_write_max:
+                    config.READ_RATE, config.READ_RATE_MAX = new_read, new_read_max
+                    config.WRITE_RATE, config.WRITE_RATE_MAX = new_write, new_write_max
                     break
-                print("延迟范围无效（最小 <= 最大）")
+                print("速率范围无效（0 < 初始 <= 上限）")
             except ValueError:
-                print("请输入有效的整数")
+                print("请输入有效的数字")
         else:
             break
 
+    # 配置并发数
+    while True:
+        try:
+            new_workers = int(input(f"\n请输入并发探测数（当前：{config.MAX_WORKERS}）："))
+            if new_workers >= 1:
+                config.MAX_WORKERS = new_workers
+                break
+            print("并发数需 >= 1")
+        except ValueError:
+            print("请输入有效的整数")
+
+    # 配置活跃度缓存
+    while True:
+        print(f"\n当前活跃度缓存：{'启用' if config.CACHE_ENABLED else '关闭'}，有效期{config.CACHE_TTL_DAYS}天")
+        msg = input("是否启用活跃度缓存？[y/n]：").strip().lower()
+
+        if msg in {'n', 'no'}:
+            config.CACHE_ENABLED = False
+            break
+        elif msg in {'y', 'yes'}:
+            config.CACHE_ENABLED = True
+            try:
+                new_ttl = input(f"请输入缓存有效天数（当前：{config.CACHE_TTL_DAYS}，留空不变）：").strip()
+                if new_ttl:
+                    config.CACHE_TTL_DAYS = max(0, int(new_ttl))
+            except ValueError:
+                print("输入无效，保留原有效期")
+            break
+        else:
+            print("输入无效，请输入 y(yes) 或 n(no)")
+            continue
+
+    # 配置批量预筛
+    while True:
+        print(f"\n批量预筛：每50个用户用一次批量请求识别直播中（活跃）与已注销/封禁用户，免去逐个探测\n当前状态：{'是' if config.PREFILTER_ENABLED else '否'}")
+        msg = input("是否启用批量预筛？[y/n]：").strip().lower()
+
+        if msg in {'n', 'no'}:
+            config.PREFILTER_ENABLED = False
+            break
+        elif msg in {'y', 'yes'}:
+            config.PREFILTER_ENABLED = True
+            break
+        else:
+            print("输入无效，请输入 y(yes) 或 n(no)")
+            continue
+
+    # 配置处理顺序
+    while True:
+        msg = input("是否从最早的关注开始处理？[y/n]：").strip().lower()
+        if msg in {'y', 'yes', 'n', 'no'}:
+            config.OLDEST_FIRST = msg in {'y', 'yes'}
+            break
+        print("输入无效，请输入 y(yes) 或 n(no)")
+
     print("\n参数更新完成！")
     show_current_parameters()
     
 
-async def is_in_special_group():
+async def is_in_special_group(client, whitelist):
     try:
         print("\n正在自动添加白名单")
-        credential = user.Credential(sessdata=config.cookies["SESSDATA"], bili_jct=config.cookies["bili_jct"])
-        
         special_sn = 1
         friends_list = []
         try:
-            rel = await user.get_self_friends(credential)
+            rel = await client.get_friends()
 
         except Exception as e:
             print(f"获取互关用户失败：{str(e)}")
@@ -266,10 +518,8 @@ async def is_in_special_group():
                 print(f"用户{uname}({mid})已互关，已自动添加至白名单。")
         special_list = []
 
-        await asyncio.sleep(random.randint(config.LAG_START,config.LAG_END))
-
         while 1:
-            rel_list = await user.get_self_special_followings(credential, pn=special_sn)
+            rel_list = await client.get_special_followings(special_sn)
             if not rel_list:
                 print("无特别关注用户")
                 break
@@ -281,13 +531,12 @@ async def is_in_special_group():
                     special_list.append(mid)
                     print(f"用户({mid})已特殊关注，已自动添加至白名单。")
             special_sn += 1
-            await asyncio.sleep(random.randint(config.LAG_START,config.LAG_END))
 
         unique_id = set()
         for u in friends_list + special_list:
             if u not in unique_id:
                 unique_id.add(u)
-                config.ignore_list.append(u)
+                whitelist.append(u)
         print("已完成自动添加白名单\n")
         return
     
@@ -297,319 +546,781 @@ async def is_in_special_group():
         logging.error(f"添加白名单失败：{str(e)}")
         raise
 
-class FollowedUser:
-    user_count = 0
-
-    def __init__(self, mid, uname):
-        self.mid = mid
-        self.name = uname
-        FollowedUser.user_count += 1
-
-    async def get_latest_dynamic(self):
-        try:
-            credential = user.Credential(sessdata=config.cookies["SESSDATA"], 
-                                        bili_jct=config.cookies["bili_jct"])
-            u = user.User(self.mid, credential=credential)
-
-            dynamics = await u.get_dynamics_new()
-            items = dynamics.get('items', [])
-            
-            if not items:
-                return
-            if len(items) == 1:
-                return items[0]
-
-            first_dynamic_ts = int(items[0]['modules']['module_author']['pub_ts'])
-            second_dynamic_ts = int(items[1]['modules']['module_author']['pub_ts'])
-            latest_dynamic = items[0] if first_dynamic_ts >= second_dynamic_ts else items[1]
-            return latest_dynamic
-        except Exception as e:
-            logging.error(f"获取用户最新动态异常：{str(e)}")
-            return
-    
-    async def get_latest_video(self):
-        """异步获取用户最新视频"""
-        try:
-            credential = user.Credential(sessdata=config.cookies["SESSDATA"], 
-                                        bili_jct=config.cookies["bili_jct"])
-            u = user.User(self.mid, credential=credential)
-            
-            videos = await u.get_videos()
-            videos_list = videos['list'].get('vlist', [])
-            latest_video = videos_list[0]
-            return latest_video
-        except Exception as e:
-            logging.error(f"获取用户视频异常：{str(e)}")
-            return
-    
-    async def get_latest_audios(self):
-        """异步获取用户最新音频"""
-        try:
-            credential = user.Credential(sessdata=config.cookies["SESSDATA"], 
-                                        bili_jct=config.cookies["bili_jct"])
-            u = user.User(self.mid, credential=credential)
-            
-            audios = await u.get_audios()
-            audios_list = audios.get('data', [])
-            latest_audio = audios_list[0]
-            return latest_audio
-        except Exception as e:
-            logging.error(f"获取用户音频异常：{str(e)}")
-            return
-        
-    async def get_latest_articles(self):
-        """异步获取用户最新专栏"""
-        try:
-            credential = user.Credential(sessdata=config.cookies["SESSDATA"], 
-                                        bili_jct=config.cookies["bili_jct"])
-            u = user.User(self.mid, credential=credential)
-            
-            articles = await u.get_articles()
-            articles_list = articles.get('articles', [])
-            latest_article = articles_list[0]
-            return latest_article
-        except Exception as e:
-            logging.error(f"获取用户专栏异常：{str(e)}")
-            return
-    
-    async def get_latest_post_time(self):
-        """异步获取用户最新投稿（视频/音频/专栏）时间戳"""
-        try:
-            latest_video = await self.get_latest_video()
-            latest_audio = await self.get_latest_audios()
-            latest_article = await self.get_latest_articles()
-
-            timestamps = []
-            
-            # 处理视频时间戳
-            if latest_video and 'created' in latest_video:
-                video_time = latest_video['created']
-                timestamps.append(video_time)
-            
-            # 处理音频时间戳
-            if latest_audio and 'ctime' in latest_audio:
-                audio_time = latest_audio['ctime'] / 1000  # 转换为秒
-                timestamps.append(audio_time)
-            
-            # 处理专栏时间戳
-            if latest_article and 'publish_time' in latest_article:
-                article_time = latest_article['publish_time']
-                timestamps.append(article_time)
-            
-            if not timestamps:
-                return
-            
-            latest_timestamp = max(timestamps)
-            
-            return latest_timestamp     
-        except Exception as e:
-            logging.error(f"获取用户最新投稿异常：{str(e)}")
-            return
-
-async def unfollow_user(uid, name = None):
+async def iter_follow_list(client):
+    """
+    逐页获取关注列表，边获取边产出，后续评估无需等待全部页面
+    获取失败时记录日志后重新抛出，调用方据此区分完整与不完整的列表
+    """
+    count = 0
     try:
-        credential = user.Credential(sessdata=config.cookies["SESSDATA"], bili_jct=config.cookies["bili_jct"])
-        u = user.User(uid=uid, credential=credential)
-        logging.info(f"尝试取关 {name} uid:{uid}.")
-        await u.modify_relation(relation=user.RelationType.UNSUBSCRIBE)
-        logging.info(f"取关成功：{uid}")
-        return f"取关成功：{uid}"
-    except Exception as e:
-        raise
-
-def get_follow_list():
-    pn = 1
-    followed_list = []
-    has_more = True
-    while has_more:
-        # TODO: 固定API链接，待切换至bilibili_api接口
-        uid = config.uid
-        api_url = f"https://api.bilibili.com/x/relation/followings?vmid={uid}&pn={pn}&ps={config.ps}"
-
-        try:
-            headers = config.headers
-            response = requests.get(api_url, headers=headers, cookies=config.cookies)
-            resp = response.json()
-            
-            if resp["code"] != 0:
-                print(f"请求失败，错误代码：{resp['code']}，信息：{resp.get('message', '未知错误')}")
-                logging.error(f"请求失败，错误代码：{resp['code']}，信息：{resp.get('message', '未知错误')}")
-                raise APIExpection("非零返回", -1)
-                
-            data = resp.get("data", {})
-            user_list = data.get("list", [])
-            
-            if not user_list:
-                has_more = False
-                break
-
-            for iuser in user_list:
-                followed = FollowedUser(
+        async for pn, data in client.iter_followings_pages(config.ps, config.MAX_WORKERS, config.OLDEST_FIRST):
+            for iuser in data.get("list", []):
+                count += 1
+                yield FollowedUser(
                     mid=iuser.get("mid"), 
-                    uname=iuser.get("uname")
+                    uname=iuser.get("uname"),
+                    mtime=iuser.get("mtime"),
+                    rank=iuser.get("rank")
                 )
-                followed_list.append(followed)
-
-            total = data.get("total", 0)
-            # if len(followed_list) >= total:
-            #     has_more = False
-            # else:
-            pn += 1
-
-        except Exception as e:
-            print("出现错误，请查看日志")
-            logging.error(f"请求异常：{str(e)}")
-            break
-        print(f"已爬取第{pn - 1}页{FollowedUser.user_count} 个关注用户")
-        time.sleep(random.randint(config.LAG_START, config.LAG_END))
-
-    print(f"共获取到 {FollowedUser.user_count} 个关注用户：")
-    logging.info(f"共获取到 {FollowedUser.user_count} 个关注用户")
-    return followed_list
-
+            print(f"已爬取第{pn}页，共{count}个关注用户")
+    except BiliAPIError as e:
+        print(f"请求失败，错误代码：{e.code}，信息：{e.message}")
+        logging.error(f"请求失败，错误代码：{e.code}，信息：{e.message}")
+        print(f"关注列表获取不完整，已获取 {count} 个关注用户")
+        raise
+    except Exception as e:
+        print("出现错误，请查看日志")
+        logging.error(f"请求异常：{str(e)}")
+        print(f"关注列表获取不完整，已获取 {count} 个关注用户")
+        raise
 
-async def get_last_active_ts(handle_user, detect_type):
-    """
-    获取用户最后活跃的时间戳
-    :return: timestamp (float) or None
-    """
-    if detect_type == 0:
-        # 动态检测
-        last_dynamic = await handle_user.get_latest_dynamic()
+    print(f"共获取到 {count} 个关注用户")
+    logging.info(f"共获取到 {count} 个关注用户")
 
-        if last_dynamic and 'modules' in last_dynamic:
-            return last_dynamic['modules']['module_author']['pub_ts']
-    else:
-        # 投稿检测
-        return await handle_user.get_latest_post_time()
-    return None
 
+def deleted_user_decision(iuser, state, cache_tag=""):
+    """注销/封禁的用户按 REMOVE_DELETED_USER 处理"""
+    if config.REMOVE_DELETED_USER:
+        return True, f"{cache_tag}用户{iuser.name}({iuser.mid}){state}，执行取关操作。", None
+    return False, f"{cache_tag}用户{iuser.name}({iuser.mid}){state}，配置设为保留。", None
 
-async def evaluate_user_status(iuser, handle_user, current_ts):
+async def evaluate_user_status(iuser, handle_user, current_ts, cache=None, whitelist=None):
     """
     评估用户状态，决定是否取关
-    :return: (bool: should_delete, str: reason_message)
+    :return: (bool: should_delete, str: reason_message, last_active_ts or None)
     """
     # 1. 白名单检查
-    if iuser.mid in config.ignore_list:
-        return False, f"用户{iuser.name}({iuser.mid})位于白名单，已忽略。"
-
-    # 2. 注销用户检查
-    if iuser.name == "账号已注销":
-        if config.REMOVE_DELETED_USER:
-            return True, f"用户{iuser.name}({iuser.mid})已注销，执行取关操作。"
-        return False, f"用户{iuser.name}({iuser.mid})已注销，配置设为保留。"
-
-    # 3. 获取活跃时间
-    last_active_ts = await get_last_active_ts(handle_user, config.DETECT_TYPE)
-
-    # 4. 无历史记录处理 (无动态/无投稿)
+    if iuser.mid in (config.ignore_list if whitelist is None else whitelist):
+        return False, f"用户{iuser.name}({iuser.mid})位于白名单，已忽略。", None
+
+    # 2. 注销用户检查（含批量预筛识别出的注销/封禁账号）
+    prefilter_ts, prefilter_outcome = iuser.prefilter or (None, None)
+    if iuser.name == "账号已注销" or prefilter_outcome == OUTCOME_DELETED:
+        iuser.activity = (None, OUTCOME_DELETED)
+        if cache:
+            cache.put(iuser.mid, config.DETECT_TYPE, None, OUTCOME_DELETED)
+        return deleted_user_decision(iuser, "已注销" if iuser.name == "账号已注销" else "已注销/被封禁")
+
+    # 3. 获取活跃时间（批量预筛判定为直播中的无需探测，其余优先读取本地缓存）
+    if prefilter_outcome == OUTCOME_ACTIVE:
+        last_active_ts, outcome, cache_tag = prefilter_ts, OUTCOME_ACTIVE, "[直播中]"
+        if cache:
+            cache.put(iuser.mid, config.DETECT_TYPE, last_active_ts, outcome)
+    else:
+        last_active_ts, outcome, from_cache = await cached_probe(
+            cache, iuser.mid, config.DETECT_TYPE,
+            lambda: probe_last_active(config, handle_user, active_after_ts(config, current_ts))
+        )
+        cache_tag = "[缓存]" if from_cache else ""
+    iuser.activity = (last_active_ts, outcome)
+
+    # 缓存有效时不再预筛，缓存中的注销/封禁结果与预筛结果同样处理，不视为无记录
+    if outcome == OUTCOME_DELETED:
+        return deleted_user_decision(iuser, "已注销/被封禁", cache_tag)
+
+    # 4. 探测失败：无法判断活跃度，不视为无记录，保留关注等待重试或下次运行
+    if outcome in FAILED_OUTCOMES:
+        state = "被风控拦截" if outcome == OUTCOME_BLOCKED else "探测失败"
+        return False, f"{cache_tag}用户{iuser.name}({iuser.mid}){state}，已忽略。", None
+
+    # 5. 无历史记录处理 (无动态/无投稿)
     if last_active_ts is None:
-        type_str = "动态" if config.DETECT_TYPE == 0 else "投稿"
+        type_str = {0: "动态", 1: "投稿"}.get(config.DETECT_TYPE, "动态和投稿")
         if config.REMOVE_EMPTY_DYNAMIC:
-            return True, f"用户{iuser.name}({iuser.mid})没发过{type_str}，执行取关操作。"
+            return True, f"{cache_tag}用户{iuser.name}({iuser.mid})没发过{type_str}，执行取关操作。", None
         else:
-            return False, f"用户{iuser.name}({iuser.mid})没发过{type_str}，已忽略。"
+            return False, f"{cache_tag}用户{iuser.name}({iuser.mid})没发过{type_str}，已忽略。", None
 
-    # 5. 时间阈值计算
+    # 6. 时间阈值计算
     last_active_ts = int(last_active_ts)
     time_array = time.localtime(last_active_ts)
     time_str = time.strftime('%Y-%m-%d %H:%M:%S', time_array)
     past_days = int((current_ts - last_active_ts) / 86400)
     
-    status_msg = f"上次活跃时间：{time_str}，{past_days}天前。"
+    status_msg = f"{cache_tag}上次活跃时间：{time_str}，{past_days}天前。"
     
     if past_days > config.INACTIVE_THRESHOLD:
-        return True, f"{status_msg} 超过设定天数（{config.INACTIVE_THRESHOLD}），执行取关操作。"
+        return True, f"{status_msg} 超过设定天数（{config.INACTIVE_THRESHOLD}），执行取关操作。", last_active_ts
     
-    return False, f"{status_msg} 未超过设定天数，保留关注。"
+    return False, f"{status_msg} 未超过设定天数，保留关注。", last_active_ts
 
-async def perform_unfollow(iuser):
+async def handle_follow_list(followed_users, client, cache=None, whitelist_ready=None, planner=None, checkpoint=None,
+                             whitelist=None, results=None, executor=None):
     """
-    执行取关并返回结果
-    :return: bool (success)
+    评估并处理关注用户
+    :param followed_users: 关注用户的（异步）可迭代序列
+    :param whitelist_ready: 自动白名单任务，白名单检查前需等待其完成
+    :param planner: PlanWriter，提供时只写入取关计划，不执行取关
+    :param executor: UnfollowExecutor，待取关用户每满一批执行一次，未提供且不是计划模式时不取关
+    :param checkpoint: Checkpoint，记录决定与取关；恢复运行时已有的决定直接沿用
+    :param whitelist: 本账号的白名单（手动 + 自动），默认为 config.ignore_list
+    :param results: ResultsStore，记录关注快照与活跃结果
     """
-    try:
-        message = await unfollow_user(iuser.mid, iuser.name) # 实际调用
-        # message = f"[测试]用户{iuser.name}({iuser.mid})已被取关" # 测试用桩代码
-        print(message)
-        logging.info(f"用户{iuser.name}({iuser.mid})已被取关")
-        return True
-    except Exception as e:
-        err_msg = f"取关 {iuser.name}（{iuser.mid}） 失败：{str(e)}"
-        print(err_msg)
-        logging.error(err_msg)
-        return False
-
-async def handle_follow_list(followed_list):
     current_ts = time.time()
-    stats = {'success': 0, 'fail': 0}
+    stats = {'total': 0, 'skipped': 0, 'kept': 0, 'unfollow': 0, 'success': 0, 'fail': 0, 'resumed': 0, 'gone': 0,
+             'errors': 0}
 
-    for i, iuser in enumerate(followed_list, 1):
+    async def on_unfollow(mid, name, status, message):
+        print(message)
+        if status == UNFOLLOW_FAILED:
+            stats['fail'] += 1
+            return
+        logging.info(message)
+        stats['success' if status == UNFOLLOW_DONE else 'gone'] += 1
+        if checkpoint:
+            checkpoint.record_unfollow(mid)
+        if results:
+            results.remove(client.uid, mid)
+
+    async def numbered():
+        i = 0
+        async for iuser in followed_users:
+            i += 1
+            yield i, iuser
+
+    async def probe(item):
+        i, iuser = item
         # 1. 预处理：跳过逻辑
-        if i <= config.SKIP_NUM:
-            log_msg = f"跳过用户:{i}.\t 用户名：{iuser.name}\tUID：{iuser.mid}"
+        if follow_skip_reason(config, iuser, i - 1, current_ts):
+            return None
+        if checkpoint and iuser.mid in checkpoint.decisions:
+            return checkpoint.decisions[iuser.mid]
+        if whitelist_ready:
+            await whitelist_ready
+
+        # 2. 决策逻辑：判断是否取关（仅实际API调用受限速约束）
+        handle_user = FollowedUser(iuser.mid, iuser.name, client)
+        return await evaluate_user_status(iuser, handle_user, current_ts, cache, whitelist)
+
+    def probe_failed(iuser, result):
+        return result is not None and iuser.activity is not None and iuser.activity[1] in FAILED_OUTCOMES
+
+    def should_retry(item, result):
+        # 探测失败或被风控的用户延后重试；沿用此前运行缓存的失败结果时重试也不会请求，不必等待
+        iuser = item[1]
+        return probe_failed(iuser, result) and not (cache and cache.contains(iuser.mid, config.DETECT_TYPE))
+
+    async for (i, iuser), result in probe_with_retry(numbered(), probe, config.MAX_WORKERS, should_retry,
+                                                     config.RETRY_LIMIT, config.RETRY_DELAY):
+        stats['total'] += 1
+        failed = probe_failed(iuser, result)
+        if failed:
+            stats['errors'] += 1
+        if results:
+            results.record(client.uid, iuser, config.DETECT_TYPE, config.INACTIVE_THRESHOLD)
+        if result is None:
+            stats['skipped'] += 1
+            skip_reason = follow_skip_reason(config, iuser, i - 1, current_ts)
+            log_msg = f"跳过用户:{i}.\t 用户名：{iuser.name}\tUID：{iuser.mid}（{skip_reason}）"
             print(log_msg)
             logging.info(log_msg)
+            if planner:
+                planner.write(iuser.mid, iuser.name, DECISION_SKIP, skip_reason)
             continue
 
-        # 初始化 API 句柄
         print(f"{i:3d}. UID: {iuser.mid}\t用户名: {iuser.name}")
         logging.info(f"{i:3d}. UID: {iuser.mid}\t用户名: {iuser.name}")
-        
-        handle_user = FollowedUser(iuser.mid, iuser.name)
 
-        # 2. 决策逻辑：判断是否取关
-        should_delete, reason = await evaluate_user_status(iuser, handle_user, current_ts)
-        
+        should_delete, reason, last_active_ts = result
+        stats['unfollow' if should_delete else 'kept'] += 1
+        # 探测失败的决定不写入断点，恢复运行时重新探测
+        if checkpoint and not failed:
+            checkpoint.record_decision(iuser.mid, should_delete, reason, last_active_ts)
+
         # 打印决策原因（无论是忽略还是取关，原因都很重要）
         print(reason)
         if "已忽略" in reason or "保留" in reason:
             logging.info(reason)
 
-        # 3. 执行逻辑
-        if should_delete:
-            is_success = await perform_unfollow(iuser)
-            if is_success:
-                stats['success'] += 1
-            else:
-                stats['fail'] += 1
-        
-        # 4. 流控
-        await asyncio.sleep(random.randint(config.LAG_START, config.LAG_END))
+        # 3. 执行逻辑（计划模式下只记录决定）
+        if planner:
+            planner.write(iuser.mid, iuser.name, DECISION_UNFOLLOW if should_delete else DECISION_KEEP,
+                          reason, last_active_ts)
+        elif should_delete and checkpoint and iuser.mid in checkpoint.unfollowed:
+            print(f"用户{iuser.name}({iuser.mid})已在上次运行中取关。")
+            stats['resumed'] += 1
+        elif should_delete and executor:
+            # 待取关用户在后台按批执行：每批先批量确认关系，已不在关注列表的不再请求
+            executor.add(iuser.mid, iuser.name)
+            executor.run_ready(on_unfollow)
+
+    if executor:
+        await executor.drain(on_unfollow)
 
     # 总结
-    summary = f"取关成功{stats['success']}个，失败{stats['fail']}个！"
+    if planner:
+        summary = (f"已生成取关计划 {planner.path}：取关{planner.counts[DECISION_UNFOLLOW]}个，"
+                   f"保留{planner.counts[DECISION_KEEP]}个，跳过{planner.counts[DECISION_SKIP]}个")
+    else:
+        summary = f"取关成功{stats['success']}个，失败{stats['fail']}个！"
+        if stats['resumed']:
+            summary += f"（另有{stats['resumed']}个已在上次运行中取关）"
+        if stats['gone']:
+            summary += f"（另有{stats['gone']}个已不在关注列表）"
     print(summary)
     logging.info(summary)
+    cascade_msg = FollowedUser.cascade_summary(config.CASCADE_TIERS)
+    if cascade_msg:
+        print(cascade_msg)
+        logging.info(cascade_msg)
+    return stats
 
 
-if __name__ == '__main__':
+def report_cache(cache):
+    if not cache:
+        return
+    cache_msg = f"缓存命中{cache.hits}个，未到复查日期{cache.deferred}个，实际探测{cache.misses}个"
+    if cache.joined:
+        cache_msg += f"，与其他账号合并探测{cache.joined}个"
+    print(cache_msg)
+    logging.info(cache_msg)
+
 
+async def run_cleanup(client, cache, planner=None, checkpoint=None, whitelist=None, results=None):
+    """
+    单事件循环流水线：白名单获取、关注列表分页与用户评估同时推进
+    :param whitelist: 本账号的白名单，自动白名单会追加到其中；默认为 config.ignore_list
+    :param results: ResultsStore，处理完整个关注列表后更新自动白名单并移除已不在列表中的用户
+    :return: handle_follow_list 的统计
+    """
+    started_at = time.time()
+    if whitelist is None:
+        whitelist = config.ignore_list
+    manual_whitelist = set(whitelist)
+    # 长时间运行前刷新即将过期的 cookies，与评估同时进行
+    refresh_task = asyncio.create_task(refresh_cookies(client)) if config.COOKIE_REFRESH else None
+    whitelist_task = None
+    if config.AUTO_ADD_IGNORE:
+        whitelist_task = asyncio.create_task(is_in_special_group(client, whitelist))
+
+    # 关注列表分页作为生产者，通过有界队列供给评估阶段，第1页到达即开始评估
+    followed_users = iter_follow_list(client)
+    if checkpoint:
+        # 恢复运行且快照完整时直接使用快照，不再请求关注列表
+        followed_users = checkpoint.record_follows(followed_users, FollowedUser)
+    # 关注列表获取失败时，已获取的用户照常评估
+    list_errors = []
+    followed_users = buffered(catch_errors(followed_users, list_errors), config.ps * 2)
+    if config.PREFILTER_ENABLED:
+        # 已在白名单、已注销、已有决定或缓存可用的用户无需预筛
+        def should_check(iuser):
+            if iuser.mid in whitelist or iuser.name == "账号已注销":
+                return False
+            if checkpoint and iuser.mid in checkpoint.decisions:
+                return False
+            # 按关注时间跳过的用户无需探测（SKIP_NUM 按 rank 判断，无 rank 时交由评估阶段处理）
+            if iuser.rank is not None and follow_skip_reason(config, iuser, iuser.rank, time.time()):
+                return False
+            return not (cache and cache.contains(iuser.mid, config.DETECT_TYPE))
+        followed_users = prefilter_stage(client, followed_users, should_check)
+    executor = None
+    if not planner:
+        executor = UnfollowExecutor.from_config(
+            client, config, queue_file_for(checkpoint.path) if checkpoint else DEFAULT_QUEUE_FILE
+        )
+        if executor.queue.pending:
+            print(f"继续执行上次中断时未完成的{len(executor.queue.pending)}个取关...")
     try:
-        start_ts = time.time()
-        config = Config()
-        sync(login())
+        stats = await handle_follow_list(followed_users, client, cache, whitelist_task, planner, checkpoint, whitelist,
+                                         results, executor)
+    finally:
+        if executor:
+            executor.close()
+    # 关注列表获取失败时记录原因，检查点保留以便继续运行时重新获取列表
+    stats['list_error'] = str(list_errors[0]) if list_errors else None
+    if whitelist_task:
+        await whitelist_task
+    if refresh_task:
+        await refresh_task
+    if results:
+        auto_whitelist = set(whitelist) - manual_whitelist if whitelist_task else None
+        results.finish(client.uid, started_at, auto_whitelist, complete=not stats['list_error'])
+    return stats
+
+
+async def refresh_cookies(client):
+    """后台检查并刷新即将过期的 cookies，失败不影响本次运行"""
+    try:
+        if await client.refresh_credentials():
+            print("cookies即将过期，已自动刷新并保存")
+            logging.info(f"账号 {client.uid} 的cookies已自动刷新")
+    except Exception as e:
+        print(f"检查cookies是否需要刷新失败：{str(e)}")
+        logging.warning(f"检查cookies是否需要刷新失败：{str(e)}")
+
+
+def finish_checkpoint(checkpoint, stats):
+    """运行完成时删除检查点；关注列表未获取完整时保留，继续运行时重新获取列表并沿用已有的决定"""
+    if stats.get("list_error"):
+        msg = "关注列表未获取完整，已保留断点，继续上次运行时将重新获取关注列表"
+        print(msg)
+        logging.warning(msg)
+        return
+    checkpoint.finish()
+
+
+def report_metrics(metrics):
+    """输出各接口的请求数、延迟与限速等待，并写入 JSON 文件"""
+    summary = metrics.summary()
+    print(f"\n接口统计：\n{summary}")
+    logging.info(f"接口统计：\n{summary}")
+    metrics.dump(config.METRICS_PATH)
+    print(f"详细指标已写入 {config.METRICS_PATH}")
+
+
+async def run_apply(client, plan_path):
+    """执行取关计划，已成功取关的用户会被跳过"""
+    stats = {'success': 0, 'fail': 0, 'done': 0, 'gone': 0}
+    async for entry, status, message in apply_plan(client, plan_path, config.APPLY_WORKERS,
+                                                   config.UNFOLLOW_BATCH_SIZE):
+        if message is None:
+            stats['done'] += 1
+            continue
+        print(message)
+        if status == UNFOLLOW_FAILED:
+            stats['fail'] += 1
+            continue
+        logging.info(message)
+        stats['success' if status == UNFOLLOW_DONE else 'gone'] += 1
+    summary = (f"取关成功{stats['success']}个，失败{stats['fail']}个，此前已完成{stats['done']}个，"
+               f"已不在关注列表{stats['gone']}个！")
+    print(summary)
+    logging.info(summary)
+    return stats
+
+
+# 多账号模式下当前任务所属的账号，用于给输出与日志加上账号标签
+ACCOUNT_LABEL = contextvars.ContextVar("account_label", default="")
+
+
+class AccountTagStream:
+    """按 asyncio 任务上下文为每行输出加上账号标签，多账号并发时输出不会混在一起"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._line_start = True
+
+    def write(self, text):
+        label = ACCOUNT_LABEL.get()
+        parts = []
+        for line in text.splitlines(keepends=True):
+            if label and self._line_start:
+                parts.append(f"[{label}] ")
+            parts.append(line)
+            self._line_start = line.endswith("\n")
+        return self.stream.write("".join(parts))
+
+    def flush(self):
+        self.stream.flush()
+
+
+class AccountTagFilter(logging.Filter):
+    """日志中加上账号标签"""
+
+    def filter(self, record):
+        label = ACCOUNT_LABEL.get()
+        if label:
+            record.msg = f"[{label}] {record.msg}"
+        return True
+
+
+def account_file(path, uid):
+    """每个账号单独的检查点/计划文件，如 checkpoint.jsonl -> checkpoint_123.jsonl"""
+    path = Path(path)
+    return str(path.with_name(f"{path.stem}_{uid}{path.suffix}"))
+
+
+async def load_accounts(paths):
+    """
+    读取多个 cookies 文件并验证登录状态，失效或损坏的文件会被跳过
+    :return: [(label, account_config)]，account_config 为带有该账号 cookies 的 config 副本
+    """
+    accounts = []
+    seen = set()
+    for path in paths:
+        credentials = CredentialManager.from_config(config, path)
+        try:
+            # 深拷贝：各账号并发运行时列表、字典等参数互不影响；登录凭据不复制，随后设置为该账号的
+            account_config = copy.deepcopy(config, {id(getattr(config, "credentials", None)): None})
+            account_config.set_user_cookies(credentials.load(), credentials)
+        except (OSError, json.JSONDecodeError, KeyError) as e:
+            print(f"{path}：cookies文件无法读取：{str(e)}")
+            continue
+        if account_config.uid in seen:
+            print(f"{path}：账号 {account_config.uid} 重复，已忽略")
+            continue
+        try:
+            nav = await credentials.validate(lambda: fetch_account_info(account_config))
+        except Exception as e:
+            print(f"{path}：cookies已失效：{str(e)}")
+            continue
+        seen.add(account_config.uid)
+        label = nav.get("uname") or account_config.uid
+        print(f"{path}：{label}（UID:{account_config.uid}）登录有效")
+        accounts.append((label, account_config))
+    return accounts
+
 
+async def run_accounts(accounts, cache, metrics, checkpoints, results=None):
+    """
+    在同一事件循环中并发清理多个账号
+    每个账号使用独立的连接、读写限速与白名单，活跃度缓存共享：同一UP只探测一次
+    :param checkpoints: 与 accounts 一一对应的 Checkpoint
+    :param results: 共用的 ResultsStore，按账号分别记录
+    :return: 每个账号的 {"uid", "label", "stats"}，失败时为 "error"
+    """
+
+    async def run_one(label, account_config, checkpoint):
+        ACCOUNT_LABEL.set(label)
+        pacer = Pacer.from_config(config, metrics)
+        async with BiliClient.from_config(account_config, pacer) as client:
+            stats = await run_cleanup(client, cache, checkpoint=checkpoint, whitelist=list(config.ignore_list),
+                                      results=results)
+        finish_checkpoint(checkpoint, stats)
+        return stats
+
+    tasks = [run_one(label, account_config, checkpoint)
+             for (label, account_config), checkpoint in zip(accounts, checkpoints)]
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    reports = []
+    for (label, account_config), result in zip(accounts, outcomes):
+        report = {"uid": account_config.uid, "label": label}
+        if isinstance(result, Exception):
+            print(f"账号 {label} 处理失败：{str(result)}")
+            logging.error(f"账号 {label} 处理失败：{str(result)}")
+            report["error"] = str(result)
+        else:
+            report["stats"] = result
+        reports.append(report)
+    return reports
+
+
+# 退出码（无人值守运行时供 cron/systemd 判断结果）
+EXIT_OK = 0
+EXIT_PARTIAL = 1  # 完成，但有取关失败、探测失败、关注列表不完整或账号处理失败
+EXIT_CONFIG = 2  # 参数或配置文件无效，或取关计划不属于当前账号
+EXIT_AUTH = 3  # 无有效登录
+EXIT_ERROR = 4  # 运行异常中止，或未能获取关注列表
+EXIT_LOCKED = 5  # 已有运行在进行
+EXIT_INTERRUPTED = 130
+
+RUN_LOCK_FILE = "cleanup.lock"
+
+
+class RunLocked(Exception):
+    """已有运行持有锁文件"""
+
+
+@contextlib.contextmanager
+def run_lock(path=RUN_LOCK_FILE):
+    """
+    以独占方式创建锁文件，防止定时任务重叠运行时同时写检查点与取关
+    锁文件记录进程号；异常退出残留的锁需手动删除（POSIX 下进程已不存在时自动清理）
+    """
+    path = Path(path)
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        if not _stale_lock(path):
+            raise RunLocked(f"已有运行在进行（{path}），如确认没有运行中的进程请删除该文件")
+        path.unlink(missing_ok=True)
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    with os.fdopen(fd, "w") as f:
+        f.write(str(os.getpid()))
+    try:
+        yield
+    finally:
+        path.unlink(missing_ok=True)
+
+
+def _stale_lock(path):
+    if sys.platform == "win32":
+        return False
+    try:
+        os.kill(int(path.read_text().strip()), 0)
+    except ProcessLookupError:
+        return True
+    except (OSError, ValueError):
+        return False
+    return False
+
+
+def _account_failed(report):
+    """账号处理失败：运行异常，或关注列表获取失败且没有评估任何用户"""
+    stats = report.get("stats") or {}
+    return "error" in report or bool(stats.get("list_error") and not stats.get("total"))
+
+
+def exit_code_for(reports):
+    """根据各账号的统计计算退出码"""
+    if reports and all(_account_failed(report) for report in reports):
+        return EXIT_ERROR
+    for report in reports:
+        stats = report.get("stats") or {}
+        if "error" in report or stats.get("fail") or stats.get("errors") or stats.get("list_error"):
+            return EXIT_PARTIAL
+    return EXIT_OK
+
+
+def write_summary(path, command, exit_code, reports, cache=None, metrics=None):
+    """
+    写入机器可读的运行摘要（JSON），path 为 "-" 时输出到标准输出
+    :param reports: 每个账号的 {"uid", "label", "stats"}（或 "error"）
+    """
+    if not path:
+        return
+    summary = {
+        "command": command,
+        "exit_code": exit_code,
+        "finished_at": time.time(),
+        "accounts": reports,
+        "cache": {
+            "hits": cache.hits, "deferred": cache.deferred, "misses": cache.misses, "joined": cache.joined,
+        } if cache else None,
+        "requests": metrics.requests if metrics else 0,
+        "elapsed": round(metrics.elapsed, 3) if metrics else 0.0,
+    }
+    text = json.dumps(summary, ensure_ascii=False, indent=2)
+    if path == "-":
+        sys.__stdout__.write(text + "\n")
+    else:
+        Path(path).write_text(text, encoding="utf-8")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="B站关注列表清理")
+    subparsers = parser.add_subparsers(dest="command")
+    parser.add_argument("--resume", action="store_true", help="不询问，直接继续上次未完成的运行")
+    parser.add_argument("--headless", action="store_true",
+                        help="无人值守：不询问参数、不扫码、不倒计时，适合 cron/systemd 定时运行")
+    parser.add_argument("-c", "--config", help="配置文件（.toml 或 .json），键名与 Config 属性一致")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="覆盖单个参数，可重复，如 --set INACTIVE_THRESHOLD=180")
+    parser.add_argument("--cookies", default="cookies.json", help="cookies 文件路径")
+    parser.add_argument("--summary", help="运行摘要（JSON）写入路径，- 表示标准输出")
+    plan_parser = subparsers.add_parser("plan", help="只评估并生成取关计划，不执行取关")
+    plan_parser.add_argument("-o", "--output", default=DEFAULT_PLAN_FILE, help="计划文件路径")
+    apply_parser = subparsers.add_parser("apply", help="执行取关计划")
+    apply_parser.add_argument("plan_file", nargs="?", default=DEFAULT_PLAN_FILE, help="计划文件路径")
+    apply_parser.add_argument("-w", "--workers", type=int, help="取关并发数")
+    multi_parser = subparsers.add_parser("multi", help="多账号并发清理，共享活跃度缓存")
+    multi_parser.add_argument("cookie_files", nargs="+", help="各账号的 cookies 文件")
+    return parser.parse_args()
+
+
+async def countdown(args, message):
+    """交互模式下开始前倒计时，无人值守模式直接开始"""
+    if args.headless:
+        return
+    print(message)
+    for i in range(3, 0, -1):
+        print(f"倒计时:{i}")
+        await asyncio.sleep(1)
+
+
+def choose_parameters(args):
+    """交互模式下询问参数，无人值守模式只显示（参数来自配置文件与 --set）"""
+    if args.headless:
+        show_current_parameters()
+    else:
         set_parameter()
-        print("3s后开始执行取关脚本, CTRL+C终止程序：")
-        for i in range(3, 0, -1):
-            print(f"倒计时:{i}")
-            time.sleep(1)
-        if config.AUTO_ADD_IGNORE :
-            sync(is_in_special_group())
-        followed_list = get_follow_list()
 
-        print("开始处理...\n")
-        sync(handle_follow_list(followed_list))
+
+def report_overridden(checkpoint):
+    """恢复运行时提示被检查点覆盖的参数（如本次 -c/--set 指定的值）"""
+    message = checkpoint.describe_overridden()
+    if message:
+        print(message)
+        logging.warning(message)
+
+
+async def main_multi(args):
+    accounts = await load_accounts(args.cookie_files)
+    if not accounts:
+        print("没有可用的账号。")
+        write_summary(args.summary, args.command, EXIT_AUTH, [])
+        return EXIT_AUTH
+
+    # 所有账号共用同一组参数；--resume 时沿用各账号未完成的检查点
+    checkpoints = [None] * len(accounts)
+    if args.resume:
+        for i, (_, account_config) in enumerate(accounts):
+            checkpoints[i] = Checkpoint.load(account_file(DEFAULT_CHECKPOINT_FILE, account_config.uid))
+    resumed = [checkpoint for checkpoint in checkpoints if checkpoint]
+    if resumed:
+        for checkpoint in resumed:
+            report_overridden(checkpoint.resume(config))
+        print(f"已恢复{len(resumed)}个账号上次运行的参数，继续处理...")
+        show_current_parameters()
+    else:
+        choose_parameters(args)
+    for i, (_, account_config) in enumerate(accounts):
+        if not checkpoints[i]:
+            checkpoints[i] = Checkpoint.start(config, account_file(DEFAULT_CHECKPOINT_FILE, account_config.uid))
+
+    await countdown(args, f"3s后开始为{len(accounts)}个账号执行取关脚本, CTRL+C终止程序：")
+
+    # 未启用缓存时也使用内存缓存，保证同一UP在各账号间只探测一次
+    cache = ActivityCache.from_config(config, required=True)
+    results = ResultsStore.from_config(config)
+    metrics = Metrics()
+    tag_filter = AccountTagFilter()
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(tag_filter)
+    print("开始处理...\n")
+    reports = []
+    exit_code = EXIT_ERROR
+    try:
+        with contextlib.redirect_stdout(AccountTagStream(sys.stdout)):
+            reports = await run_accounts(accounts, cache, metrics, checkpoints, results)
+        exit_code = exit_code_for(reports)
+    finally:
+        for checkpoint in checkpoints:
+            checkpoint.close()
+        results.close()
+        report_cache(cache)
+        report_metrics(metrics)
+        write_summary(args.summary, args.command, exit_code, reports, cache, metrics)
+    return exit_code
+
+
+async def main_apply(args):
+    if not await login(args.cookies, interactive=not args.headless):
+        write_summary(args.summary, args.command, EXIT_AUTH, [])
+        return EXIT_AUTH
+
+    try:
+        check_plan_owner(args.plan_file, config.uid)
+    except PlanError as e:
+        print(str(e))
+        logging.error(str(e))
+        write_summary(args.summary, args.command, EXIT_CONFIG, [])
+        return EXIT_CONFIG
+
+    pacer = Pacer.from_config(config)
+    if args.workers:
+        config.APPLY_WORKERS = args.workers
+    print(f"开始执行取关计划 {args.plan_file}...\n")
+    reports = []
+    exit_code = EXIT_ERROR
+    try:
+        async with BiliClient.from_config(config, pacer) as client:
+            stats = await run_apply(client, args.plan_file)
+        reports = [{"uid": config.uid, "label": config.uid, "stats": stats}]
+        exit_code = exit_code_for(reports)
+    finally:
+        report_metrics(pacer.metrics)
+        write_summary(args.summary, args.command, exit_code, reports, metrics=pacer.metrics)
+    return exit_code
+
+
+async def main_single(args):
+    command = args.command or "run"
+    if not await login(args.cookies, interactive=not args.headless):
+        write_summary(args.summary, command, EXIT_AUTH, [])
+        return EXIT_AUTH
+
+    pacer = Pacer.from_config(config)
+    # 检查是否有未完成的运行
+    checkpoint = Checkpoint.load()
+    if checkpoint:
+        progress_msg = f"{len(checkpoint.decisions)}/{len(checkpoint.follows) if checkpoint.snapshot_complete else '?'}"
+        if args.resume:
+            resume = True
+        elif args.headless:
+            print(f"\n检测到上次未完成的运行（已处理 {progress_msg}），未指定 --resume，重新开始。")
+            resume = False
+        else:
+            msg = input(f"\n检测到上次未完成的运行（已处理 {progress_msg}），是否继续？[y/n]：").strip().lower()
+            resume = msg in {'y', 'yes'}
+        if resume:
+            report_overridden(checkpoint.resume(config))
+            print("已恢复上次运行的参数，继续处理...")
+            show_current_parameters()
+        else:
+            checkpoint = None
+
+    if not checkpoint:
+        choose_parameters(args)
+        checkpoint = Checkpoint.start(config)
+
+    if command == "plan":
+        print("计划模式：只评估并生成取关计划，不会取关。")
+    else:
+        await countdown(args, "3s后开始执行取关脚本, CTRL+C终止程序：")
+
+    cache = ActivityCache.from_config(config)
+    results = ResultsStore.from_config(config)
+    planner = PlanWriter(args.output, config.uid) if command == "plan" else None
+    print("开始处理...\n")
+    reports = []
+    exit_code = EXIT_ERROR
+    try:
+        async with BiliClient.from_config(config, pacer) as client:
+            stats = await run_cleanup(client, cache, planner, checkpoint, results=results)
+        finish_checkpoint(checkpoint, stats)
+        reports = [{"uid": config.uid, "label": config.uid, "stats": stats}]
+        exit_code = exit_code_for(reports)
+    finally:
+        report_cache(cache)
+        report_metrics(pacer.metrics)
+        checkpoint.close()
+        results.close()
+        if planner:
+            planner.close()
+        write_summary(args.summary, command, exit_code, reports, cache, pacer.metrics)
+    return exit_code
+
+
+async def main(args):
+    """
+    按子命令运行，返回退出码
+    无人值守模式下持有锁文件，避免定时任务重叠运行
+    """
+    try:
+        if args.config:
+            load_config_file(args.config)
+        apply_settings(parse_set_options(args.set), "--set")
+    except ConfigError as e:
+        print(f"参数错误：{str(e)}")
+        logging.error(f"参数错误：{str(e)}")
+        return EXIT_CONFIG
+
+    runner = {"multi": main_multi, "apply": main_apply}.get(args.command, main_single)
+    if not args.headless:
+        return await runner(args)
+    try:
+        with run_lock():
+            return await runner(args)
+    except RunLocked as e:
+        print(str(e))
+        logging.warning(str(e))
+        return EXIT_LOCKED
+
+
+if __name__ == '__main__':
+
+    exit_code = EXIT_OK
+    try:
+        start_ts = time.time()
+        args = parse_args()
+        # --summary - 时标准输出只写入 JSON 摘要，运行过程的输出改写到标准错误
+        if args.summary == "-":
+            sys.stdout = sys.stderr
+        config = Config()
+        exit_code = asyncio.run(main(args))
 
     except KeyboardInterrupt as e:
         print("已手动终止程序。")
+        exit_code = EXIT_INTERRUPTED
     except Exception as e:
         print("程序异常终止，请查看日志。")
         logging.error(e)
+        exit_code = EXIT_ERROR
     except APIException as e:
         print(f"程序调用API异常返回：{e.message}")
         logging.error(e)
+        exit_code = EXIT_ERROR
     used_time = timedelta(seconds=time.time()-start_ts)
-    print(f"总耗时：{used_time}")
\ No newline at end of file
+    print(f"总耗时：{used_time}")
+    sys.exit(exit_code)
@@ -0,0 +1,151 @@
+import bisect
+import json
+import time
+from collections import Counter
+
+# 延迟直方图分桶上界（秒），最后一桶为溢出
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DEFAULT_METRICS_FILE = "run_metrics.json"
+
+
+class EndpointStats:
+    """单个接口的请求数、延迟直方图、返回码与下载字节数统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.codes = Counter()
+        self.bytes = 0
+
+    def observe(self, seconds, code, size=0):
+        self.count += 1
+        self.bytes += size
+        self.total_time += seconds
+        self.max_time = max(self.max_time, seconds)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.codes[str(code)] += 1
+
+    @property
+    def errors(self):
+        return self.count - self.codes.get("0", 0)
+
+    def percentile(self, q):
+        """由直方图估算分位数（返回所在分桶上界）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else self.max_time
+        return self.max_time
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "total_time": round(self.total_time, 3),
+            "avg": round(self.total_time / self.count, 4) if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": round(self.max_time, 4),
+            "histogram": dict(zip([f"<={b}" for b in LATENCY_BUCKETS] + ["inf"], self.buckets)),
+            "codes": dict(self.codes),
+            "bytes": self.bytes,
+        }
+
+
+class Metrics:
+    """
+    单次运行的指标：每个接口的请求数、延迟与返回码，以及限速等待与网络等待的总时间
+    并发请求的时间按各请求累加，可能大于运行总耗时
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._start = time.monotonic()
+        self.endpoints = {}
+        self.sleep_time = Counter()
+        self.sleep_count = Counter()
+
+    def observe(self, endpoint, seconds, code=0, size=0):
+        """记录一次接口请求，code 为返回码或异常类型名，size 为下载的字节数（压缩后）"""
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = EndpointStats()
+        stats.observe(seconds, code, size)
+
+    def observe_sleep(self, kind, seconds):
+        """记录一次限速等待（read / write / breaker）"""
+        self.sleep_time[kind] += seconds
+        self.sleep_count[kind] += 1
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self._start
+
+    @property
+    def network_time(self):
+        return sum(s.total_time for s in self.endpoints.values())
+
+    @property
+    def requests(self):
+        return sum(s.count for s in self.endpoints.values())
+
+    @property
+    def bytes(self):
+        return sum(s.bytes for s in self.endpoints.values())
+
+    def to_dict(self):
+        return {
+            "started_at": self.started_at,
+            "elapsed": round(self.elapsed, 3),
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "network_time": round(self.network_time, 3),
+            "sleep_time": {k: round(v, 3) for k, v in self.sleep_time.items()},
+            "sleep_count": dict(self.sleep_count),
+            "endpoints": {name: stats.to_dict() for name, stats in sorted(self.endpoints.items())},
+        }
+
+    def rows(self):
+        """按接口汇总的表格行，供终端与界面显示"""
+        rows = []
+        for name, stats in sorted(self.endpoints.items(), key=lambda item: -item[1].total_time):
+            rows.append({
+                "接口": name,
+                "请求数": stats.count,
+                "错误": stats.errors,
+                "平均(ms)": round(stats.total_time / stats.count * 1000) if stats.count else 0,
+                "P95(ms)": round(stats.percentile(0.95) * 1000),
+                "累计(s)": round(stats.total_time, 1),
+                "流量(KB)": round(stats.bytes / 1024, 1),
+                "错误码": " ".join(f"{code}×{n}" for code, n in stats.codes.items() if code != "0"),
+            })
+        return rows
+
+    def summary(self):
+        """运行结束时的文本摘要"""
+        elapsed = self.elapsed
+        lines = [
+            f"总耗时 {elapsed:.1f}s | 请求 {self.requests} 次（{self.requests / elapsed if elapsed else 0:.2f} 次/秒）"
+            f" | 下载 {self.bytes / 1024:.1f}KB | 网络等待累计 {self.network_time:.1f}s"
+            f" | 限速等待累计 读 {self.sleep_time['read']:.1f}s / 写 {self.sleep_time['write']:.1f}s",
+        ]
+        if self.sleep_count["breaker"]:
+            lines[0] += f" | 风控熔断等待 {self.sleep_time['breaker']:.1f}s"
+        for row in self.rows():
+            line = (f"  {row['接口']:<18} {row['请求数']:>6} 次  错误 {row['错误']:>4}  "
+                    f"平均 {row['平均(ms)']:>5}ms  P95 {row['P95(ms)']:>5}ms  累计 {row['累计(s)']}s  {row['流量(KB)']}KB")
+            if row["错误码"]:
+                line += f"  [{row['错误码']}]"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def dump(self, path=DEFAULT_METRICS_FILE):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
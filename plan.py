@@ -0,0 +1,102 @@
+import json
+import time
+from pathlib import Path
+
+from unfollow import UNFOLLOW_DONE, UnfollowExecutor, UnfollowQueue, queue_file_for
+
+DECISION_UNFOLLOW = "unfollow"
+DECISION_KEEP = "keep"
+DECISION_SKIP = "skip"
+
+DEFAULT_PLAN_FILE = "unfollow_plan.jsonl"
+# 计划文件首行，记录生成计划的账号
+PLAN_HEADER = "plan"
+
+
+class PlanError(Exception):
+    """计划文件不属于当前登录的账号"""
+
+
+class PlanWriter:
+    """
+    取关计划文件（JSON Lines）：首行记录生成计划的账号（owner），之后每行一个用户：mid、名称、决定、原因与最后活跃时间
+    评估阶段只写计划不取关，取关由 apply_plan 单独执行
+    """
+
+    def __init__(self, path=DEFAULT_PLAN_FILE, owner=None):
+        self.path = Path(path)
+        self.counts = {DECISION_UNFOLLOW: 0, DECISION_KEEP: 0, DECISION_SKIP: 0}
+        self._file = open(self.path, "w", encoding="utf-8")
+        # 新计划的执行进度从头记录
+        Path(queue_file_for(self.path)).unlink(missing_ok=True)
+        self._file.write(json.dumps({"type": PLAN_HEADER, "owner": owner, "created_at": time.time()}) + "\n")
+        self._file.flush()
+
+    def write(self, mid, name, decision, reason, last_active_ts=None):
+        entry = {
+            "mid": mid,
+            "name": name,
+            "decision": decision,
+            "reason": reason,
+            "last_active_ts": last_active_ts,
+        }
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.counts[decision] += 1
+
+    def close(self):
+        self._file.close()
+
+
+def read_plan(path=DEFAULT_PLAN_FILE):
+    """逐行读取计划文件中的用户（跳过首行的账号记录）"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                if entry.get("type") != PLAN_HEADER:
+                    yield entry
+
+
+def check_plan_owner(path, uid):
+    """
+    确认计划由当前登录的账号生成，否则抛出 PlanError
+    在其他账号下执行会取关该账号恰好也关注的用户；未记录账号的旧版计划同样拒绝执行，需重新生成
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.readline()
+    header = json.loads(first) if first.strip() else {}
+    owner = header.get("owner") if header.get("type") == PLAN_HEADER else None
+    if owner is None:
+        raise PlanError(f"计划文件 {path} 未记录生成计划的账号，请重新生成计划")
+    if str(owner) != str(uid):
+        raise PlanError(f"计划文件 {path} 由账号 UID:{owner} 生成，当前登录的是 UID:{uid}，已拒绝执行")
+
+
+async def apply_plan(client, path=DEFAULT_PLAN_FILE, workers=1, batch_size=50):
+    """
+    执行计划中的取关：经 UnfollowExecutor 按批确认关系后取关，使用取关请求的独立限速与并发
+    执行结果记录在 <计划文件>.queue，重复执行同一计划时跳过已完成的用户，保证幂等
+    计划不属于 client 的账号时抛出 PlanError
+    :return: async generator of (entry, status, message)，此前已完成的用户 message 为 None
+    """
+    check_plan_owner(path, client.uid)
+    queue = UnfollowQueue(queue_file_for(path))
+    executor = UnfollowExecutor(client, queue, batch_size, workers)
+    entries = {}
+    try:
+        for entry in read_plan(path):
+            if entry["decision"] != DECISION_UNFOLLOW:
+                continue
+            if entry["mid"] in queue.finished:
+                yield entry, UNFOLLOW_DONE, None
+                continue
+            entries[entry["mid"]] = entry
+            executor.add(entry["mid"], entry["name"])
+        async for mid, name, status, message in executor.run():
+            # 计划文件被手动修改时，队列中可能有已不在计划中的用户
+            entry = entries.get(mid) or {"mid": mid, "name": name, "decision": DECISION_UNFOLLOW}
+            yield entry, status, message
+    finally:
+        # 保留已完成的记录，供重复执行时跳过
+        queue.close()
@@ -0,0 +1,58 @@
+import asyncio
+import logging
+import time
+
+from cache import OUTCOME_ACTIVE, OUTCOME_DELETED
+
+# 多 uid 接口单次请求的用户数
+BATCH_SIZE = 50
+
+
+def is_deleted_card(card):
+    """用户卡片显示为已注销或被封禁"""
+    return card.get("name") == "账号已注销" or card.get("silence") == 1
+
+
+async def batch_prefilter(client, users, should_check):
+    """
+    对一批用户调用多 uid 接口预筛，结果写入 user.prefilter = (last_active_ts, outcome)
+    正在直播的用户视为当前活跃，已注销/封禁的用户视为注销，二者都无需单独探测
+    """
+    candidates = [u for u in users if should_check(u)]
+    if not candidates:
+        return
+    mids = [u.mid for u in candidates]
+    cards, lives = await asyncio.gather(
+        client.get_user_cards(mids), client.get_live_status(mids), return_exceptions=True
+    )
+    # 预筛失败不影响结果，相关用户照常逐个探测
+    if isinstance(cards, Exception):
+        logging.warning(f"批量获取用户卡片失败：{str(cards)}")
+        cards = {}
+    if isinstance(lives, Exception):
+        logging.warning(f"批量获取直播状态失败：{str(lives)}")
+        lives = {}
+
+    now = time.time()
+    for u in candidates:
+        card = cards.get(int(u.mid))
+        if card and is_deleted_card(card):
+            u.prefilter = (None, OUTCOME_DELETED)
+        elif lives.get(int(u.mid), {}).get("live_status") == 1:
+            u.prefilter = (now, OUTCOME_ACTIVE)
+
+
+async def prefilter_stage(client, source, should_check, batch_size=BATCH_SIZE):
+    """流水线预筛阶段：按批聚合上游用户，批量预筛后按原顺序继续产出"""
+    batch = []
+    async for item in source:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            await batch_prefilter(client, batch, should_check)
+            for u in batch:
+                yield u
+            batch = []
+    if batch:
+        await batch_prefilter(client, batch, should_check)
+        for u in batch:
+            yield u
@@ -0,0 +1,165 @@
+import logging
+from collections import Counter
+
+from cache import OUTCOME_ACTIVE, OUTCOME_BLOCKED, OUTCOME_EMPTY, OUTCOME_ERROR
+from engine import race_until
+from ratelimit import is_rate_limited
+
+CASCADE_SIGNAL_NAMES = {"dynamic": "动态", "post": "投稿"}
+
+# 终端版写入根 logger 的日志文件，网页版由 BiliCleaner logger 显示在界面并写入日志文件
+logger = logging.getLogger("BiliCleaner.probe")
+
+
+class FollowedUser:
+    """关注的用户与其最后活跃时间的探测，终端版与网页版共用"""
+    user_count = 0
+    # 各投稿来源判定活跃的次数，探测时按命中次数排序；初始顺序：视频 > 专栏 > 音频
+    post_source_hits = Counter({"video": 0, "article": 0, "audio": 0})
+    # 级联检测：在第 n 层判定活跃的人数、探测人数与累计成本
+    cascade_resolved = Counter()
+    cascade_users = 0
+    cascade_cost = 0
+
+    def __init__(self, mid, uname, client=None, mtime=None, rank=None):
+        self.mid = mid
+        self.name = uname
+        self.client = client
+        self.mtime = mtime # 关注时间
+        self.rank = rank # 从最新关注起的序号（0 开始）
+        self.error = None # 最近一次探测异常，用于区分“无记录”与“探测失败”
+        self.prefilter = None # 批量预筛结果 (last_active_ts, outcome)
+        self.activity = None # 本次评估得到的 (last_active_ts, outcome)，写入结果库
+        FollowedUser.user_count += 1
+
+    async def _probe(self, kind, fetch):
+        """调用单个来源的探测，失败时记录异常并返回 None"""
+        try:
+            return await fetch(self.mid)
+        except Exception as e:
+            self.error = e
+            logger.error(f"获取用户{self.name}({self.mid}){kind}失败：{str(e)}")
+            return
+
+    async def get_latest_dynamic_time(self):
+        """最新动态的发布时间（置顶动态由 client 处理）"""
+        return await self._probe("动态", self.client.latest_dynamic_ts)
+
+    async def _latest_video_time(self):
+        return await self._probe("视频", self.client.latest_video_ts)
+
+    async def _latest_audio_time(self):
+        return await self._probe("音频", self.client.latest_audio_ts)
+
+    async def _latest_article_time(self):
+        return await self._probe("专栏", self.client.latest_article_ts)
+
+    async def get_latest_post_time(self, active_after=None):
+        """
+        最新投稿（视频/音频/专栏）时间戳
+        三个来源按命中率错峰并发探测，任一来源晚于 active_after（已可判定活跃）时取消其余探测直接返回
+        """
+        sources = {
+            "video": self._latest_video_time,
+            "article": self._latest_article_time,
+            "audio": self._latest_audio_time,
+        }
+        order = sorted(sources, key=lambda name: -FollowedUser.post_source_hits[name])
+        accept = lambda ts: active_after is not None and ts is not None and ts > active_after
+        # 没有提前结束条件时无需错峰
+        hedge_delay = 1.0 if active_after is not None else 0
+        results, winner = await race_until([sources[name] for name in order], accept, hedge_delay)
+        if winner is not None:
+            FollowedUser.post_source_hits[order[winner]] += 1
+            return results[winner]
+
+        # 有来源探测失败时，其余来源的较早时间不能说明用户不活跃
+        if self.error:
+            return
+        timestamps = [ts for ts in results if ts is not None]
+        return max(timestamps) if timestamps else None
+
+    async def get_cascade_time(self, tiers, active_after=None):
+        """
+        级联检测：按 tiers 顺序逐层探测，某层已晚于 active_after 即判定活跃并停止，否则继续下一层
+        任一层探测失败且未判定活跃时返回 None，由 self.error 归为探测失败，避免依据不完整的结果取关
+        :param tiers: [[signal, cost], ...]，signal 为 "dynamic" 或 "post"
+        :return: 各层中最新的时间戳
+        """
+        FollowedUser.cascade_users += 1
+        timestamps = []
+        for depth, (signal, cost) in enumerate(tiers, 1):
+            FollowedUser.cascade_cost += cost
+            if signal == "dynamic":
+                ts = await self.get_latest_dynamic_time()
+            else:
+                ts = await self.get_latest_post_time(active_after)
+            if ts is None:
+                continue
+            timestamps.append(ts)
+            if active_after is not None and ts > active_after:
+                FollowedUser.cascade_resolved[depth] += 1
+                return ts
+        if self.error:
+            return
+        return max(timestamps) if timestamps else None
+
+    @classmethod
+    def cascade_summary(cls, tiers):
+        """级联检测统计：各层判定活跃的人数与成本（相对每人检测全部层级）"""
+        if not cls.cascade_users:
+            return
+        resolved = " | ".join(
+            f"第{depth}层（{CASCADE_SIGNAL_NAMES[signal]}）判定活跃{cls.cascade_resolved[depth]}个"
+            for depth, (signal, _) in enumerate(tiers, 1)
+        )
+        unresolved = cls.cascade_users - sum(cls.cascade_resolved.values())
+        full_cost = cls.cascade_users * sum(cost for _, cost in tiers)
+        return (f"级联检测：{resolved} | 未判定活跃{unresolved}个 | "
+                f"成本{cls.cascade_cost:g}（全量检测为{full_cost:g}）")
+
+
+async def probe_last_active(config, handle_user, active_after=None):
+    """
+    按 DETECT_TYPE 探测用户最后活跃时间并归类结果
+    :param active_after: 晚于该时间即可判定为活跃，投稿与级联检测据此提前结束
+    :return: (timestamp or None, outcome)
+    """
+    if config.DETECT_TYPE == 0:
+        last_active_ts = await handle_user.get_latest_dynamic_time()
+    elif config.DETECT_TYPE == 1:
+        last_active_ts = await handle_user.get_latest_post_time(active_after)
+    else:
+        last_active_ts = await handle_user.get_cascade_time(config.CASCADE_TIERS, active_after)
+
+    if last_active_ts is not None:
+        return last_active_ts, OUTCOME_ACTIVE
+    if handle_user.error:
+        return None, OUTCOME_BLOCKED if is_rate_limited(handle_user.error) else OUTCOME_ERROR
+    return None, OUTCOME_EMPTY
+
+
+def follow_protect_days(config):
+    """关注保护天数：FOLLOW_PROTECT_DAYS 与（启用时）不活跃阈值中的较大者"""
+    threshold = config.INACTIVE_THRESHOLD if config.FOLLOW_PROTECT_THRESHOLD else 0
+    return max(config.FOLLOW_PROTECT_DAYS, threshold)
+
+
+def follow_skip_reason(config, iuser, position, current_ts):
+    """
+    按关注顺序与关注时间判断是否跳过（跳过的用户不探测、不取关）
+    :param position: 无 rank 时（旧检查点）使用的处理序号，0 开始
+    :return: 跳过原因，无需跳过时返回 None
+    """
+    rank = iuser.rank if iuser.rank is not None else position
+    if rank < config.SKIP_NUM:
+        return "跳过最近关注"
+    protect_days = follow_protect_days(config)
+    if protect_days and iuser.mtime and current_ts - iuser.mtime < protect_days * 86400:
+        return f"关注不足{protect_days}天"
+    return None
+
+
+def active_after_ts(config, current_ts):
+    """晚于此时间的活动即未超过不活跃阈值（与 past_days 的取整方式一致）"""
+    return current_ts - (config.INACTIVE_THRESHOLD + 1) * 86400
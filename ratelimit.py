@@ -0,0 +1,208 @@
+import asyncio
+import time
+
+from metrics import Metrics
+
+# B站风控返回码：-352 风控校验失败，-412 请求被拦截
+RATE_LIMIT_CODES = {-352, -412}
+
+
+class BiliAPIError(Exception):
+    """接口返回非零 code"""
+    def __init__(self, code, message=None):
+        self.code = code
+        self.message = message
+        super().__init__(f"状态码 {code}: {message}")
+
+
+def is_rate_limited(exc):
+    """
+    判断异常是否由风控（-352/-412）引起
+    只依据结构化的返回码（BiliAPIError.code、bilibili_api 异常的 code/status）或 HTTP 状态码，
+    不匹配异常文本：文本中的 mid、字节数或网址片段可能恰好包含 352/412
+    """
+    response = getattr(exc, "response", None)
+    for code in (getattr(exc, "code", None), getattr(exc, "status", None), getattr(response, "status_code", None)):
+        if code is None:
+            continue
+        try:
+            code = int(code)
+        except (TypeError, ValueError):
+            continue
+        if code in RATE_LIMIT_CODES or -code in RATE_LIMIT_CODES:
+            return True
+    return False
+
+
+class RateLimiter:
+    """令牌桶限速器：限制全局请求速率（次/秒）"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self):
+        """获取一个请求令牌，不足时等待"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    AIMD 自适应限速器
+    请求成功时线性提升速率，触发风控时按比例降速，使速率贴近可承受的上限
+    """
+
+    def __init__(self, rate, min_rate, max_rate, increase=0.02, decrease=0.5, burst=1):
+        super().__init__(rate, burst)
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, min_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.throttled = 0
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttled(self):
+        self._refill()
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        # 清空令牌并额外等待一个周期，避免风控期间的请求继续堆积
+        self._tokens = -1.0
+        self.throttled += 1
+
+
+class CircuitBreaker:
+    """
+    按接口熔断：同一接口连续 threshold 次触发风控后暂停 cooldown 秒
+    暂停期间该接口的请求原地等待，不再消耗请求；到期后只放行一个试探请求，
+    试探成功即恢复，仍被风控则暂停时间加倍（不超过 max_cooldown）
+    """
+
+    def __init__(self, threshold=3, cooldown=30.0, max_cooldown=600.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.opened = 0  # 熔断次数
+        self._failures = {}  # 接口 -> 连续风控次数
+        self._trips = {}  # 接口 -> 连续熔断次数，决定下次暂停时长
+        self._open_until = {}  # 熔断中的接口 -> 恢复时间
+        self._trial = set()  # 正在试探的接口
+
+    def is_open(self, endpoint):
+        return endpoint in self._open_until
+
+    async def before(self, endpoint):
+        """
+        请求前调用：接口熔断中时等待，到期后的第一个请求作为试探放行
+        :return: 本次请求是否为试探请求
+        """
+        while endpoint in self._open_until:
+            delay = self._open_until[endpoint] - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif endpoint in self._trial:
+                # 等待试探结果
+                await asyncio.sleep(min(1.0, self.cooldown))
+            else:
+                self._trial.add(endpoint)
+                return True
+        return False
+
+    def record(self, endpoint, blocked, trial=False):
+        """
+        请求结束后调用
+        :param blocked: True 为触发风控，False 为成功，None 为其他异常或被取消（不影响熔断状态）
+        :param trial: before() 的返回值；熔断期间仍在进行中的普通请求的结果不影响熔断状态
+        """
+        if trial:
+            self._trial.discard(endpoint)
+        elif endpoint in self._open_until:
+            return
+        if blocked is None:
+            return
+        if not blocked:
+            self._failures.pop(endpoint, None)
+            self._trips.pop(endpoint, None)
+            self._open_until.pop(endpoint, None)
+            return
+        failures = self._failures.get(endpoint, 0) + 1
+        if failures < self.threshold and not trial:
+            self._failures[endpoint] = failures
+            return
+        trips = self._trips.get(endpoint, 0) + 1
+        self._trips[endpoint] = trips
+        self._failures.pop(endpoint, None)
+        self._open_until[endpoint] = time.monotonic() + min(self.cooldown * 2 ** (trips - 1), self.max_cooldown)
+        self.opened += 1
+
+
+class Pacer:
+    """
+    读写分离的请求节奏控制：仅实际API调用消耗令牌，等待令牌的时间计入 metrics
+    同时持有按接口的熔断器，由 BiliClient 在每次请求前后使用
+    """
+
+    def __init__(self, read_limiter, write_limiter, metrics=None, breaker=None):
+        self.read_limiter = read_limiter
+        self.write_limiter = write_limiter
+        self.metrics = metrics or Metrics()
+        self.breaker = breaker or CircuitBreaker()
+
+    @classmethod
+    def from_config(cls, config, metrics=None):
+        return cls(
+            AdaptiveRateLimiter(config.READ_RATE, config.MIN_RATE, config.READ_RATE_MAX),
+            AdaptiveRateLimiter(config.WRITE_RATE, config.MIN_RATE, config.WRITE_RATE_MAX),
+            metrics,
+            CircuitBreaker(config.BREAKER_THRESHOLD, config.BREAKER_COOLDOWN),
+        )
+
+    async def read(self, func, *args, **kwargs):
+        """读请求（动态、投稿、关注列表等）"""
+        return await self._call("read", self.read_limiter, func, *args, **kwargs)
+
+    async def write(self, func, *args, **kwargs):
+        """写请求（取关）"""
+        return await self._call("write", self.write_limiter, func, *args, **kwargs)
+
+    async def _call(self, kind, limiter, func, *args, **kwargs):
+        # 第一个参数为接口 URL 时按接口熔断，熔断等待在获取令牌之前，恢复后不会集中发出积压的请求
+        endpoint = args[0] if args and isinstance(args[0], str) else None
+        trial = False
+        if endpoint and self.breaker.is_open(endpoint):
+            start = time.monotonic()
+            trial = await self.breaker.before(endpoint)
+            self.metrics.observe_sleep("breaker", time.monotonic() - start)
+        start = time.monotonic()
+        await limiter.acquire()
+        self.metrics.observe_sleep(kind, time.monotonic() - start)
+        blocked = None
+        try:
+            result = await func(*args, **kwargs)
+            blocked = False
+        except Exception as e:
+            if is_rate_limited(e):
+                blocked = True
+                limiter.on_throttled()
+            raise
+        finally:
+            if endpoint:
+                self.breaker.record(endpoint, blocked, trial)
+        limiter.on_success()
+        return result
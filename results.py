@@ -0,0 +1,139 @@
+import sqlite3
+import time
+from collections import namedtuple
+
+from cache import OUTCOME_ACTIVE, OUTCOME_DELETED, within_threshold
+
+DEFAULT_RESULTS_FILE = "results.db"
+# 动态检测取最新一条动态，时间准确；投稿与级联检测在阈值内即提前结束，活跃时间只是下限
+EXACT_DETECT_TYPES = {0}
+
+# 一个关注用户的评估结果；无活跃记录（跳过、白名单或尚未探测）时 outcome 为 None
+# auto_whitelisted：上次运行时位于自动白名单（互关/特别关注），手动白名单在模拟时按当前设置判断
+# lower_bound：last_active_ts 可能只是下限（提前结束的探测），只能说明用户在记录时的阈值内活跃
+ResultRow = namedtuple("ResultRow", "mid name mtime rank auto_whitelisted deleted last_active_ts outcome lower_bound")
+
+
+def is_lower_bound(detect_type, last_active_ts, outcome, recorded_at, threshold):
+    """
+    活跃时间是否可能只是下限：投稿/级联检测记录时在阈值内（可能提前结束）
+    阈值外的时间来自完整探测，是准确的；旧版结果库没有记录阈值，按下限处理
+    """
+    if detect_type in EXACT_DETECT_TYPES or outcome != OUTCOME_ACTIVE or last_active_ts is None:
+        return False
+    return threshold is None or within_threshold(last_active_ts, recorded_at, threshold)
+
+
+class ResultsStore:
+    """
+    评估结果库（SQLite）
+    按账号记录关注快照（关注时间、序号、自动白名单），按检测类型记录每个UP的最后活跃时间与探测结果
+    阈值模拟只读取本库，调整参数无需再次请求
+    """
+
+    def __init__(self, path=DEFAULT_RESULTS_FILE):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS follows (
+                owner INTEGER NOT NULL,
+                mid INTEGER NOT NULL,
+                name TEXT,
+                mtime REAL,
+                rank INTEGER,
+                auto_whitelisted INTEGER NOT NULL DEFAULT 0,
+                seen_at REAL NOT NULL,
+                PRIMARY KEY (owner, mid)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS activity (
+                mid INTEGER NOT NULL,
+                detect_type INTEGER NOT NULL,
+                last_active_ts REAL,
+                outcome TEXT NOT NULL,
+                recorded_at REAL NOT NULL,
+                threshold INTEGER,
+                PRIMARY KEY (mid, detect_type)
+            )
+        """)
+        # 兼容旧版结果库
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(activity)")}
+        if "threshold" not in columns:
+            self._conn.execute("ALTER TABLE activity ADD COLUMN threshold INTEGER")
+        self._conn.commit()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.RESULTS_PATH)
+
+    def record(self, owner, iuser, detect_type=None, threshold=None):
+        """
+        记录一个关注用户；iuser.activity = (last_active_ts, outcome) 存在时同时记录其活跃结果
+        沿用上次决定或跳过的用户只更新关注信息，保留此前记录的活跃时间
+        :param threshold: 评估时的不活跃阈值，模拟时据此判断活跃时间是否只是下限
+        """
+        now = time.time()
+        self._conn.execute(
+            "INSERT INTO follows (owner, mid, name, mtime, rank, seen_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (owner, mid) DO UPDATE SET name = excluded.name, mtime = excluded.mtime, "
+            "rank = excluded.rank, seen_at = excluded.seen_at",
+            (int(owner), int(iuser.mid), iuser.name, iuser.mtime, iuser.rank, now),
+        )
+        activity = getattr(iuser, "activity", None)
+        if activity and detect_type is not None:
+            last_active_ts, outcome = activity
+            self._conn.execute(
+                "INSERT OR REPLACE INTO activity (mid, detect_type, last_active_ts, outcome, recorded_at, threshold) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (int(iuser.mid), detect_type, last_active_ts, outcome, now, threshold),
+            )
+        self._conn.commit()
+
+    def remove(self, owner, mid):
+        """已取关的用户移出关注快照"""
+        self._conn.execute("DELETE FROM follows WHERE owner = ? AND mid = ?", (int(owner), int(mid)))
+        self._conn.commit()
+
+    def finish(self, owner, started_at, auto_whitelist, complete=True):
+        """
+        处理一遍关注列表后调用：更新自动白名单标记，移除本次未出现的用户（已在别处取关）
+        :param auto_whitelist: 本次运行获取到的互关/特别关注 mid，未获取（关闭自动白名单）时为 None，保留原标记
+        :param complete: 关注列表是否完整获取；获取失败时未出现的用户不一定已取关，不移除
+        """
+        owner = int(owner)
+        if complete:
+            self._conn.execute("DELETE FROM follows WHERE owner = ? AND seen_at < ?", (owner, started_at))
+        if auto_whitelist is not None:
+            self._conn.execute("UPDATE follows SET auto_whitelisted = 0 WHERE owner = ?", (owner,))
+            self._conn.executemany("UPDATE follows SET auto_whitelisted = 1 WHERE owner = ? AND mid = ?",
+                                   [(owner, int(mid)) for mid in auto_whitelist])
+        self._conn.commit()
+
+    def version(self, owner):
+        """数据版本，记录有变化时随之改变（供界面判断是否需要重新载入）"""
+        follows = self._conn.execute(
+            "SELECT COUNT(*), MAX(seen_at), SUM(auto_whitelisted) FROM follows WHERE owner = ?", (int(owner),)
+        ).fetchone()
+        activity = self._conn.execute("SELECT COUNT(*), MAX(recorded_at) FROM activity").fetchone()
+        return follows + activity
+
+    def load(self, owner, detect_type):
+        """读取账号的全部关注及其在指定检测类型下的活跃结果"""
+        rows = self._conn.execute(
+            "SELECT f.mid, f.name, f.mtime, f.rank, f.auto_whitelisted, a.last_active_ts, a.outcome, "
+            "a.recorded_at, a.threshold "
+            "FROM follows f LEFT JOIN activity a ON a.mid = f.mid AND a.detect_type = ? "
+            "WHERE f.owner = ? ORDER BY f.rank",
+            (detect_type, int(owner)),
+        ).fetchall()
+        return [
+            ResultRow(mid, name, mtime, rank, bool(auto_whitelisted),
+                      name == "账号已注销" or outcome == OUTCOME_DELETED, last_active_ts, outcome,
+                      is_lower_bound(detect_type, last_active_ts, outcome, recorded_at, threshold))
+            for mid, name, mtime, rank, auto_whitelisted, last_active_ts, outcome, recorded_at, threshold in rows
+        ]
+
+    def close(self):
+        self._conn.close()
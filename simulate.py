@@ -0,0 +1,86 @@
+import time
+
+import numpy as np
+
+from cache import FAILED_OUTCOMES, OUTCOME_ACTIVE, OUTCOME_EMPTY
+
+# 活跃间隔分布的分组（天）
+AGE_BUCKETS = [0, 30, 90, 180, 365, 730, 1095]
+
+
+class WhatIfSimulator:
+    """
+    阈值模拟：把结果库中一个账号的数据载入为 NumPy 数组，对任意参数组合即时计算取关人数
+    判定规则与 evaluate_user_status / follow_skip_reason 一致，不发起任何请求
+    """
+
+    def __init__(self, rows, now=None):
+        self.now = now or time.time()
+        self.total = len(rows)
+        self.mid = np.array([row.mid for row in rows], dtype=np.int64)
+        self.rank = np.array([-1 if row.rank is None else row.rank for row in rows], dtype=np.int64)
+        mtime = np.array([np.nan if row.mtime is None else row.mtime for row in rows], dtype=float)
+        self.follow_days = (self.now - mtime) / 86400  # 无关注时间时为 nan，不受关注保护
+        self.auto_whitelisted = np.array([row.auto_whitelisted for row in rows], dtype=bool)
+        self.deleted = np.array([row.deleted for row in rows], dtype=bool)
+        outcome = np.array([row.outcome or "" for row in rows], dtype=object)
+        self.active = (outcome == OUTCOME_ACTIVE) & ~self.deleted
+        self.empty = (outcome == OUTCOME_EMPTY) & ~self.deleted
+        self.error = np.isin(outcome, list(FAILED_OUTCOMES)) & ~self.deleted
+        self.unknown = ~(self.active | self.empty | self.error | self.deleted)
+        last_active = np.array([np.nan if row.last_active_ts is None else row.last_active_ts for row in rows],
+                               dtype=float)
+        # 与 evaluate_user_status 相同：按整天数计算未活跃天数
+        self.past_days = np.where(self.active, np.floor((self.now - last_active) / 86400), np.nan)
+        # 活跃时间只是下限的用户：超过模拟阈值时无法判断是否不活跃
+        self.lower_bound = np.array([row.lower_bound for row in rows], dtype=bool) & self.active
+
+    @classmethod
+    def from_store(cls, store, owner, detect_type, now=None):
+        return cls(store.load(owner, detect_type), now)
+
+    def simulate(self, threshold, skip_num=0, protect_days=0, protect_threshold=False,
+                 remove_empty=False, remove_deleted=False, ignore_list=(), auto_whitelist=True):
+        """
+        按给定参数计算各类人数
+        :param ignore_list: 手动白名单
+        :param auto_whitelist: 是否保护上次运行记录的互关/特别关注
+        :return: dict，unfollow 为将取关人数，unknown 为尚无活跃记录或活跃时间只是下限、需实际探测才能判断的人数
+        """
+        protect = max(protect_days, threshold if protect_threshold else 0)
+        skipped = (self.rank >= 0) & (self.rank < skip_num)
+        if protect:
+            skipped |= self.follow_days < protect  # nan 比较结果为 False
+        whitelisted = np.isin(self.mid, np.array(list(ignore_list), dtype=np.int64))
+        if auto_whitelist:
+            whitelisted |= self.auto_whitelisted
+        whitelisted &= ~skipped
+        considered = ~skipped & ~whitelisted
+
+        beyond = considered & self.active & (self.past_days > threshold)
+        inactive = beyond & ~self.lower_bound
+        empty = considered & self.empty
+        deleted = considered & self.deleted
+        unfollow = inactive | (empty if remove_empty else False) | (deleted if remove_deleted else False)
+        unknown = (considered & self.unknown) | (beyond & self.lower_bound)
+        return {
+            "total": self.total,
+            "unfollow": int(unfollow.sum()),
+            "inactive": int(inactive.sum()),
+            "empty": int(empty.sum()),
+            "deleted": int(deleted.sum()),
+            "keep": int((considered & ~unfollow & ~unknown).sum()),
+            "whitelisted": int(whitelisted.sum()),
+            "skipped": int(skipped.sum()),
+            "unknown": int(unknown.sum()),
+        }
+
+    def age_distribution(self, buckets=AGE_BUCKETS):
+        """
+        有活跃记录的用户按未活跃天数分组
+        :return: [(分组名, 人数)]
+        """
+        edges = np.array(list(buckets) + [np.inf])
+        counts, _ = np.histogram(self.past_days[self.active], bins=edges)
+        labels = [f"{lo}-{hi}天" for lo, hi in zip(buckets, buckets[1:])] + [f"{buckets[-1]}天以上"]
+        return list(zip(labels, counts.tolist()))
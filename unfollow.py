@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+
+from engine import probe_users
+
+# 单个用户的取关结果
+UNFOLLOW_DONE = "done"                    # 取关成功，且已确认不在关注列表
+UNFOLLOW_NOT_FOLLOWING = "not_following"  # 执行前已不在关注列表，未发送取关请求
+UNFOLLOW_FAILED = "failed"                # 取关请求失败、未生效或无法确认，留在队列中等待下次执行
+
+DEFAULT_QUEUE_FILE = "unfollow_queue.jsonl"
+
+# 关系接口的 attribute：0 未关注，1 悄悄关注，2 已关注，6 互关，128 已拉黑
+FOLLOWING_ATTRIBUTES = {1, 2, 6}
+
+
+def queue_file_for(path):
+    """检查点或取关计划对应的取关队列文件，如 unfollow_plan.jsonl -> unfollow_plan.jsonl.queue"""
+    return f"{path}.queue"
+
+
+class UnfollowQueue:
+    """
+    持久化取关队列（JSON Lines，逐条追加写入）
+    记录加入队列的用户与每次执行结果：成功或已不在关注列表的出队，失败的保留，中断或重启后继续执行
+    队列属于一个检查点或取关计划，二者重新生成时随之清空，不会执行按旧参数做出的取关决定
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_FILE):
+        self.path = Path(path)
+        self.pending = {}  # 待取关 mid -> 名称，按加入顺序
+        self.finished = set()  # 已完成（取关成功或已不在关注列表）
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 崩溃时最后一行可能只写了一半
+                        continue
+                    mid = record["mid"]
+                    if record["type"] == "add":
+                        self.pending[mid] = record["name"]
+                        self.finished.discard(mid)
+                    elif record["status"] != UNFOLLOW_FAILED:
+                        self.pending.pop(mid, None)
+                        self.finished.add(mid)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def add(self, mid, name=None):
+        if mid in self.pending:
+            return
+        self.finished.discard(mid)
+        self.pending[mid] = name
+        self._write({"type": "add", "mid": mid, "name": name, "ts": time.time()})
+
+    def mark(self, mid, status):
+        if status != UNFOLLOW_FAILED:
+            self.pending.pop(mid, None)
+            self.finished.add(mid)
+        self._write({"type": "result", "mid": mid, "status": status, "ts": time.time()})
+
+    def finish(self):
+        """运行结束：队列已清空时删除文件，仍有失败的用户时保留以便下次继续"""
+        self.close()
+        if not self.pending:
+            self.path.unlink(missing_ok=True)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class UnfollowExecutor:
+    """
+    取关执行器：收集待取关用户，按批执行
+    每批先用关系接口批量确认（一次请求），已不在关注列表的用户不再发送取关请求；
+    取关请求走 Pacer 的写限速，完成后再批量确认一次，仍在关注或确认失败的记为失败，留在队列中
+    B站的批量关系接口（/x/relation/batch/modify）只支持关注与拉黑，取关仍需逐个请求
+    """
+
+    def __init__(self, client, queue, batch_size=50, workers=1):
+        self.client = client
+        self.queue = queue
+        self.batch_size = batch_size
+        self.workers = workers
+        self.min_batch = max(1, batch_size // 10)  # 后台开始执行的最少人数
+        self._attempted = set()  # 本次运行已执行过的 mid，失败的留到下次运行
+        self._task = None  # 后台执行任务
+
+    @classmethod
+    def from_config(cls, client, config, path=DEFAULT_QUEUE_FILE):
+        return cls(client, UnfollowQueue(path), config.UNFOLLOW_BATCH_SIZE, config.APPLY_WORKERS)
+
+    def add(self, mid, name=None):
+        self.queue.add(mid, name)
+
+    def _todo(self):
+        return [mid for mid in self.queue.pending if mid not in self._attempted]
+
+    async def _following(self, mids):
+        """
+        批量确认关注关系
+        :return: 仍在关注的 mid 集合，确认失败时返回 None
+        """
+        try:
+            relations = await self.client.get_relations(mids)
+        except Exception as e:
+            logging.error(f"批量确认关注关系失败：{str(e)}")
+            return None
+        return {mid for mid in mids if relations.get(int(mid), 0) in FOLLOWING_ATTRIBUTES}
+
+    async def _unfollow(self, mid):
+        try:
+            await self.client.unfollow(mid)
+        except Exception as e:
+            return e
+        return None
+
+    def _result(self, mid, status, message):
+        name = self.queue.pending.get(mid)
+        self.queue.mark(mid, status)
+        return mid, name, status, message
+
+    async def run(self, min_size=1):
+        """
+        执行队列中本次运行尚未执行的用户（含上次运行遗留的），执行期间新加入的用户在之后的批次执行
+        :param min_size: 剩余用户不足此数时停止，默认执行全部
+        :return: async generator of (mid, name, status, message)
+        """
+        while True:
+            batch = self._todo()[:self.batch_size]
+            if not batch or len(batch) < min_size:
+                return
+            self._attempted.update(batch)
+            names = {mid: self.queue.pending[mid] for mid in batch}
+            # 确认失败时按仍在关注处理，逐个取关
+            following = await self._following(batch)
+            targets = batch if following is None else [mid for mid in batch if mid in following]
+            for mid in batch:
+                if following is not None and mid not in following:
+                    yield self._result(mid, UNFOLLOW_NOT_FOLLOWING, f"{names[mid]}（{mid}）已不在关注列表，跳过")
+
+            written = []
+            async for mid, error in probe_users(targets, self._unfollow, self.workers):
+                if error is None:
+                    written.append(mid)
+                    continue
+                message = f"取关 {names[mid]}（{mid}） 失败：{str(error)}"
+                logging.error(message)
+                yield self._result(mid, UNFOLLOW_FAILED, message)
+
+            if not written:
+                continue
+            remaining = await self._following(written)
+            for mid in written:
+                if remaining is None:
+                    # 无法确认是否生效：留在队列中，下次执行时先确认关注关系，已取关的直接出队
+                    message = f"取关 {names[mid]}（{mid}） 已发送，但确认关注关系失败，留待下次确认"
+                    logging.error(message)
+                    yield self._result(mid, UNFOLLOW_FAILED, message)
+                elif mid in remaining:
+                    message = f"取关 {names[mid]}（{mid}） 未生效：仍在关注列表"
+                    logging.error(message)
+                    yield self._result(mid, UNFOLLOW_FAILED, message)
+                else:
+                    yield self._result(mid, UNFOLLOW_DONE, f"取关成功：{names[mid]}（{mid}）")
+
+    async def _consume(self, handle, min_size=1):
+        async for result in self.run(min_size):
+            await handle(*result)
+
+    def run_ready(self, handle):
+        """
+        在后台执行取关，评估无需等待取关完成
+        空闲且待执行的用户达到 min_batch 时开始；取关比评估慢时，执行期间积累的用户使之后的批次自然变大
+        :param handle: async handle(mid, name, status, message)，处理每个用户的结果
+        """
+        if (self._task is None or self._task.done()) and len(self._todo()) >= self.min_batch:
+            self._task = asyncio.create_task(self._consume(handle, self.min_batch))
+
+    async def drain(self, handle):
+        """等待后台执行完成并执行剩余的全部用户"""
+        if self._task:
+            await self._task
+        await self._consume(handle)
+
+    def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self.queue.finish()